@@ -0,0 +1,61 @@
+"""
+Compares repeated bucket fills with and without a RegionIndex, on a canvas split in areas by lines.
+
+Usage: python -m benchmarks.bucket_fill [--width W] [--height H] [--fills N]
+"""
+import argparse
+import random
+import string
+import time
+
+from paint import ArrayCanvasFactory, AsciiCanvasPrinter, Program, RegionIndex, RunDelta
+
+
+class NullPrinter(AsciiCanvasPrinter):
+    def print_canvas(self, canvas):
+        pass
+
+
+def measure(width, height, fills, region_index):
+    program = Program(
+        printer=NullPrinter(),
+        palette={c for c in " " + string.ascii_lowercase},
+        background_color=" ",
+        foreground_color="x",
+        canvas_factory=ArrayCanvasFactory(),
+        delta_class=RunDelta,
+        region_index=region_index
+    )
+    program.execute_command("C", width, height)
+    rng = random.Random(0)
+    for _ in range(20):
+        program.execute_command("L", rng.randint(1, width), 1, rng.randint(1, width), height)
+        program.execute_command("L", 1, rng.randint(1, height), width, rng.randint(1, height))
+
+    start = time.perf_counter()
+    for i in range(fills):
+        program.execute_command("B", rng.randint(1, width), rng.randint(1, height), "abc"[i % 3])
+        if i % 10 == 9:
+            program.execute_command("Z")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=400)
+    parser.add_argument("--height", type=int, default=300)
+    parser.add_argument("--fills", type=int, default=200)
+    args = parser.parse_args()
+
+    flood_time = measure(args.width, args.height, args.fills, None)
+    region_index = RegionIndex()
+    index_time = measure(args.width, args.height, args.fills, region_index)
+    print("{} bucket fills (and an undo every 10) on a {}x{} canvas".format(args.fills, args.width, args.height))
+    print("flood fill:   {:.3f}s".format(flood_time))
+    print("region index: {:.3f}s ({:.1f}x, {} builds, {} rows indexed again)".format(
+        index_time, flood_time / index_time, region_index.builds, region_index.rebuilt_rows
+    ))
+
+
+if __name__ == "__main__":
+    main()
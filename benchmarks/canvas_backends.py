@@ -0,0 +1,91 @@
+"""
+Compares memory usage and throughput of the canvas backends.
+
+Usage: python -m benchmarks.canvas_backends [--width W] [--height H]
+"""
+import argparse
+import string
+import time
+import tracemalloc
+
+from paint import AsciiCanvasPrinter, ArrayCanvasFactory, CanvasFactory, NumpyCanvasFactory, NumpyPainter, \
+    Painter, PointFactory, QuadtreeCanvasFactory, QuadtreePainter, RunDelta, numpy_canvas
+
+
+PALETTE = {c for c in " " + string.ascii_lowercase}
+
+BACKENDS = [
+    ("Canvas", CanvasFactory(), Painter(PointFactory(" "))),
+    ("ArrayCanvas", ArrayCanvasFactory(), Painter(PointFactory(" "), delta_class=RunDelta)),
+    ("QuadtreeCanvas", QuadtreeCanvasFactory(), QuadtreePainter(PointFactory(" "))),
+]
+
+if numpy_canvas.numpy is not None:
+    BACKENDS.append(("NumpyCanvas", NumpyCanvasFactory(), NumpyPainter(PointFactory(" "))))
+
+
+def elapsed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def measure_backend(factory, painter, width, height):
+    tracemalloc.start()
+    construction_time, canvas = elapsed(factory.create_canvas, width, height, PALETTE, " ")
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    def read_all():
+        for y in range(height):
+            for x in range(width):
+                canvas.point(x, y)
+
+    read_time, _ = elapsed(read_all)
+
+    def paint():
+        edited = canvas
+        for i in range(0, min(width, height), 10):
+            edited = painter.draw_rectangle(edited, i // 2, i // 2, width - 1 - i // 2, height - 1 - i // 2, "x")
+            edited = painter.draw_line(edited, 0, i, width - 1, height - 1 - i, "o")
+        return edited
+
+    paint_time, edited = elapsed(paint)
+    fill_time, filled = elapsed(painter.bucket_fill, edited, width // 2, 0, "k")
+    render_time, _ = elapsed(AsciiCanvasPrinter().canvas_to_str, filled)
+
+    return {
+        "construction_seconds": construction_time,
+        "memory_bytes": memory,
+        "points_read_per_second": (width * height) / read_time,
+        "paint_seconds": paint_time,
+        "bucket_fill_seconds": fill_time,
+        "render_seconds": render_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("{}x{} canvas".format(args.width, args.height))
+    print("{:<14} {:>16} {:>12} {:>16} {:>10} {:>10} {:>10}".format(
+        "backend", "construction (s)", "memory (MB)", "points read/s", "paint (s)", "fill (s)", "render (s)"
+    ))
+    for name, factory, painter in BACKENDS:
+        result = measure_backend(factory, painter, args.width, args.height)
+        print("{:<14} {:>16.3f} {:>12.1f} {:>16,.0f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+            name,
+            result["construction_seconds"],
+            result["memory_bytes"] / 1024 / 1024,
+            result["points_read_per_second"],
+            result["paint_seconds"],
+            result["bucket_fill_seconds"],
+            result["render_seconds"],
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares the integer-only line rasteriser of BaseCanvas with the previous floating point one on long lines.
+
+Usage: python -m benchmarks.line_rasteriser [--length N] [--repeat R]
+"""
+import argparse
+import time
+
+from paint import BaseCanvas
+
+
+def float_line_coordinates(x1, y1, x2, y2):
+    """
+    Rasteriser used by BaseCanvas.line before the integer-only one (diagonal lines only)
+    """
+    def steps(a, b):
+        step = 1 if a < b else -1
+        while a != b:
+            yield a
+            a += step
+        yield b
+
+    m = float(y2 - y1) / float(x2 - x1)
+    if abs(x2 - x1) > abs(y2 - y1):
+        return [(x, int(round(float(x - x1) * m)) + y1) for x in steps(x1, x2)]
+    else:
+        return [(int(round(float(y - y1) / m)) + x1, y) for y in steps(y1, y2)]
+
+
+def integer_line_coordinates(x1, y1, x2, y2):
+    xs, ys = BaseCanvas.line_coordinates(x1, y1, x2, y2)
+    return list(zip(xs, ys))
+
+
+def measure(func, length, repeat):
+    lines = [(0, 0, length, length // 3), (0, 0, length // 7, length), (length, 0, 0, length // 2)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            func(*line)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--length", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    float_time = measure(float_line_coordinates, args.length, args.repeat)
+    integer_time = measure(integer_line_coordinates, args.length, args.repeat)
+    print("Lines of {} points, {} repetitions".format(args.length, args.repeat))
+    print("floating point: {:.3f}s".format(float_time))
+    print("integer only:   {:.3f}s ({:.1f}x)".format(integer_time, float_time / integer_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares the serial rendering of a large canvas with its rendering in a pool of processes.
+
+Usage: python -m benchmarks.parallel_render [--size N] [--processes P ...]
+"""
+import argparse
+import os
+import string
+import time
+
+from paint import ArrayCanvas, AsciiCanvasPrinter, Painter, ParallelRenderer, PointFactory, RunDelta
+
+
+PALETTE = {c for c in " " + string.ascii_lowercase}
+
+
+def drawing(size):
+    painter = Painter(PointFactory(" "), delta_class=RunDelta)
+    canvas = ArrayCanvas(size, size, PALETTE, " ")
+    for i in range(0, size // 2, max(1, size // 20)):
+        canvas = painter.draw_rectangle(canvas, i, i, size - 1 - i, size - 1 - i, "x")
+        canvas = painter.draw_line(canvas, 0, i, size - 1, size - 1 - i, "o")
+    return canvas
+
+
+def render_time(canvas, renderer):
+    printer = AsciiCanvasPrinter(renderer=renderer)
+    start = time.perf_counter()
+    printer.canvas_to_str(canvas)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=4000)
+    parser.add_argument("--processes", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    canvas = drawing(args.size)
+    serial = render_time(canvas, None)
+    print("{0}x{0} canvas, {1} CPUs".format(args.size, os.cpu_count()))
+    print("{:<10} {:>12} {:>8}".format("processes", "render (s)", "speedup"))
+    print("{:<10} {:>12.3f} {:>8.2f}".format("serial", serial, 1))
+    for processes in args.processes:
+        with ParallelRenderer(processes, min_points=0) as renderer:
+            # The first rendering starts the processes
+            render_time(canvas, renderer)
+            elapsed = render_time(canvas, renderer)
+        print("{:<10} {:>12.3f} {:>8.2f}".format(processes, elapsed, serial / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Measures the throughput and the latency of a canvas server under the load of concurrent sessions.
+
+Usage: python -m benchmarks.server_load [--host H --port P] [--sessions N] [--commands M] [--size S]
+
+Without --port, a server using the array backend is started in this process.
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from paint import ArrayCanvasFactory, CanvasClient, CanvasServer, Program, RunDelta
+
+
+PALETTE = {c for c in " " + string.ascii_lowercase}
+
+
+def commands(size, count, seed):
+    """
+    Creates a canvas and paints random lines, rectangles and bucket fills on it
+    """
+    rng = random.Random(seed)
+
+    def point():
+        return rng.randint(1, size), rng.randint(1, size)
+
+    yield "C {0} {0}".format(size)
+    for _ in range(count - 1):
+        kind = rng.random()
+        if kind < 0.45:
+            yield "L {} {} {} {}".format(*point(), *point())
+        elif kind < 0.8:
+            yield "R {} {} {} {}".format(*point(), *point())
+        elif kind < 0.95:
+            yield "B {} {} {}".format(*point(), rng.choice(string.ascii_lowercase))
+        else:
+            yield "Z"
+
+
+async def run_session(host, port, lines, latencies):
+    client = await CanvasClient.connect(host, port)
+    try:
+        for line in lines:
+            start = time.perf_counter()
+            await client.send(line)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def main(args):
+    listener = None
+    host, port = args.host, args.port
+    if port is None:
+        server = CanvasServer(lambda printer: Program(
+            printer=printer,
+            palette=PALETTE,
+            background_color=" ",
+            foreground_color="x",
+            canvas_factory=ArrayCanvasFactory(),
+            delta_class=RunDelta
+        ))
+        listener = await server.start(host)
+        port = listener.sockets[0].getsockname()[1]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_session(host, port, list(commands(args.size, args.commands, seed)), latencies)
+        for seed in range(args.sessions)
+    ])
+    elapsed = time.perf_counter() - start
+
+    if listener is not None:
+        listener.close()
+        await listener.wait_closed()
+
+    latencies.sort()
+    print("{} sessions x {} commands on {}x{} canvases".format(args.sessions, args.commands, args.size, args.size))
+    print("{:>14} {:>10} {:>10} {:>10} {:>10}".format("commands/s", "p50 (ms)", "p90 (ms)", "p99 (ms)", "max (ms)"))
+    print("{:>14,.0f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+        len(latencies) / elapsed,
+        *[percentile(latencies, p) * 1000 for p in (50, 90, 99)],
+        latencies[-1] * 1000
+    ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--size", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,277 @@
+"""
+Benchmark suite of the canvas, painter, printer and program hot paths.
+
+Every benchmark runs at each canvas size and its best time out of --repeat runs is reported.
+Results are written as JSON and compared with a baseline: a benchmark slower than the baseline by more
+than --tolerance is a regression, and the exit code is 1.
+Timings only compare on the same machine, so the baseline is not part of the repository: record one on each machine
+with --save-baseline (before the changes to measure), then run the suite again to compare with it.
+
+Usage: python -m benchmarks.suite [--sizes 100,300] [--repeat 5] [--output results.json]
+                                  [--baseline benchmarks/baseline.json] [--tolerance 0.75] [--min-seconds 0.001]
+                                  [--save-baseline]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import string
+import sys
+import time
+
+from paint import AsciiCanvasPrinter, ArrayCanvasFactory, CanvasFactory, NumpyCanvasFactory, NumpyPainter, \
+    Painter, PointFactory, Program, RunDelta, numpy_canvas, replace_file
+
+
+PALETTE = {c for c in " " + string.ascii_lowercase}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+FACTORIES = [("Canvas", CanvasFactory()), ("ArrayCanvas", ArrayCanvasFactory())]
+if numpy_canvas.numpy is not None:
+    FACTORIES.append(("NumpyCanvas", NumpyCanvasFactory()))
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Registers a benchmark: the decorated function takes the canvas size, does the set up
+    and returns the function to time (or a dict of them, by variant)
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+class NullPrinter(AsciiCanvasPrinter):
+    """
+    Renders the canvas without writing it anywhere
+    """
+    def print_canvas(self, canvas):
+        self.canvas_to_str(canvas)
+
+
+def edited_canvas(size, depth, painter=None):
+    """
+    Canvas with a chain of depth edits, not compacted
+    """
+    painter = painter or Painter(PointFactory(" "))
+    canvas = CanvasFactory().create_canvas(size, size, PALETTE, " ")
+    for i in range(depth):
+        x = i * (size - 1) // max(depth - 1, 1)
+        canvas = painter.draw_line(canvas, x, 0, size - 1 - x, size - 1, "x")
+    return canvas
+
+
+def script(size):
+    """
+    Commands drawing on a canvas of the given size (1-based coordinates)
+    """
+    commands = [("C", size, size)]
+    for i in range(1, size, max(size // 20, 1)):
+        commands.append(("L", 1, i, size, size - i + 1))
+        commands.append(("R", i, i, size - i + 1, size - i + 1) if i <= size // 2 else ("Z",))
+        commands.append(("T", size // 2, 1, 1, size, size, i))
+        commands.append(("B", 1, size, "o"))
+        commands.append(("Z",))
+        commands.append(("Y",))
+    return commands
+
+
+@benchmark("canvas_construction")
+def canvas_construction(size):
+    return {
+        name: (lambda factory=factory: factory.create_canvas(size, size, PALETTE, " "))
+        for name, factory in FACTORIES
+    }
+
+
+@benchmark("canvas_line")
+def canvas_line(size):
+    canvas = ArrayCanvasFactory().create_canvas(size, size, PALETTE, " ")
+    return lambda: [list(canvas.line(0, i, size - 1, size - 1 - i)) for i in range(0, size, max(size // 10, 1))]
+
+
+@benchmark("canvas_polygon")
+def canvas_polygon(size):
+    canvas = ArrayCanvasFactory().create_canvas(size, size, PALETTE, " ")
+    points = [(size // 2, 0), (size - 1, size // 3), (size * 3 // 4, size - 1), (size // 4, size - 1), (0, size // 3)]
+    return lambda: list(canvas.polygon(*points))
+
+
+@benchmark("canvas_uniform_area")
+def canvas_uniform_area(size):
+    variants = {}
+    for name, factory in FACTORIES:
+        canvas = Painter(PointFactory(" ")).draw_rectangle(
+            factory.create_canvas(size, size, PALETTE, " "), 1, 1, size - 2, size - 2, "x"
+        )
+        variants[name] = lambda canvas=canvas: list(canvas.uniform_area_runs(size // 2, size // 2))
+    return variants
+
+
+@benchmark("painter_deep_chain")
+def painter_deep_chain(size):
+    canvas = edited_canvas(size, 64)
+    painter = Painter(PointFactory(" "))
+
+    def paint():
+        edited = painter.draw_rectangle(canvas, 0, 0, size - 1, size - 1, "o")
+        edited = painter.draw_polygon(edited, "o", (0, 0), (size - 1, size // 2), (0, size - 1))
+        return painter.bucket_fill(edited, 0, size // 2, "k")
+
+    return paint
+
+
+@benchmark("painter_bucket_fill")
+def painter_bucket_fill(size):
+    variants = {}
+    painters = {"Canvas": Painter(PointFactory(" ")), "ArrayCanvas": Painter(PointFactory(" "), delta_class=RunDelta)}
+    if numpy_canvas.numpy is not None:
+        painters["NumpyCanvas"] = NumpyPainter(PointFactory(" "))
+    for name, factory in FACTORIES:
+        canvas = factory.create_canvas(size, size, PALETTE, " ")
+        variants[name] = lambda canvas=canvas, painter=painters[name]: painter.bucket_fill(canvas, 0, 0, "x")
+    return variants
+
+
+@benchmark("printer_canvas_to_str")
+def printer_canvas_to_str(size):
+    canvas = edited_canvas(size, 32)
+    # A new printer every time, so that nothing is cached
+    return lambda: AsciiCanvasPrinter().canvas_to_str(canvas)
+
+
+@benchmark("program_run_command")
+def program_run_command(size):
+    commands = script(size)
+
+    def run():
+        program = Program(printer=NullPrinter(), palette=PALETTE, background_color=" ", foreground_color="x",
+                          canvas_factory=ArrayCanvasFactory(), delta_class=RunDelta)
+        for command in commands:
+            program.run_command(*command)
+
+    return run
+
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        # Like timeit, garbage collection is kept out of the timings
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_suite(sizes, repeat, names=None):
+    """
+    Runs the benchmarks
+    :return: Dict of the best times in seconds, keyed by benchmark[variant]@size
+    """
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for size in sizes:
+            variants = setup(size)
+            if callable(variants):
+                variants = {None: variants}
+            for variant, func in variants.items():
+                key = "{}{}@{}".format(name, "" if variant is None else "[{}]".format(variant), size)
+                results[key] = measure(func, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds=0.001):
+    """
+    Compares the results with the baseline.
+    Slowdowns shorter than min_seconds are ignored, timings that small are mostly noise.
+    :return: List of (key, baseline seconds, seconds, ratio), sorted by key, and the list of the regressed keys
+    """
+    comparison = []
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            comparison.append((key, None, results[key], None))
+            continue
+        ratio = results[key] / baseline[key] if baseline[key] else float("inf")
+        comparison.append((key, baseline[key], results[key], ratio))
+        if ratio > 1 + tolerance and results[key] - baseline[key] > min_seconds:
+            regressions.append(key)
+    return comparison, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,300", help="Comma separated canvas sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="Names of the benchmarks to run")
+    parser.add_argument("--output", help="File the JSON results are written to (standard output by default)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.75,
+                        help="Slowdown relative to the baseline considered a regression (0.75 = 75%% slower)")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="Slowdowns shorter than this are never considered regressions")
+    parser.add_argument("--save-baseline", action="store_true", help="Stores the results as the new baseline")
+    args = parser.parse_args()
+
+    results = run_suite([int(size) for size in args.sizes.split(",")], args.repeat, args.only)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    if args.output:
+        with replace_file(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.save_baseline:
+        with replace_file(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found in {}: record one on this machine with --save-baseline".format(args.baseline),
+              file=sys.stderr)
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline_report = json.load(baseline_file)
+    baseline = baseline_report["results"]
+    for key in ("machine", "python"):
+        if baseline_report.get(key) != report[key]:
+            print("Warning: the baseline was recorded with another {} ({}), the timings may not compare".format(
+                key, baseline_report.get(key)
+            ), file=sys.stderr)
+
+    comparison, regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+    for key, baseline_time, result_time, ratio in comparison:
+        print("{:<50} {:>10} {:>10.4f} {:>8}".format(
+            key,
+            "-" if baseline_time is None else "{:.4f}".format(baseline_time),
+            result_time,
+            "new" if ratio is None else "{:.2f}x".format(ratio)
+        ), file=sys.stderr)
+
+    if regressions:
+        print("Regressions: {}".format(", ".join(regressions)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
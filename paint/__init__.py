@@ -1,4 +1,18 @@
 from .point import *
 from .canvas import *
+from .delta import *
 from .painter import *
+from .history import *
+from .printer import *
+from .storage import *
+from .image import *
+from .profiler import *
+from .numpy_canvas import *
+from .tiled_canvas import *
+from .quadtree_canvas import *
+from .region_index import *
+from .parallel import *
 from .program import *
+from .journal import *
+from .optimizer import *
+from .server import *
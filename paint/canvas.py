@@ -1,8 +1,34 @@
+from bisect import bisect_right
+from fractions import Fraction
+import itertools
+import math
+from operator import attrgetter, eq
+import re
+import sys
+
+from .delta import RunDelta, point_bounds
+from .point import Point, PointFactory
+
+
+_versions = itertools.count(1)
+
+
 class PointOutOfCanvas(Exception):
     pass
 
 
 class BaseCanvas(object):
+    @property
+    def version(self):
+        """
+        Identifies the content of the canvas: canvases sharing the same version hold the same points
+        """
+        try:
+            return self._version
+        except AttributeError:
+            self._version = next(_versions)
+            return self._version
+
     @property
     def width(self):
         raise NotImplementedError
@@ -14,6 +40,29 @@ class BaseCanvas(object):
     def point(self, x, y):
         raise NotImplementedError
 
+    def color_at(self, x, y):
+        """
+        Returns the color of the point (x, y), without creating the point
+        """
+        return self.point(x, y).color
+
+    def row_colors(self, y):
+        """
+        Returns the list of the colors of the points in the row y
+        """
+        return [self.color_at(x, y) for x in range(self.width)]
+
+    def memory_size(self):
+        """
+        Estimated number of bytes held by this canvas, not including the canvases it's built on
+        """
+        return sys.getsizeof(self)
+
+    def close(self):
+        """
+        Releases the resources held by the canvas (e.g. the file mapped by a MappedCanvas): it cannot be read anymore
+        """
+
     def exists(self, x, y):
         return 0 <= int(x) < self.width and 0 <= int(y) < self.height
 
@@ -30,28 +79,52 @@ class BaseCanvas(object):
         yield b
 
     def line(self, x1, y1, x2, y2):
-        if x1 == x2 and y1 == y2:
-            # Single point
-            yield self.point(x1, y1)
-        elif x1 == x2:
-            # Vertical line
-            for y in self.range(y1, y2):
-                yield self.point(x1, y)
-        elif y1 == y2:
-            # Horizontal line
-            for x in self.range(x1, x2):
-                yield self.point(x, y1)
-        else:
-            # Diagonal line
-            m = float(y2 - y1) / float(x2 - x1)
-            if abs(x2 - x1) > abs(y2 - y1):
-                for x in self.range(x1, x2):
-                    y = int(round(float(x - x1) * m)) + y1
-                    yield self.point(x, y)
+        xs, ys = self.line_coordinates(x1, y1, x2, y2)
+        for x, y in zip(xs, ys):
+            yield self.point(x, y)
+
+    @staticmethod
+    def line_coordinates(x1, y1, x2, y2):
+        """
+        Returns the lists of the x and y coordinates of the points of the line between (x1, y1) and (x2, y2).
+        Integer-only Bresenham: the line steps along its longest axis and the other coordinate is the exact
+        distance from the line rounded to the nearest integer (ties to even).
+        """
+        dx = x2 - x1
+        dy = y2 - y1
+        if abs(dx) > abs(dy):
+            major, minor = BaseCanvas._bresenham(x1, y1, dx, dy)
+            return major, minor
+        minor, major = BaseCanvas._bresenham(y1, x1, dy, dx)
+        return major, minor
+
+    @staticmethod
+    def _bresenham(major_start, minor_start, major_delta, minor_delta):
+        step = 1 if major_delta >= 0 else -1
+        length = abs(major_delta)
+        if length == 0:
+            return [major_start], [minor_start]
+
+        # Offset of the line along the minor axis: quotient + remainder / length, with 0 <= remainder < length.
+        # The minor delta is never longer than the major one, so the remainder wraps at most once per step.
+        quotient = 0
+        remainder = 0
+        minors = []
+        append = minors.append
+        for _ in range(length + 1):
+            doubled = remainder + remainder
+            if doubled > length or (doubled == length and quotient & 1):
+                append(minor_start + quotient + 1)
             else:
-                for y in self.range(y1, y2):
-                    x = int(round(float(y - y1) / m)) + x1
-                    yield self.point(x, y)
+                append(minor_start + quotient)
+            remainder += minor_delta
+            if remainder >= length:
+                remainder -= length
+                quotient += 1
+            elif remainder < 0:
+                remainder += length
+                quotient -= 1
+        return list(range(major_start, major_start + major_delta + step, step)), minors
 
     def rectangle(self, x1, y1, x2, y2):
         return self.polygon((x1, y1), (x2, y1), (x2, y2), (x1, y2))
@@ -59,6 +132,21 @@ class BaseCanvas(object):
     def triangle(self, x1, y1, x2, y2, x3, y3):
         return self.polygon((x1, y1), (x2, y2), (x3, y3))
 
+    def polygon_coordinates(self, *args):
+        """
+        Returns the lists of the x and y coordinates of the points of the border of the polygon,
+        without creating the points
+        """
+        assert len(args) >= 3, "A polygon is made of at least 3 points"
+        for x, y in args:
+            self.coordinate(x, y)
+        xs, ys = [], []
+        for (x1, y1), (x2, y2) in zip(args, args[1:] + args[:1]):
+            edge_xs, edge_ys = self.line_coordinates(x1, y1, x2, y2)
+            xs += edge_xs
+            ys += edge_ys
+        return xs, ys
+
     def polygon(self, *args):
         assert len(args) >= 3, "A polygon is made of at least 3 points"
 
@@ -76,35 +164,137 @@ class BaseCanvas(object):
         for p in self.line(p1[0], p1[1], first_point[0], first_point[1]):
             yield p
 
+    def filled_rectangle(self, x1, y1, x2, y2):
+        """
+        Returns the horizontal runs (y, x1, x2) of the rectangle with corners in (x1, y1) and (x2, y2), border included
+        """
+        self.coordinate(x1, y1)
+        self.coordinate(x2, y2)
+        x1, x2 = min(x1, x2), max(x1, x2)
+        for y in range(min(y1, y2), max(y1, y2) + 1):
+            yield y, x1, x2
+
+    def filled_triangle(self, x1, y1, x2, y2, x3, y3):
+        return self.filled_polygon((x1, y1), (x2, y2), (x3, y3))
+
+    def filled_polygon(self, *args):
+        """
+        Returns the horizontal runs (y, x1, x2) of the polygon, border included.
+        The inside is found with an edge table scanline (even-odd rule on the points of each row),
+        the border is the one drawn by polygon.
+        """
+        assert len(args) >= 3, "A polygon is made of at least 3 points"
+        for x, y in args:
+            self.coordinate(x, y)
+
+        edges = list(zip(args, args[1:] + args[:1]))
+
+        # Points of the border, by row
+        border = {}
+        for (x1, y1), (x2, y2) in edges:
+            xs, ys = self.line_coordinates(x1, y1, x2, y2)
+            for x, y in zip(xs, ys):
+                border.setdefault(y, []).append(x)
+
+        # Edge table: non horizontal edges by their lowest row, as (top row, x of the lowest end, dx, dy)
+        edge_table = {}
+        for (x1, y1), (x2, y2) in edges:
+            if y1 == y2:
+                continue
+            if y1 > y2:
+                x1, y1, x2, y2 = x2, y2, x1, y1
+            edge_table.setdefault(y1, []).append((y2, x1, x2 - x1, y2 - y1))
+
+        active = []
+        for y in range(min(y for _, y in args), max(y for _, y in args) + 1):
+            # Edges are half open (the top row is excluded) so that vertices are not counted twice
+            active = [edge for edge in active if edge[0] > y] + edge_table.get(y, [])
+
+            runs = [(x, x) for x in border.get(y, [])]
+            crossings = sorted(
+                Fraction(x * dy + (y - (top - dy)) * dx, dy)
+                for top, x, dx, dy in active
+            )
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                # Points between the two crossings
+                x1 = math.ceil(left)
+                x2 = math.floor(right)
+                if x1 <= x2:
+                    runs.append((x1, x2))
+
+            runs.sort()
+            start, end = runs[0]
+            for x1, x2 in runs[1:]:
+                if x1 > end + 1:
+                    yield y, start, end
+                    start = x1
+                end = max(end, x2)
+            yield y, start, end
+
     def uniform_area(self, x, y):
         """
         Returns the set of points of the area connected to (x, y)
         """
-        color = self.point(x, y).color
-        stack = {(x, y)}
-        visited = set()
+        for y1, x1, x2 in self.uniform_area_runs(x, y):
+            for x in range(x1, x2 + 1):
+                yield self.point(x, y1)
+
+    def uniform_area_runs(self, x, y):
+        """
+        Returns the horizontal runs (y, x1, x2) making the area connected to (x, y), both ends included
+        """
+        color = self.color_at(x, y)
+        height = self.height
+        # Starts of the runs of the color and the runs, for the rows reached so far
+        rows = {}
+
+        def row_runs(y):
+            if y not in rows:
+                runs = self._color_segments(y, color)
+                rows[y] = [x1 for x1, _ in runs], runs
+            return rows[y]
+
+        starts, runs = row_runs(y)
+        seeds = [(y, runs[bisect_right(starts, x) - 1])]
+        filled = set(seeds)
+        while seeds:
+            y, (x1, x2) = seeds.pop()
+            yield y, x1, x2
+
+            for y2 in (y - 1, y + 1):
+                if 0 <= y2 < height:
+                    # Runs of the next row overlapping x1..x2
+                    starts, runs = row_runs(y2)
+                    i = max(bisect_right(starts, x1) - 1, 0)
+                    while i < len(runs) and runs[i][0] <= x2:
+                        seed = (y2, runs[i])
+                        if runs[i][1] >= x1 and seed not in filled:
+                            filled.add(seed)
+                            seeds.append(seed)
+                        i += 1
+
+    def _color_segments(self, y, color):
+        """
+        Returns the runs (x1, x2) of the given color in the row y, from left to right
+        """
+        # One byte per point, 1 for the points of the color
+        matches = bytes(map(eq, itertools.repeat(color), self.row_colors(y)))
+        return [(match.start(), match.end() - 1) for match in re.finditer(b"\x01+", matches)]
 
-        while stack:
-            x1, y1 = stack.pop()
-            try:
-                point = self.point(x1, y1)
-                if point.color == color:
-                    yield point
+    def snapshot(self, canvas):
+        """
+        Returns a new canvas of the same kind as this one holding the points of canvas
+        """
+        raise NotImplementedError
 
-                    nearby = [
-                        (x1 - 1, y1),
-                        (x1 + 1, y1),
-                        (x1, y1 - 1),
-                        (x1, y1 + 1)
-                    ]
 
-                    for p2 in nearby:
-                        if p2 not in visited:
-                            visited.add(p2)
-                            stack.add(p2)
+class SnapshotPointFactory(object):
+    def __init__(self, canvas):
+        self._canvas = canvas
 
-            except PointOutOfCanvas:
-                pass
+    def create_point(self, x, y):
+        """Copies the point of the source canvas"""
+        return self._canvas.point(x, y)
 
 
 class Canvas(BaseCanvas):
@@ -112,7 +302,69 @@ class Canvas(BaseCanvas):
         assert width > 0 and height > 0, "Invalid width or height"
         self._width = width
         self._height = height
-        self._matrix = [[point_factory.create_point(x, y) for y in range(height)] for x in range(width)]
+        # Points row by row, as canvases are read (filled and printed) one row at a time
+        self._rows = [[point_factory.create_point(x, y) for x in range(width)] for y in range(height)]
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    def point(self, x, y):
+        if not self.exists(x, y):
+            raise PointOutOfCanvas
+        return self._rows[y][x]
+
+    def color_at(self, x, y):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            raise PointOutOfCanvas
+        return self._rows[y][x].color
+
+    def row_colors(self, y):
+        if not 0 <= y < self._height:
+            raise PointOutOfCanvas
+        return list(map(attrgetter("color"), self._rows[y]))
+
+    def memory_size(self):
+        # Every point is a distinct tuple referenced by a row
+        return sys.getsizeof(self) + sum(sys.getsizeof(row) for row in self._rows) + \
+            self._width * self._height * sys.getsizeof(Point(0, 0, None))
+
+    def snapshot(self, canvas):
+        if not (isinstance(canvas, EditedCanvas) and canvas.base is self):
+            return Canvas(canvas.width, canvas.height, SnapshotPointFactory(canvas))
+
+        # Copies the rows and replays the edits rather than reading every point through the chain
+        snapshot = Canvas.__new__(Canvas)
+        snapshot._width = self._width
+        snapshot._height = self._height
+        snapshot._rows = [row[:] for row in self._rows]
+        for edit in canvas.edits():
+            for (x, y), point in edit.delta.items():
+                snapshot._rows[y][x] = point
+        return snapshot
+
+
+class ArrayCanvas(BaseCanvas):
+    """
+    Canvas storing one byte per point: the index of its color in the palette
+    """
+    # Position of the first point in the pixels buffer
+    _offset = 0
+
+    def __init__(self, width, height, palette, background_color):
+        assert width > 0 and height > 0, "Invalid width or height"
+        self._width = width
+        self._height = height
+        self._colors = tuple(sorted(palette))
+        assert len(self._colors) <= 256, "The palette cannot contain more than 256 colors"
+        self._indices = {color: index for index, color in enumerate(self._colors)}
+        assert background_color in self._indices, "The background color is not in the palette"
+        self._background_color = background_color
+        self._pixels = bytearray([self._indices[background_color]]) * (width * height)
 
     @property
     def width(self):
@@ -125,13 +377,113 @@ class Canvas(BaseCanvas):
     def point(self, x, y):
         if not self.exists(x, y):
             raise PointOutOfCanvas
-        return self._matrix[x][y]
+        return Point(x, y, self._colors[self._pixels[self._offset + y * self._width + x]])
+
+    def color_at(self, x, y):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            raise PointOutOfCanvas
+        return self._colors[self._pixels[self._offset + y * self._width + x]]
+
+    def row_colors(self, y):
+        if not 0 <= y < self._height:
+            raise PointOutOfCanvas
+        colors = self._colors
+        row = self._offset + y * self._width
+        return [colors[i] for i in self._pixels[row:row + self._width]]
+
+    def memory_size(self):
+        return sys.getsizeof(self) + sys.getsizeof(self._pixels)
+
+    def _color_pattern(self, color):
+        return re.compile(re.escape(bytes([self._indices[color]])) + b"+")
+
+    def _color_segments(self, y, color):
+        if color not in self._indices:
+            return []
+        row = self._offset + y * self._width
+        return [
+            (match.start() - row, match.end() - row - 1)
+            for match in self._color_pattern(color).finditer(self._pixels, row, row + self._width)
+        ]
+
+    def _copy_pixels(self):
+        return self._pixels[:]
+
+    def snapshot(self, canvas):
+        snapshot = ArrayCanvas.__new__(ArrayCanvas)
+        snapshot._width = canvas.width
+        snapshot._height = canvas.height
+        snapshot._colors = self._colors
+        snapshot._indices = self._indices
+        snapshot._background_color = self._background_color
+
+        if isinstance(canvas, EditedCanvas) and canvas.base is self:
+            # Copies the pixels and replays the edits rather than reading every point through the chain
+            snapshot._pixels = self._copy_pixels()
+            width = self._width
+            for edit in canvas.edits():
+                if isinstance(edit.delta, RunDelta):
+                    value = bytes([self._indices[edit.delta.color]])
+                    for y, x1, x2 in edit.delta.runs():
+                        snapshot._pixels[y * width + x1:y * width + x2 + 1] = value * (x2 - x1 + 1)
+                else:
+                    for (x, y), point in edit.delta.items():
+                        snapshot._pixels[y * width + x] = self._indices[point.color]
+        else:
+            snapshot._pixels = bytearray(
+                self._indices[color]
+                for y in range(canvas.height)
+                for color in canvas.row_colors(y)
+            )
+        return snapshot
 
 
 class EditedCanvas(BaseCanvas):
+    # Edits looked up by color_at, built on first use
+    _layers = None
+
     def __init__(self, canvas, delta):
         self.original_canvas = canvas
         self.delta = delta
+        # Corners (x1, y1, x2, y2) of the points painted by this edit, and by the whole chain, None if there are none:
+        # points outside them are looked up straight in the original canvas, or in the base canvas
+        self.bounds = delta.bounds() if hasattr(delta, "bounds") else point_bounds(delta)
+        if isinstance(canvas, EditedCanvas):
+            self.base = canvas.base
+            self.depth = canvas.depth + 1
+            self.delta_size = canvas.delta_size + len(delta)
+            self.chain_bounds = _union_bounds(canvas.chain_bounds, self.bounds)
+        else:
+            self.base = canvas
+            self.depth = 1
+            self.delta_size = len(delta)
+            self.chain_bounds = self.bounds
+
+    def edits(self):
+        """
+        Returns the chain of edits applied to the base canvas, from the oldest to the most recent
+        """
+        edits = []
+        canvas = self
+        while isinstance(canvas, EditedCanvas):
+            edits.append(canvas)
+            canvas = canvas.original_canvas
+        edits.reverse()
+        return edits
+
+    def memory_size(self):
+        if hasattr(self.delta, "memory_size"):
+            return sys.getsizeof(self) + self.delta.memory_size()
+        return sys.getsizeof(self) + sys.getsizeof(self.delta) + \
+            len(self.delta) * (sys.getsizeof((0, 0)) + sys.getsizeof(Point(0, 0, None)))
+
+    def edited_rows(self):
+        """
+        Returns the set of rows touched by the delta
+        """
+        if hasattr(self.delta, "rows"):
+            return self.delta.rows()
+        return {y for _, y in self.delta}
 
     @property
     def height(self):
@@ -142,7 +494,119 @@ class EditedCanvas(BaseCanvas):
         return self.original_canvas.width
 
     def point(self, x, y):
-        if (x, y) in self.delta:
-            return self.delta[(x, y)]
-        else:
-            return self.original_canvas.point(x, y)
+        canvas = self
+        while isinstance(canvas, EditedCanvas):
+            bounds = canvas.chain_bounds
+            if bounds is None or not (bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]):
+                # None of the edits down to the base canvas painted the point
+                return canvas.base.point(x, y)
+            bounds = canvas.bounds
+            if bounds is not None and bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3] and \
+                    (x, y) in canvas.delta:
+                return canvas.delta[(x, y)]
+            canvas = canvas.original_canvas
+        return canvas.point(x, y)
+
+    def color_at(self, x, y):
+        bounds = self.chain_bounds
+        if bounds is None or not (bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]):
+            return self.base.color_at(x, y)
+        if self._layers is None:
+            self._layers = self._build_layers()
+        for x1, y1, x2, y2, delta, color in self._layers:
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                if color is None:
+                    point = delta.get((x, y))
+                    if point is not None:
+                        return point.color
+                elif (x, y) in delta:
+                    return color
+        return self.base.color_at(x, y)
+
+    def _build_layers(self):
+        """
+        Returns the bounds, delta and color (None if the points of the delta have different colors) of the edits
+        which painted some points, from the most recent to the oldest
+        """
+        layers = []
+        for edit in reversed(self.edits()):
+            if edit.bounds is not None:
+                color = edit.delta.color if getattr(edit.delta, "run_based", False) else None
+                layers.append(edit.bounds + (edit.delta, color))
+        return layers
+
+    def row_colors(self, y):
+        colors = self.base.row_colors(y)
+        if self.chain_bounds is None or not self.chain_bounds[1] <= y <= self.chain_bounds[3]:
+            return colors
+        for edit in self.edits():
+            if edit.bounds is None or not edit.bounds[1] <= y <= edit.bounds[3]:
+                continue
+            if hasattr(edit.delta, "paint_row"):
+                edit.delta.paint_row(y, colors)
+            else:
+                for x in range(len(colors)):
+                    if (x, y) in edit.delta:
+                        colors[x] = edit.delta[(x, y)].color
+        return colors
+
+    def _color_segments(self, y, color):
+        if self.chain_bounds is None or not self.chain_bounds[1] <= y <= self.chain_bounds[3]:
+            # None of the edits painted the row
+            return self.base._color_segments(y, color)
+        return super()._color_segments(y, color)
+
+
+def _union_bounds(a, b):
+    """
+    Returns the corners of the smallest box holding the boxes a and b (either may be None)
+    """
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+class CanvasFactory(object):
+    def create_canvas(self, width, height, palette, background_color):
+        """Creates a new blank canvas"""
+        return Canvas(width, height, PointFactory(background_color))
+
+
+class ArrayCanvasFactory(CanvasFactory):
+    def create_canvas(self, width, height, palette, background_color):
+        return ArrayCanvas(width, height, palette, background_color)
+
+
+class CompactionPolicy(object):
+    def __init__(self, max_depth=32, max_delta_size=None):
+        """
+        :param max_depth: Maximum number of edits stacked on top of the base canvas
+        :param max_delta_size: Maximum number of points stored in the edits stacked on top of the base canvas
+        """
+        assert max_depth is None or max_depth > 0, "Invalid max depth"
+        assert max_delta_size is None or max_delta_size > 0, "Invalid max delta size"
+        self.max_depth = max_depth
+        self.max_delta_size = max_delta_size
+
+    def should_compact(self, canvas):
+        if not isinstance(canvas, EditedCanvas):
+            return False
+        return (self.max_depth is not None and canvas.depth >= self.max_depth) or \
+            (self.max_delta_size is not None and canvas.delta_size >= self.max_delta_size)
+
+    def compact(self, canvas):
+        """
+        Folds the chain of edits of canvas into a fresh base canvas
+        """
+        return compact(canvas)
+
+
+def compact(canvas):
+    """
+    Folds the chain of edits of canvas into a fresh base canvas holding the same points
+    """
+    if not isinstance(canvas, EditedCanvas):
+        return canvas
+    snapshot = canvas.base.snapshot(canvas)
+    snapshot._version = canvas.version
+    return snapshot
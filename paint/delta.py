@@ -0,0 +1,239 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+import sys
+
+from .point import Point
+
+
+def point_bounds(coordinates):
+    """
+    Returns the corners (x1, y1, x2, y2) of the bounding box of the coordinates (x, y), None if there are none
+    """
+    x1 = y1 = x2 = y2 = None
+    for x, y in coordinates:
+        if x1 is None:
+            x1 = x2 = x
+            y1 = y2 = y
+        else:
+            if x < x1:
+                x1 = x
+            elif x > x2:
+                x2 = x
+            if y < y1:
+                y1 = y
+            elif y > y2:
+                y2 = y
+    return None if x1 is None else (x1, y1, x2, y2)
+
+
+class DictDelta(dict):
+    """
+    Delta mapping the coordinates (x, y) of every painted point to the new point.
+    Its bounds and row index are built on first use: the delta must not change once applied to a canvas.
+    """
+    run_based = False
+
+    _bounds = None
+    _row_index = None
+
+    @classmethod
+    def from_points(cls, points, color, point_factory):
+        return cls(
+            ((p.x, p.y), point_factory.create_point(p.x, p.y, color))
+            for p in points
+        )
+
+    @classmethod
+    def from_coordinates(cls, xs, ys, color, point_factory):
+        """
+        Creates the delta out of the lists of the x and y coordinates of the painted points
+        """
+        return cls(
+            ((x, y), point_factory.create_point(x, y, color))
+            for x, y in zip(xs, ys)
+        )
+
+    @classmethod
+    def from_runs(cls, runs, color, point_factory):
+        return cls(
+            ((x, y), point_factory.create_point(x, y, color))
+            for y, x1, x2 in runs
+            for x in range(x1, x2 + 1)
+        )
+
+    def rows(self):
+        """
+        Returns the set of rows touched by the delta
+        """
+        return {y for _, y in self}
+
+    def bounds(self):
+        """
+        Returns the corners (x1, y1, x2, y2) of the bounding box of the delta, None if it's empty
+        """
+        if self._bounds is None and self:
+            self._bounds = point_bounds(self)
+        return self._bounds
+
+    def memory_size(self):
+        """
+        Estimated number of bytes held by the delta
+        """
+        # Every entry has its own key tuple and point
+        return sys.getsizeof(self) + len(self) * (sys.getsizeof((0, 0)) + sys.getsizeof(Point(0, 0, None)))
+
+    def paint_row(self, y, colors):
+        """
+        Paints the points of the delta in the row y on the list of colors
+        """
+        if self._row_index is None:
+            self._row_index = {}
+            for (x, y_), point in self.items():
+                self._row_index.setdefault(y_, []).append((x, point.color))
+        for x, color in self._row_index.get(y, ()):
+            colors[x] = color
+
+
+class RunDelta(Mapping):
+    """
+    Delta painting every point with the same color, stored as sorted horizontal runs per row.
+    Looking up a point costs O(log runs) in its row.
+    """
+    run_based = True
+
+    def __init__(self, color, point_factory):
+        self.color = color
+        self._point_factory = point_factory
+        # Sorted starts and ends of the runs, indexed by row
+        self._rows = {}
+        self._size = 0
+
+    @classmethod
+    def from_points(cls, points, color, point_factory):
+        points = list(points)
+        return cls.from_coordinates([p.x for p in points], [p.y for p in points], color, point_factory)
+
+    @classmethod
+    def from_coordinates(cls, xs, ys, color, point_factory):
+        """
+        Creates the delta out of the lists of the x and y coordinates of the painted points
+        """
+        rows = {}
+        for x, y in zip(xs, ys):
+            rows.setdefault(y, set()).add(x)
+
+        delta = cls(color, point_factory)
+        for y, xs in rows.items():
+            xs = sorted(xs)
+            start = end = xs[0]
+            for x in xs[1:]:
+                if x != end + 1:
+                    delta.add_run(y, start, end)
+                    start = x
+                end = x
+            delta.add_run(y, start, end)
+        return delta
+
+    @classmethod
+    def from_runs(cls, runs, color, point_factory):
+        delta = cls(color, point_factory)
+        for y, x1, x2 in runs:
+            delta.add_run(y, x1, x2)
+        return delta
+
+    def add_run(self, y, x1, x2):
+        """
+        Paints the points between (x1, y) and (x2, y), both ends included
+        """
+        starts, ends = self._rows.setdefault(y, ([], []))
+        # Runs overlapping or adjacent to the new one get merged into it
+        i = bisect_left(ends, x1 - 1)
+        j = bisect_right(starts, x2 + 1)
+        if i < j:
+            x1 = min(x1, starts[i])
+            x2 = max(x2, ends[j - 1])
+            self._size -= sum(ends[k] - starts[k] + 1 for k in range(i, j))
+        starts[i:j] = [x1]
+        ends[i:j] = [x2]
+        self._size += x2 - x1 + 1
+
+    def rows(self):
+        """
+        Returns the set of rows touched by the delta
+        """
+        return set(self._rows)
+
+    def bounds(self):
+        """
+        Returns the corners (x1, y1, x2, y2) of the bounding box of the delta, None if it's empty
+        """
+        if not self._rows:
+            return None
+        return (
+            min(starts[0] for starts, _ in self._rows.values()),
+            min(self._rows),
+            max(ends[-1] for _, ends in self._rows.values()),
+            max(self._rows)
+        )
+
+    def memory_size(self):
+        """
+        Estimated number of bytes held by the delta
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self._rows)
+        for starts, ends in self._rows.values():
+            # Row tuple, lists and the integers they hold
+            size += sys.getsizeof((starts, ends)) + sys.getsizeof(starts) + sys.getsizeof(ends) + \
+                2 * len(starts) * sys.getsizeof(0)
+        return size
+
+    def paint_row(self, y, colors):
+        """
+        Paints the points of the delta in the row y on the list of colors
+        """
+        if y in self._rows:
+            starts, ends = self._rows[y]
+            for x1, x2 in zip(starts, ends):
+                colors[x1:x2 + 1] = [self.color] * (x2 - x1 + 1)
+
+    def contains_run(self, y, x1, x2):
+        """
+        Returns True if every point between (x1, y) and (x2, y) is painted by the delta
+        """
+        try:
+            starts, ends = self._rows[y]
+        except KeyError:
+            return False
+        i = bisect_right(starts, x1) - 1
+        return i >= 0 and ends[i] >= x2
+
+    def runs(self):
+        """
+        Returns the runs (y, x1, x2) of the delta, sorted by row
+        """
+        for y in sorted(self._rows):
+            starts, ends = self._rows[y]
+            for x1, x2 in zip(starts, ends):
+                yield y, x1, x2
+
+    def __contains__(self, key):
+        x, y = key
+        try:
+            starts, ends = self._rows[y]
+        except KeyError:
+            return False
+        i = bisect_right(starts, x) - 1
+        return i >= 0 and ends[i] >= x
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self._point_factory.create_point(key[0], key[1], self.color)
+
+    def __iter__(self):
+        for y, x1, x2 in self.runs():
+            for x in range(x1, x2 + 1):
+                yield x, y
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,177 @@
+from .canvas import EditedCanvas, compact
+
+
+class History(object):
+    """
+    Undo/redo history of the canvases of a program.
+    The oldest canvases are evicted when the number of steps or the estimated memory exceed the limits, down to three
+    quarters of the limits.
+    """
+    def __init__(self, max_steps=1000, max_bytes=512 * 1024 * 1024):
+        """
+        :param max_steps: Maximum number of steps which can be undone, None for no limit
+        :param max_bytes: Maximum estimated number of bytes held by the history, None for no limit.
+                          The current canvas is always kept, even if it alone exceeds the limit.
+        """
+        assert max_steps is None or max_steps >= 0, "Invalid max steps"
+        assert max_bytes is None or max_bytes > 0, "Invalid max bytes"
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        # Canvases from the oldest to the newest, with the number of bytes each one adds to its predecessor
+        self._canvases = [None]
+        self._sizes = [0]
+        self._position = 0
+
+    @property
+    def canvas(self):
+        """
+        Current canvas
+        """
+        return self._canvases[self._position]
+
+    @property
+    def undo_steps(self):
+        return self._position
+
+    @property
+    def redo_steps(self):
+        return len(self._canvases) - self._position - 1
+
+    @property
+    def memory_usage(self):
+        """
+        Estimated number of bytes held by the canvases in the history
+        """
+        return sum(self._sizes)
+
+    def canvases(self):
+        """
+        Returns the canvases which can be undone or redone, from the oldest to the newest, the current one included
+        """
+        return list(self._canvases)
+
+    def push(self, canvas):
+        """
+        Makes canvas the current canvas, dropping the steps which could be redone
+        """
+        dropped = self._canvases[self._position + 1:]
+        del self._canvases[self._position + 1:]
+        del self._sizes[self._position + 1:]
+        self._canvases.append(canvas)
+        self._sizes.append(self._own_size(canvas, self._canvases[-2]))
+        self._position += 1
+        self._release(dropped + self._evict())
+
+    def reset(self, canvas=None):
+        """
+        Makes canvas the current canvas, dropping every step: it cannot be undone
+        """
+        dropped = self._canvases
+        self._canvases = [canvas]
+        self._sizes = [self._own_size(canvas, None)]
+        self._position = 0
+        self._release(dropped)
+
+    def undo(self):
+        """
+        Goes back to the previous canvas
+        :return: False if there is nothing to undo
+        """
+        if not self._position:
+            return False
+        self._position -= 1
+        return True
+
+    def redo(self):
+        """
+        Goes forward to the next canvas
+        :return: False if there is nothing to redo
+        """
+        if not self.redo_steps:
+            return False
+        self._position += 1
+        return True
+
+    def _evict(self):
+        """
+        Evicts the oldest canvases once the limits are exceeded, in batches so that the remaining canvases are only
+        rebased once every few pushes
+        :return: Evicted canvases, the ones replaced by the rebase included
+        """
+        evicted = []
+        if not self._exceeds(self.max_steps, self.max_bytes):
+            return evicted
+
+        max_steps = None if self.max_steps is None else self.max_steps - self.max_steps // 4
+        max_bytes = None if self.max_bytes is None else self.max_bytes - self.max_bytes // 4
+        while self._position and self._exceeds(max_steps, max_bytes):
+            evicted.append(self._canvases.pop(0))
+            del self._sizes[0]
+            self._position -= 1
+
+        if evicted:
+            evicted.append(self._canvases[0])
+            self._rebase()
+        return evicted
+
+    def _exceeds(self, max_steps, max_bytes):
+        return ((max_steps is not None and len(self._canvases) - 1 > max_steps) or
+                (max_bytes is not None and self.memory_usage > max_bytes))
+
+    def _release(self, dropped):
+        """
+        Closes the base canvases of the dropped canvases which none of the remaining canvases is built on
+        """
+        kept = {id(self._base(canvas)) for canvas in self._canvases}
+        for canvas in dropped:
+            base = self._base(canvas)
+            if base is not None and id(base) not in kept:
+                base.close()
+                kept.add(id(base))
+
+    @staticmethod
+    def _base(canvas):
+        return canvas.base if isinstance(canvas, EditedCanvas) else canvas
+
+    def _rebase(self):
+        """
+        Folds the oldest canvas into a fresh base canvas and rebuilds the edits stacked on it,
+        so that the evicted canvases are not referenced anymore
+        """
+        oldest = self._canvases[0]
+        if not isinstance(oldest, EditedCanvas):
+            return
+
+        self._canvases[0] = compact(oldest)
+        replaced = oldest
+        rebased_count = 1
+        for i in range(1, len(self._canvases)):
+            canvas = self._canvases[i]
+            if not (isinstance(canvas, EditedCanvas) and canvas.original_canvas is replaced):
+                # Not built on the canvases being replaced
+                break
+            rebased = EditedCanvas(self._canvases[i - 1], canvas.delta)
+            rebased._version = canvas.version
+            self._canvases[i] = rebased
+            replaced = canvas
+            rebased_count += 1
+
+        # Only the sizes of the rebased canvases and of the one following them can change
+        for i in range(min(rebased_count + 1, len(self._canvases))):
+            self._sizes[i] = self._own_size(self._canvases[i], self._canvases[i - 1] if i else None)
+
+    @staticmethod
+    def _own_size(canvas, previous):
+        """
+        Estimated number of bytes held by canvas which are not already held by the previous canvas
+        """
+        held = set()
+        while previous is not None:
+            held.add(id(previous))
+            previous = previous.original_canvas if isinstance(previous, EditedCanvas) else None
+
+        size = 0
+        while canvas is not None and id(canvas) not in held:
+            size += canvas.memory_size()
+            canvas = canvas.original_canvas if isinstance(canvas, EditedCanvas) else None
+        return size
@@ -0,0 +1,152 @@
+"""
+Image exporters: the canvas is written row by row, so that only one row is held in memory at a time
+"""
+import colorsys
+import os
+import struct
+import sys
+import zlib
+
+from .storage import replace_file
+
+
+def default_rgb_map(palette, background_color):
+    """
+    Maps the background color to white and the other colors of the palette to hues evenly spread around the wheel
+    :return: Dict of color -> (red, green, blue)
+    """
+    colors = sorted(color for color in palette if color != background_color)
+    rgb_map = {background_color: (255, 255, 255)}
+    for i, color in enumerate(colors):
+        rgb_map[color] = tuple(int(round(c * 255)) for c in colorsys.hsv_to_rgb(i / len(colors), 0.8, 0.7))
+    return rgb_map
+
+
+class ImageWriter(object):
+    def __init__(self, rgb_map, renderer=None):
+        """
+        :param rgb_map: Dict of color -> (red, green, blue), with components between 0 and 255
+        :param renderer: ParallelRenderer rendering the rows of large canvases in a pool of processes
+        """
+        assert all(len(rgb) == 3 and all(0 <= c <= 255 for c in rgb) for rgb in rgb_map.values()), "Invalid RGB"
+        self.rgb_map = rgb_map
+        self.renderer = renderer
+
+    def write(self, canvas, stream):
+        """
+        Writes the canvas as an image to a binary stream
+        """
+        raise NotImplementedError
+
+    def _rows(self, canvas, pixels):
+        """
+        Yields the rows of the canvas as bytes, a point being converted to the bytes pixels[color]
+        """
+        if self.renderer is not None and self.renderer.accepts(canvas):
+            try:
+                rows = self.renderer.iter_rows(canvas, lambda color: pixels[color])
+            except KeyError as e:
+                raise ValueError("Color {!r} has no RGB value".format(e.args[0]))
+            if rows is not None:
+                yield from rows
+                return
+
+        for y in range(canvas.height):
+            try:
+                yield b"".join([pixels[color] for color in canvas.row_colors(y)])
+            except KeyError as e:
+                raise ValueError("Color {!r} has no RGB value".format(e.args[0]))
+
+
+class PpmWriter(ImageWriter):
+    """
+    Binary PPM (P6): a text header followed by 3 bytes per point
+    """
+    def write(self, canvas, stream):
+        pixels = {color: bytes(rgb) for color, rgb in self.rgb_map.items()}
+        stream.write("P6\n{} {}\n255\n".format(canvas.width, canvas.height).encode("ascii"))
+        for row in self._rows(canvas, pixels):
+            stream.write(row)
+
+
+class PngWriter(ImageWriter):
+    """
+    Indexed color PNG: one byte per point (its index in the palette), compressed with zlib
+    """
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    # Compressed bytes buffered before writing an IDAT chunk
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, rgb_map, compression_level=6, renderer=None):
+        super().__init__(rgb_map, renderer)
+        assert len(rgb_map) <= 256, "PNG palettes cannot contain more than 256 colors"
+        self.compression_level = compression_level
+
+    def write(self, canvas, stream):
+        colors = sorted(self.rgb_map)
+        pixels = {color: bytes([index]) for index, color in enumerate(colors)}
+
+        stream.write(self.SIGNATURE)
+        # 8 bits per point, color type 3 (indexed), default compression, filter and no interlacing
+        self._write_chunk(stream, b"IHDR", struct.pack(">IIBBBBB", canvas.width, canvas.height, 8, 3, 0, 0, 0))
+        self._write_chunk(stream, b"PLTE", b"".join(bytes(self.rgb_map[color]) for color in colors))
+
+        compressor = zlib.compressobj(self.compression_level)
+        buffer = []
+        buffer_size = 0
+        for row in self._rows(canvas, pixels):
+            # Every row starts with its filter type (0: none)
+            data = compressor.compress(b"\x00" + row)
+            if data:
+                buffer.append(data)
+                buffer_size += len(data)
+            if buffer_size >= self.CHUNK_SIZE:
+                self._write_chunk(stream, b"IDAT", b"".join(buffer))
+                buffer = []
+                buffer_size = 0
+        buffer.append(compressor.flush())
+        self._write_chunk(stream, b"IDAT", b"".join(buffer))
+        self._write_chunk(stream, b"IEND", b"")
+
+    @staticmethod
+    def _write_chunk(stream, chunk_type, data):
+        stream.write(struct.pack(">I", len(data)))
+        stream.write(chunk_type)
+        stream.write(data)
+        stream.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+
+IMAGE_WRITERS = {
+    ".ppm": PpmWriter,
+    ".png": PngWriter,
+}
+
+
+def export_canvas(canvas, path, rgb_map):
+    """
+    Writes the canvas to an image file, whose format is given by its extension (.ppm or .png).
+    The file is replaced atomically, so that a canvas mapped from it is left untouched.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in IMAGE_WRITERS:
+        raise ValueError("Unsupported image format {}".format(extension or path))
+    writer = IMAGE_WRITERS[extension](rgb_map)
+    with replace_file(path) as stream:
+        writer.write(canvas, stream)
+
+
+class ImageCanvasPrinter(object):
+    """
+    Printer writing the canvas as an image to a binary stream (the standard output by default)
+    """
+    def __init__(self, writer, stream=None):
+        self.writer = writer
+        self._stream = sys.stdout.buffer if stream is None else stream
+
+    def print_canvas(self, canvas):
+        self.writer.write(canvas, self._stream)
+        self._stream.flush()
+
+    def print_text(self, text):
+        # The stream only holds images
+        sys.stderr.write(text + "\n")
@@ -0,0 +1,178 @@
+"""
+Write-ahead journal of the commands of a program, with periodic checkpoints of its canvas.
+
+The directory holds, for the latest checkpoint N, the canvas file checkpoint-N.pntc (missing if there was no canvas)
+and the journal-N.log file of the commands executed since, one per line with their arguments quoted as shell words
+(shlex), so that any argument (e.g. the color " ") is replayed as it was. The journal file is created once the
+checkpoint is safely written, so the latest journal file always belongs to a complete checkpoint.
+Recovering loads the checkpoint and replays its journal only, which holds at most checkpoint_every commands.
+"""
+import os
+import re
+import shlex
+
+from .program import CommandError, LoadCommand, RedoCommand, UndoCommand
+from .storage import load_canvas, replace_file, save_canvas
+
+
+class JournalError(Exception):
+    pass
+
+
+class CommandJournal(object):
+    JOURNAL_FILE = re.compile(r"^journal-(\d+)\.log$")
+
+    def __init__(self, directory, checkpoint_every=1000, fsync_every=1):
+        """
+        :param directory: Directory of the checkpoints and journal files (created if missing)
+        :param checkpoint_every: Number of journaled commands between two checkpoints
+        :param fsync_every: Number of journaled commands between two flushes of the journal to the disk,
+                            None to leave it to the operating system
+        """
+        assert checkpoint_every > 0, "Invalid checkpoint interval"
+        assert fsync_every is None or fsync_every > 0, "Invalid fsync interval"
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.fsync_every = fsync_every
+        self.checkpoint_number = 0
+        self._file = None
+        self._entries = 0
+        self._unsynced = 0
+        # Versions of the canvases the commands of the journal go through when replayed from the checkpoint
+        self._versions = set()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def entries(self):
+        """
+        Number of commands journaled since the latest checkpoint
+        """
+        return self._entries
+
+    def checkpoint_path(self, number):
+        return os.path.join(self.directory, "checkpoint-{:08d}.pntc".format(number))
+
+    def journal_path(self, number):
+        return os.path.join(self.directory, "journal-{:08d}.log".format(number))
+
+    def latest_checkpoint(self):
+        """
+        Returns the number of the latest complete checkpoint, 0 if there is none
+        """
+        numbers = [int(match.group(1)) for match in map(self.JOURNAL_FILE.match, os.listdir(self.directory)) if match]
+        return max(numbers, default=0)
+
+    def recover(self, program):
+        """
+        Restores the canvas of the program from the latest checkpoint and replays the commands journaled since,
+        then starts journaling the commands of the program.
+        The steps before the checkpoint cannot be undone.
+        :return: The number of replayed commands
+        """
+        state = program.state
+        number = self.latest_checkpoint()
+        canvas = None
+        if number and os.path.exists(self.checkpoint_path(number)):
+            # Mapped from the file, like the canvases opened by the LOAD command
+            canvas = load_canvas(self.checkpoint_path(number), state.palette)
+        state.history.reset(canvas)
+
+        lines = []
+        if number:
+            with open(self.journal_path(number), encoding="utf-8") as journal:
+                lines = journal.read().split("\n")
+            # The last line is either empty or was cut by a crash while being written
+            lines.pop()
+
+        self.close()
+        state.journal, profiler, state.profiler = None, state.profiler, None
+        try:
+            for line_number, line in enumerate(lines, 1):
+                try:
+                    program.execute_command(*shlex.split(line))
+                except (CommandError, ValueError) as e:
+                    raise JournalError("Cannot replay line {} of {}: {}".format(
+                        line_number, self.journal_path(number), e.args[0]
+                    ))
+        finally:
+            state.journal, state.profiler = self, profiler
+
+        # Commands written after a cut line would be lost: the replayed state gets a checkpoint of its own
+        self.checkpoint(state)
+        return len(lines)
+
+    def record(self, state, command, args, previous_canvas):
+        """
+        Journals a command executed successfully, which changed the canvas from previous_canvas to state.canvas
+        """
+        canvas = state.canvas
+        version = None if canvas is None else canvas.version
+        if canvas is previous_canvas:
+            # Commands which don't change the canvas (printing, saving...) are not replayed
+            return
+        line = " ".join(shlex.quote(str(arg)) for arg in args)
+        if not self.checkpoint_number or "\n" in line or isinstance(command, LoadCommand) or (
+                isinstance(command, (UndoCommand, RedoCommand)) and version not in self._versions):
+            # The canvas cannot be reproduced by replaying the journal (there is no checkpoint yet, an argument
+            # spans lines, the file may change or the canvases before the checkpoint are lost)
+            self.checkpoint(state)
+            return
+
+        if self._file is None:
+            self._file = open(self.journal_path(self.checkpoint_number), "a", encoding="utf-8")
+        self._file.write(line + "\n")
+        self._versions.add(version)
+        self._entries += 1
+        self._unsynced += 1
+        if self.fsync_every is not None and self._unsynced >= self.fsync_every:
+            self.sync()
+        if self._entries >= self.checkpoint_every:
+            self.checkpoint(state)
+
+    def sync(self):
+        """
+        Flushes the journal to the disk
+        """
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def checkpoint(self, state):
+        """
+        Writes the canvas to a new checkpoint, starts its journal and deletes the previous ones
+        """
+        number = self.latest_checkpoint() + 1
+        canvas = state.canvas
+        if canvas is not None:
+            save_canvas(canvas, self.checkpoint_path(number), state.palette, fsync=True)
+        self.close()
+        with replace_file(self.journal_path(number), "w", fsync=True):
+            pass
+        self._sync_directory()
+
+        for previous in range(self.checkpoint_number, number):
+            for path in (self.checkpoint_path(previous), self.journal_path(previous)):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+        self.checkpoint_number = number
+        self._entries = 0
+        self._versions = {None if canvas is None else canvas.version}
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _sync_directory(self):
+        """
+        Flushes the creation of files in the directory to the disk, where supported
+        """
+        if hasattr(os, "O_DIRECTORY"):
+            descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
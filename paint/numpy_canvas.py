@@ -0,0 +1,391 @@
+from collections.abc import Mapping
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
+from .canvas import BaseCanvas, CanvasFactory, EditedCanvas, PointOutOfCanvas, compact
+from .delta import RunDelta
+from .painter import Painter
+from .point import Point
+
+
+def line_coordinates(x1, y1, x2, y2):
+    """
+    Returns the arrays of the x and y coordinates of the points of the line between (x1, y1) and (x2, y2),
+    rasterised like BaseCanvas.line_coordinates
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    if abs(dx) > abs(dy):
+        xs, ys = _rasterise(x1, y1, dx, dy)
+    else:
+        ys, xs = _rasterise(y1, x1, dy, dx)
+    return xs, ys
+
+
+def _rasterise(major_start, minor_start, major_delta, minor_delta):
+    step = 1 if major_delta >= 0 else -1
+    length = abs(major_delta)
+    steps = numpy.arange(length + 1, dtype=numpy.int64)
+    majors = major_start + steps * step
+    if length == 0:
+        return majors, numpy.full(1, minor_start, dtype=numpy.int64)
+    # Offset along the minor axis rounded to the nearest integer, ties to even
+    quotients, remainders = numpy.divmod(steps * minor_delta, length)
+    doubled = 2 * remainders
+    round_up = (doubled > length) | ((doubled == length) & (quotients & 1 == 1))
+    return majors, minor_start + quotients + round_up
+
+
+def polygon_coordinates(*args):
+    """
+    Returns the arrays of the x and y coordinates of the points of the border of the polygon
+    """
+    assert len(args) >= 3, "A polygon is made of at least 3 points"
+    edges = [
+        line_coordinates(p1[0], p1[1], p2[0], p2[1])
+        for p1, p2 in zip(args, args[1:] + args[:1])
+    ]
+    return numpy.concatenate([xs for xs, _ in edges]), numpy.concatenate([ys for _, ys in edges])
+
+
+def mask_runs(mask):
+    """
+    Returns the arrays of rows, starts and ends of the horizontal runs of True values in a 2-D boolean array
+    """
+    height, width = mask.shape
+    padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    changes = numpy.diff(padded, axis=1)
+    ys, starts = numpy.nonzero(changes == 1)
+    _, ends = numpy.nonzero(changes == -1)
+    return ys, starts, ends - 1
+
+
+class MaskDelta(Mapping):
+    """
+    Delta painting every point with the same color, stored as a bitmask over the bounding box of the painted points
+    """
+    run_based = True
+
+    def __init__(self, mask, x0, y0, color, point_factory):
+        """
+        :param mask: 2-D boolean array of the painted points within the bounding box
+        :param x0: Column of the top left corner of the bounding box
+        :param y0: Row of the top left corner of the bounding box
+        """
+        self.color = color
+        self.x0 = x0
+        self.y0 = y0
+        self._point_factory = point_factory
+        self._height, self._width = mask.shape
+        self._bits = numpy.packbits(mask, axis=1)
+        self._size = int(numpy.count_nonzero(mask))
+
+    @classmethod
+    def from_mask(cls, mask, color, point_factory):
+        """
+        Creates the delta out of a boolean array as big as the canvas
+        """
+        rows = numpy.flatnonzero(mask.any(axis=1))
+        columns = numpy.flatnonzero(mask.any(axis=0))
+        if not len(rows):
+            return cls(numpy.zeros((0, 0), dtype=bool), 0, 0, color, point_factory)
+        y0, y1 = int(rows[0]), int(rows[-1])
+        x0, x1 = int(columns[0]), int(columns[-1])
+        return cls(mask[y0:y1 + 1, x0:x1 + 1], x0, y0, color, point_factory)
+
+    @classmethod
+    def from_coordinates(cls, xs, ys, color, point_factory):
+        """
+        Creates the delta out of the arrays of the x and y coordinates of the painted points
+        """
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        x0, y0 = int(xs.min()), int(ys.min())
+        mask = numpy.zeros((int(ys.max()) - y0 + 1, int(xs.max()) - x0 + 1), dtype=bool)
+        mask[ys - y0, xs - x0] = True
+        return cls(mask, x0, y0, color, point_factory)
+
+    @classmethod
+    def from_runs(cls, runs, color, point_factory):
+        """
+        Creates the delta out of horizontal runs (y, x1, x2)
+        """
+        runs = list(runs)
+        x0 = min(x1 for _, x1, _ in runs)
+        y0 = min(y for y, _, _ in runs)
+        mask = numpy.zeros(
+            (max(y for y, _, _ in runs) - y0 + 1, max(x2 for _, _, x2 in runs) - x0 + 1),
+            dtype=bool
+        )
+        for y, x1, x2 in runs:
+            mask[y - y0, x1 - x0:x2 - x0 + 1] = True
+        return cls(mask, x0, y0, color, point_factory)
+
+    @property
+    def mask(self):
+        """
+        2-D boolean array of the painted points within the bounding box
+        """
+        return numpy.unpackbits(self._bits, axis=1, count=self._width).astype(bool)
+
+    def apply(self, pixels, value):
+        """
+        Paints the points of the delta on a 2-D array of pixels
+        """
+        pixels[self.y0:self.y0 + self._height, self.x0:self.x0 + self._width][self.mask] = value
+
+    def memory_size(self):
+        return sys.getsizeof(self) + self._bits.nbytes
+
+    def rows(self):
+        return set((numpy.flatnonzero(self._bits.any(axis=1)) + self.y0).tolist())
+
+    def bounds(self):
+        if not self._size:
+            return None
+        return self.x0, self.y0, self.x0 + self._width - 1, self.y0 + self._height - 1
+
+    def runs(self):
+        ys, starts, ends = mask_runs(self.mask)
+        return zip((ys + self.y0).tolist(), (starts + self.x0).tolist(), (ends + self.x0).tolist())
+
+    def paint_row(self, y, colors):
+        y -= self.y0
+        if 0 <= y < self._height:
+            xs = numpy.flatnonzero(numpy.unpackbits(self._bits[y], count=self._width)) + self.x0
+            for x in xs.tolist():
+                colors[x] = self.color
+
+    def __contains__(self, key):
+        x = key[0] - self.x0
+        y = key[1] - self.y0
+        return 0 <= x < self._width and 0 <= y < self._height and \
+            bool((self._bits[y, x >> 3] >> (7 - (x & 7))) & 1)
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self._point_factory.create_point(key[0], key[1], self.color)
+
+    def __iter__(self):
+        ys, xs = numpy.nonzero(self.mask)
+        return zip((xs + self.x0).tolist(), (ys + self.y0).tolist())
+
+    def __len__(self):
+        return self._size
+
+
+class NumpyCanvas(BaseCanvas):
+    """
+    Canvas storing the palette index of every point in a 2-D numpy array of bytes
+    """
+    def __init__(self, width, height, palette, background_color):
+        assert numpy is not None, "NumPy is not installed"
+        assert width > 0 and height > 0, "Invalid width or height"
+        self._colors = tuple(sorted(palette))
+        assert len(self._colors) <= 256, "The palette cannot contain more than 256 colors"
+        self._indices = {color: index for index, color in enumerate(self._colors)}
+        assert background_color in self._indices, "The background color is not in the palette"
+        self._color_array = numpy.array(self._colors, dtype=object)
+        self._pixels = numpy.full((height, width), self._indices[background_color], dtype=numpy.uint8)
+
+    def _with_pixels(self, pixels):
+        canvas = NumpyCanvas.__new__(NumpyCanvas)
+        canvas._colors = self._colors
+        canvas._indices = self._indices
+        canvas._color_array = self._color_array
+        canvas._pixels = pixels
+        return canvas
+
+    @property
+    def width(self):
+        return self._pixels.shape[1]
+
+    @property
+    def height(self):
+        return self._pixels.shape[0]
+
+    @property
+    def pixels(self):
+        """
+        2-D array (rows first) of the palette indices of the points
+        """
+        return self._pixels
+
+    def point(self, x, y):
+        if not self.exists(x, y):
+            raise PointOutOfCanvas
+        return Point(x, y, self._colors[self._pixels[y, x]])
+
+    def color_at(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise PointOutOfCanvas
+        return self._colors[self._pixels[y, x]]
+
+    def row_colors(self, y):
+        if not 0 <= y < self.height:
+            raise PointOutOfCanvas
+        return self._color_array[self._pixels[y]].tolist()
+
+    def memory_size(self):
+        return sys.getsizeof(self) + self._pixels.nbytes
+
+    def area_mask(self, x, y):
+        """
+        Returns the 2-D boolean array of the points of the area connected to (x, y).
+        The points of its color are labelled by connected area with SciPy when it's installed, otherwise the
+        horizontal runs of its color are joined with the runs they touch in the next row.
+        """
+        same_color = self._pixels == self._pixels[y, x]
+        if ndimage is not None:
+            labels, _ = ndimage.label(same_color)
+            return labels == labels[y, x]
+
+        labels = self._run_labels(same_color)
+        roots = self._join_runs(labels[:-1], labels[1:], int(labels.max()))
+        return roots[labels] == roots[labels[y, x]]
+
+    @staticmethod
+    def _join_runs(upper, lower, count):
+        """
+        Union-find of the runs labelled 1 to count, the ones touching between two consecutive rows being joined
+        :param upper: Run labels of every row but the last
+        :param lower: Run labels of every row but the first
+        :return: Array mapping every label to the label of its area (0 to itself)
+        """
+        touching = (upper > 0) & (lower > 0)
+        pairs = numpy.unique(upper[touching].astype(numpy.int64) * (count + 1) + lower[touching])
+        firsts, seconds = numpy.divmod(pairs, count + 1)
+
+        roots = numpy.arange(count + 1)
+        while True:
+            a, b = roots[firsts], roots[seconds]
+            joined = a != b
+            if not joined.any():
+                return roots
+            # Every root is attached to the smallest root it touches, then every label is pointed to its new root
+            numpy.minimum.at(roots, numpy.maximum(a[joined], b[joined]), numpy.minimum(a[joined], b[joined]))
+            while True:
+                parents = roots[roots]
+                if numpy.array_equal(parents, roots):
+                    break
+                roots = parents
+
+    @staticmethod
+    def _run_labels(mask):
+        """
+        Labels every horizontal run of True values with a distinct positive number (0 outside of the runs)
+        """
+        starts = mask.copy()
+        starts[:, 1:] &= ~mask[:, :-1]
+        return numpy.cumsum(starts, dtype=numpy.int32).reshape(mask.shape) * mask
+
+    def uniform_area_runs(self, x, y):
+        if not self.exists(x, y):
+            raise PointOutOfCanvas
+        ys, starts, ends = mask_runs(self.area_mask(x, y))
+        return zip(ys.tolist(), starts.tolist(), ends.tolist())
+
+    def _color_segments(self, y, color):
+        if color not in self._indices:
+            return []
+        _, starts, ends = mask_runs(self._pixels[y:y + 1] == self._indices[color])
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def snapshot(self, canvas):
+        if isinstance(canvas, EditedCanvas) and canvas.base is self:
+            # Copies the pixels and replays the edits rather than reading every point through the chain
+            pixels = self._pixels.copy()
+            for edit in canvas.edits():
+                self._apply(pixels, edit.delta)
+        else:
+            pixels = numpy.array(
+                [[self._indices[color] for color in canvas.row_colors(y)] for y in range(canvas.height)],
+                dtype=numpy.uint8
+            )
+        return self._with_pixels(pixels)
+
+    def _apply(self, pixels, delta):
+        if isinstance(delta, MaskDelta):
+            delta.apply(pixels, self._indices[delta.color])
+        elif isinstance(delta, RunDelta):
+            value = self._indices[delta.color]
+            for y, x1, x2 in delta.runs():
+                pixels[y, x1:x2 + 1] = value
+        else:
+            for (x, y), point in delta.items():
+                pixels[y, x] = self._indices[point.color]
+
+
+class NumpyPainter(Painter):
+    """
+    Painter rasterising shapes and filling areas with vectorised operations when the canvas is a NumpyCanvas.
+    Edits are stored as MaskDelta, other canvases are painted like Painter does.
+    """
+    @staticmethod
+    def _vectorised(canvas):
+        base = canvas.base if isinstance(canvas, EditedCanvas) else canvas
+        return isinstance(base, NumpyCanvas)
+
+    def _paint_coordinates(self, canvas, xs, ys, color):
+        if xs.min() < 0 or ys.min() < 0 or xs.max() >= canvas.width or ys.max() >= canvas.height:
+            raise PointOutOfCanvas
+        return self._edit(canvas, MaskDelta.from_coordinates(xs, ys, color, self._point_factory))
+
+    def draw_line(self, canvas, x1, y1, x2, y2, color):
+        if not self._vectorised(canvas):
+            return super().draw_line(canvas, x1, y1, x2, y2, color)
+        xs, ys = line_coordinates(x1, y1, x2, y2)
+        return self._paint_coordinates(canvas, xs, ys, color)
+
+    def draw_rectangle(self, canvas, x1, y1, x2, y2, color):
+        if not self._vectorised(canvas):
+            return super().draw_rectangle(canvas, x1, y1, x2, y2, color)
+        xs, ys = polygon_coordinates((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+        return self._paint_coordinates(canvas, xs, ys, color)
+
+    def draw_polygon(self, canvas, color, *args):
+        if not self._vectorised(canvas):
+            return super().draw_polygon(canvas, color, *args)
+        xs, ys = polygon_coordinates(*args)
+        return self._paint_coordinates(canvas, xs, ys, color)
+
+    def fill_rectangle(self, canvas, x1, y1, x2, y2, color):
+        if not self._vectorised(canvas):
+            return super().fill_rectangle(canvas, x1, y1, x2, y2, color)
+        canvas.coordinate(x1, y1)
+        canvas.coordinate(x2, y2)
+        mask = numpy.ones((abs(y2 - y1) + 1, abs(x2 - x1) + 1), dtype=bool)
+        return self._edit(canvas, MaskDelta(mask, min(x1, x2), min(y1, y2), color, self._point_factory))
+
+    def fill_polygon(self, canvas, color, *args):
+        if not self._vectorised(canvas):
+            return super().fill_polygon(canvas, color, *args)
+        return self._edit(canvas, MaskDelta.from_runs(canvas.filled_polygon(*args), color, self._point_factory))
+
+    def bucket_fill(self, canvas, x, y, color):
+        if not self._vectorised(canvas) or self._region_index is not None:
+            return super().bucket_fill(canvas, x, y, color)
+        # Labelling needs the pixels of the whole canvas
+        canvas = compact(canvas)
+        return self._edit(canvas, MaskDelta.from_mask(canvas.area_mask(x, y), color, self._point_factory))
+
+
+class NumpyCanvasFactory(CanvasFactory):
+    """
+    Creates a NumpyCanvas, or a Canvas when NumPy is not installed
+    """
+    def create_canvas(self, width, height, palette, background_color):
+        if numpy is None:
+            return super().create_canvas(width, height, palette, background_color)
+        return NumpyCanvas(width, height, palette, background_color)
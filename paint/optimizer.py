@@ -0,0 +1,345 @@
+"""
+Peephole optimiser of command scripts.
+
+The script is first run against stand-in canvases which only know their size and the points each command paints,
+through the command classes of the program, so that commands are validated exactly as they would be. Every canvas
+knows the canvas it was painted on: the commands the final canvas and the outputs (P, SAVE, EXPORT, S) don't depend
+on are dead (drawings reset by C, edits undone and never redone...). Draws whose points are all painted again by the
+draws following them, before anything reads the canvas, are dropped as well.
+The kept commands are then laid out again, with the undo/redo commands needed to paint each one on the same canvas
+as in the original script, and consecutive draws painted on one another are merged into a single delta layer.
+"""
+from .canvas import BaseCanvas, CanvasFactory
+from .delta import RunDelta
+from .history import History
+from .painter import Painter
+from .program import CanvasCommand, CommandError, ExportCommand, PainterCommand, PrintCommand, ProgramState, \
+    QuitCommand, RedoCommand, SaveCommand, StatsCommand, UndoCommand
+
+
+class _ScriptCanvas(BaseCanvas):
+    """
+    Stand-in for a canvas painted by a command of the script
+    """
+    def __init__(self, width, height, original_canvas=None, delta=None):
+        """
+        :param original_canvas: _ScriptCanvas the command painted on, None for new canvases
+        :param delta: RunDelta of the painted points, None if they depend on the colors of the canvas (bucket fill)
+        """
+        self._width = width
+        self._height = height
+        self.original_canvas = original_canvas
+        self.delta = delta
+        # Command which created the canvas (None if it was already in the history) and the kept commands painting on it
+        self.step = None
+        self.consumers = []
+        # The final canvas and the canvases outputs are made of are targets, needed canvases lead to one
+        self.target = False
+        self.needed = False
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+
+class _ScriptPainter(Painter):
+    """
+    Painter of _ScriptCanvas: records the points each command paints rather than painting them
+    """
+    def _edit(self, canvas, delta):
+        return _ScriptCanvas(canvas.width, canvas.height, canvas, delta)
+
+    def bucket_fill(self, canvas, x, y, color):
+        return _ScriptCanvas(canvas.width, canvas.height, canvas)
+
+
+class _ScriptCanvasFactory(CanvasFactory):
+    def create_canvas(self, width, height, palette, background_color):
+        return _ScriptCanvas(width, height)
+
+
+class _ScriptStep(object):
+    def __init__(self, line_number, args, result=None, output=None):
+        """
+        :param result: _ScriptCanvas created by the command (C and painter commands)
+        :param output: _ScriptCanvas output by the command (P, SAVE, EXPORT, S), None if there is no canvas
+        """
+        self.line_number = line_number
+        self.args = args
+        self.result = result
+        self.output = output
+
+
+class OptimizedScript(object):
+    REASONS = ("dead", "overpainted", "undo/redo", "invalid", "quit")
+
+    def __init__(self, commands):
+        """
+        :param commands: (line number, arguments) of the commands of the original script
+        """
+        self.original = len(commands)
+        # (line number, arguments) of the commands to run
+        self.commands = list(commands)
+        # Position in commands of the last draw of each group to merge -> number of draws in the group
+        self.groups = {}
+        # (line number, arguments, reason) of the removed commands, and (line number, message) of the invalid ones
+        self.removed = []
+        self.errors = []
+        # Number of undo/redo commands added to paint the commands on the right canvas
+        self.inserted = 0
+        # Whether the original script ran commands after its last P, to print the canvas at the end even if they
+        # were all removed
+        self.print_at_end = False
+        # Why the script was left as it is, None if it was optimised
+        self.note = None
+
+    @property
+    def merged(self):
+        """
+        Number of draws merged into a delta layer with others
+        """
+        return sum(self.groups.values())
+
+    def report(self):
+        if self.note is not None:
+            return "Script not optimised: {}".format(self.note)
+        removed = {}
+        for _, _, reason in self.removed:
+            removed[reason] = removed.get(reason, 0) + 1
+        report = "Optimised {} commands into {}".format(self.original, len(self.commands))
+        if removed:
+            report += "; removed " + ", ".join(
+                "{} {}".format(removed[reason], reason) for reason in self.REASONS if reason in removed
+            )
+        if self.inserted:
+            report += "; inserted {} undo/redo".format(self.inserted)
+        if self.groups:
+            report += "; merged {} draws into {} delta layers".format(self.merged, len(self.groups))
+        if self.errors:
+            # Found while rewriting the script, so they are reported before its output
+            report += "; invalid commands reported before running the script"
+        return report
+
+
+class _Unoptimizable(Exception):
+    pass
+
+
+class ScriptOptimizer(object):
+    def __init__(self, merge_draws=True, window=32):
+        """
+        :param merge_draws: Merge consecutive draws painted on one another into a single delta layer (and undo step).
+                            Never done while journaling, since the journal replays the commands one by one.
+        :param window: Number of following commands looked at to find out whether a draw is painted over
+        """
+        assert window > 0, "Invalid window"
+        self.merge_draws = merge_draws
+        self.window = window
+        # Last optimised script
+        self.script = None
+
+    def optimize(self, program, commands):
+        """
+        Rewrites a script for the program, as it is at this time: the rewritten script paints the same final canvas,
+        and runs the outputs (P, SAVE, EXPORT, S) on the same canvases as the original one.
+        Canvases evicted from the history for memory (max_bytes) while running the script are not accounted for.
+        :param commands: (line number, arguments) of the commands of the script (see Program.parse_script)
+        :return: OptimizedScript
+        """
+        commands = list(commands)
+        try:
+            self.script = self._optimize(program, commands)
+        except _Unoptimizable as e:
+            self.script = OptimizedScript(commands)
+            self.script.note = e.args[0]
+        return self.script
+
+    def _optimize(self, program, commands):
+        script = OptimizedScript(commands)
+        script.commands = []
+        existing = [
+            None if canvas is None else _ScriptCanvas(canvas.width, canvas.height)
+            for canvas in program.state.history.canvases()
+        ]
+        state = ProgramState(
+            program.state.palette,
+            program.state.background_color,
+            program.state.foreground_color,
+            canvas_factory=_ScriptCanvasFactory(),
+            delta_class=RunDelta,
+            painter_class=_ScriptPainter,
+            history=self._history(program, existing),
+            rgb_map=program.state.rgb_map,
+            max_canvas_points=program.state.max_canvas_points
+        )
+
+        steps = self._run(program, state, commands, script)
+        final = state.canvas
+        for canvas in [final] + [step.output for step in steps if step.result is None]:
+            if canvas is not None:
+                canvas.target = True
+            while canvas is not None and not canvas.needed:
+                canvas.needed = True
+                canvas = canvas.original_canvas
+
+        kept = []
+        for step in steps:
+            if step.result is not None and not step.result.needed:
+                script.removed.append((step.line_number, step.args, "dead"))
+                continue
+            kept.append(step)
+            if step.result is not None and step.result.original_canvas is not None:
+                step.result.original_canvas.consumers.append(step.result)
+        self._drop_overpainted(kept, script)
+
+        self._lay_out(
+            program,
+            existing,
+            [step for step in kept if step.result is None or step.result.needed],
+            final,
+            script
+        )
+        script.removed.sort(key=lambda removed: removed[0])
+        return script
+
+    @staticmethod
+    def _history(program, canvases):
+        """
+        Returns a history of the canvases, in the same position and with the same limit of steps as the program one
+        """
+        history = History(max_steps=program.state.history.max_steps, max_bytes=None)
+        history.reset(canvases[0])
+        for canvas in canvases[1:]:
+            history.push(canvas)
+        for _ in range(program.state.history.redo_steps):
+            history.undo()
+        return history
+
+    @staticmethod
+    def _run(program, state, commands, script):
+        """
+        Runs the commands on the stand-in state
+        :return: The steps which painted a canvas or output one
+        """
+        steps = []
+        for i, (line_number, args) in enumerate(commands):
+            try:
+                command = program.parse_command(*args, state=state)
+                if isinstance(command, QuitCommand):
+                    script.removed += [(n, a, "quit") for n, a in commands[i:]]
+                    break
+                if isinstance(command, (PrintCommand, SaveCommand, ExportCommand, StatsCommand)):
+                    steps.append(_ScriptStep(line_number, args, output=state.canvas))
+                    script.print_at_end = not isinstance(command, PrintCommand)
+                    continue
+                if not isinstance(command, (CanvasCommand, PainterCommand, UndoCommand, RedoCommand)):
+                    # LOAD, whose canvas is only known by reading its file, or a command added to the program
+                    raise _Unoptimizable("line {}: {} cannot be optimised".format(line_number, args[0]))
+                command.execute()
+            except CommandError as e:
+                script.errors.append((line_number, e.args[0]))
+                script.removed.append((line_number, args, "invalid"))
+                continue
+            script.print_at_end = True
+
+            if isinstance(command, (UndoCommand, RedoCommand)):
+                # Replaced by the ones needed by the kept commands
+                script.removed.append((line_number, args, "undo/redo"))
+                continue
+            step = _ScriptStep(line_number, args, result=state.canvas)
+            step.result.step = step
+            steps.append(step)
+        return steps
+
+    def _drop_overpainted(self, steps, script):
+        """
+        Drops the draws whose points are all painted by the following draws, before any other command uses the canvas
+        """
+        for step in reversed(steps):
+            canvas = step.result
+            if canvas is None or canvas.delta is None:
+                continue
+            covered = RunDelta(None, None)
+            following = canvas
+            for _ in range(self.window):
+                if following.target or len(following.consumers) != 1:
+                    break
+                following = following.consumers[0]
+                if following.delta is None:
+                    # Bucket fills read the colors of the canvas
+                    break
+                for run in following.delta.runs():
+                    covered.add_run(*run)
+                if all(covered.contains_run(*run) for run in canvas.delta.runs()):
+                    consumer = canvas.consumers[0]
+                    consumer.original_canvas = canvas.original_canvas
+                    consumers = canvas.original_canvas.consumers
+                    consumers[consumers.index(canvas)] = consumer
+                    canvas.needed = False
+                    script.removed.append((step.line_number, step.args, "overpainted"))
+                    break
+
+    def _lay_out(self, program, existing, steps, final, script):
+        """
+        Writes the commands of the steps to the script, with the undo/redo commands needed to run each one on the
+        same canvas as in the original script
+        :param existing: Canvases of the history of the program
+        """
+        history = self._history(program, existing)
+        merge_draws = self.merge_draws and program.state.journal is None
+        undo = self._command_name(program, UndoCommand)
+        redo = self._command_name(program, RedoCommand)
+        group = []
+
+        def go_to(canvas, line_number):
+            canvases = history.canvases()
+            index = next((i for i, c in enumerate(canvases) if c is canvas), None)
+            if index is None:
+                raise _Unoptimizable("line {}: its canvas is evicted from the history".format(line_number))
+            while history.undo_steps > index:
+                history.undo()
+                script.commands.append((line_number, [undo]))
+                script.inserted += 1
+            while history.undo_steps < index:
+                history.redo()
+                script.commands.append((line_number, [redo]))
+                script.inserted += 1
+
+        for step in steps:
+            canvas = step.result
+            painted_on = step.output if canvas is None else canvas.original_canvas
+            merged = merge_draws and canvas is not None and canvas.delta is not None and group and \
+                group[-1][1] is painted_on and not painted_on.target and len(painted_on.consumers) == 1
+            if not merged:
+                self._merge(history, group, script)
+                if canvas is None or painted_on is not None:
+                    go_to(painted_on, step.line_number)
+
+            script.commands.append((step.line_number, step.args))
+            if canvas is not None:
+                history.push(canvas)
+                if canvas.delta is not None:
+                    group.append((len(script.commands) - 1, canvas))
+
+        self._merge(history, group, script)
+        go_to(final, script.commands[-1][0] if script.commands else None)
+
+    @staticmethod
+    def _merge(history, group, script):
+        """
+        Merges the group of draws into a single step, like Program.merge_steps
+        """
+        if len(group) > 1 and history.undo_steps >= len(group):
+            for _ in group:
+                history.undo()
+            history.push(group[-1][1])
+            script.groups[group[-1][0]] = len(group)
+        del group[:]
+
+    @staticmethod
+    def _command_name(program, command_class):
+        return next(name for name, command in program.commands.items() if command is command_class)
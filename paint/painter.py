@@ -1,54 +1,121 @@
+from itertools import chain
+
 from .canvas import EditedCanvas
+from .delta import DictDelta, RunDelta
 
 
 class Painter(object):
-    def __init__(self, point_factory):
+    def __init__(self, point_factory, compaction_policy=None, delta_class=DictDelta, region_index=None):
+        """
+        :param point_factory: Factory of the painted points
+        :param compaction_policy: Policy deciding when to fold the chain of edits into a new base canvas
+        :param delta_class: Class storing the painted points (DictDelta or RunDelta). Filled areas are stored as runs
+                            if it doesn't store runs (see fill_delta_class)
+        :param region_index: RegionIndex finding the areas filled by bucket_fill, None to look for them at every fill
+        """
         self._point_factory = point_factory
+        self._compaction_policy = compaction_policy
+        self._delta_class = delta_class
+        self._region_index = region_index
+
+    @property
+    def fill_delta_class(self):
+        """
+        Class storing the areas painted by the fills: RunDelta unless the delta class already stores runs,
+        as a point per painted point makes filling a large area slow
+        """
+        return self._delta_class if getattr(self._delta_class, "run_based", False) else RunDelta
+
+    def _edit(self, canvas, delta):
+        """
+        Applies the delta on top of the canvas, folding the previous edits first if the chain got too deep
+        """
+        if self._compaction_policy and self._compaction_policy.should_compact(canvas):
+            canvas = self._compaction_policy.compact(canvas)
+        return EditedCanvas(canvas=canvas, delta=delta)
+
+    def merge_edits(self, canvas, edited):
+        """
+        Folds the edits stacked on canvas up to edited into a single edit of canvas.
+        Returns edited as it is if it's not built on canvas, or if its edits paint different colors in run based deltas.
+        """
+        deltas = []
+        top = edited
+        while top is not canvas:
+            if not isinstance(top, EditedCanvas):
+                return edited
+            deltas.append(top.delta)
+            top = top.original_canvas
+        if len(deltas) < 2:
+            return edited
+        deltas.reverse()
+
+        if all(getattr(delta, "run_based", False) for delta in deltas) and \
+                len({delta.color for delta in deltas}) == 1:
+            merged = self.fill_delta_class.from_runs(
+                chain.from_iterable(delta.runs() for delta in deltas), deltas[0].color, self._point_factory
+            )
+        elif not getattr(self._delta_class, "run_based", False):
+            merged = DictDelta()
+            for delta in deltas:
+                merged.update(delta)
+        else:
+            return edited
+        return self._edit(canvas, merged)
 
     def draw_line(self, canvas, x1, y1, x2, y2, color):
         """
         Paints the line between (x1, y1) and (x2, y2)
         """
-        return EditedCanvas(
-            canvas=canvas,
-            delta={
-                (p.x, p.y): self._point_factory.create_point(p.x, p.y, color)
-                for p in canvas.line(x1=x1, y1=y1, x2=x2, y2=y2)
-            }
-        )
+        canvas.coordinate(x1, y1)
+        canvas.coordinate(x2, y2)
+        xs, ys = canvas.line_coordinates(x1, y1, x2, y2)
+        return self._edit(canvas, self._delta_class.from_coordinates(xs, ys, color, self._point_factory))
 
     def draw_rectangle(self, canvas, x1, y1, x2, y2, color):
         """
         Paints the border of the rectangle with corners in (x1, y1) and (x2, y2)
         """
-        return EditedCanvas(
-            canvas=canvas,
-            delta={
-                (p.x, p.y): self._point_factory.create_point(p.x, p.y, color)
-                for p in canvas.rectangle(x1, y1, x2, y2)
-            }
-        )
+        xs, ys = canvas.polygon_coordinates((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+        return self._edit(canvas, self._delta_class.from_coordinates(xs, ys, color, self._point_factory))
 
     def draw_polygon(self, canvas, color, *args):
         """
         Draws a polygon
         """
-        return EditedCanvas(
-            canvas=canvas,
-            delta={
-                (p.x, p.y): self._point_factory.create_point(p.x, p.y, color)
-                for p in canvas.polygon(*args)
-            }
-        )
+        xs, ys = canvas.polygon_coordinates(*args)
+        return self._edit(canvas, self._delta_class.from_coordinates(xs, ys, color, self._point_factory))
 
     def bucket_fill(self, canvas, x, y, color):
         """
         Paints the area connected to (x, y)
         """
-        return EditedCanvas(
-            canvas=canvas,
-            delta={
-                (p.x, p.y): self._point_factory.create_point(p.x, p.y, color)
-                for p in canvas.uniform_area(x, y)
-            }
+        if self._region_index is None:
+            return self._edit(
+                canvas,
+                self.fill_delta_class.from_runs(canvas.uniform_area_runs(x, y), color, self._point_factory)
+            )
+        edited = self._edit(
+            canvas,
+            self.fill_delta_class.from_runs(self._region_index.area_runs(canvas, x, y), color, self._point_factory)
+        )
+        self._region_index.filled(canvas, edited, x, y, color)
+        return edited
+
+    def fill_rectangle(self, canvas, x1, y1, x2, y2, color):
+        """
+        Paints the rectangle with corners in (x1, y1) and (x2, y2), border included
+        """
+        return self._edit(
+            canvas,
+            self.fill_delta_class.from_runs(canvas.filled_rectangle(x1, y1, x2, y2), color, self._point_factory)
+        )
+
+    def fill_polygon(self, canvas, color, *args):
+        """
+        Paints a polygon, border included
+        """
+        return self._edit(
+            canvas,
+            self.fill_delta_class.from_runs(canvas.filled_polygon(*args), color, self._point_factory)
         )
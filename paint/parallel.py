@@ -0,0 +1,147 @@
+"""
+Parallel rendering of large canvases: the rows are split in bands rendered by a pool of processes,
+which read the palette indices of the points from shared memory rather than receiving the pickled canvas.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+from .canvas import ArrayCanvas, EditedCanvas
+from .numpy_canvas import NumpyCanvas
+
+
+def _render_band(name, width, y1, y2, table):
+    """
+    Renders the rows y1 to y2 (excluded) of the shared memory block
+    :param table: Rendered value (str or bytes) of every palette index
+    :return: The list of the rendered rows
+    """
+    memory = shared_memory.SharedMemory(name)
+    pixels = memory.buf
+    try:
+        if isinstance(table[0], str):
+            # str.translate maps the code points of the latin-1 decoded indices to their colors
+            mapping = dict(enumerate(table))
+            return [
+                bytes(pixels[y * width:(y + 1) * width]).decode("latin-1").translate(mapping)
+                for y in range(y1, y2)
+            ]
+        if all(len(value) == 1 for value in table):
+            translation = b"".join(table) + bytes(256 - len(table))
+            return [bytes(pixels[y * width:(y + 1) * width]).translate(translation) for y in range(y1, y2)]
+        return [b"".join([table[i] for i in pixels[y * width:(y + 1) * width]]) for y in range(y1, y2)]
+    finally:
+        del pixels
+        memory.close()
+
+
+class ParallelRenderer(object):
+    """
+    Renders the rows of large canvases in bands, in a pool of processes.
+    Only canvases built on an ArrayCanvas or a NumpyCanvas can be shared with the processes: the others, and the
+    canvases smaller than min_points, are left to be rendered in the current process.
+    """
+    def __init__(self, processes=None, band_rows=None, min_points=1000000):
+        """
+        :param processes: Number of processes (the number of CPUs by default)
+        :param band_rows: Number of rows rendered by a process at a time (by default every process gets 4 bands)
+        :param min_points: Smallest canvas rendered in parallel
+        """
+        assert processes is None or processes > 0, "Invalid number of processes"
+        assert band_rows is None or band_rows > 0, "Invalid band rows"
+        self.processes = processes or os.cpu_count() or 1
+        self.band_rows = band_rows
+        self.min_points = min_points
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def accepts(self, canvas, points=None):
+        """
+        Tells whether rendering the given number of points of the canvas (all of them by default) is worth the pool:
+        never with a single process, which would only add the copy to the shared memory
+        """
+        return self.processes > 1 and (canvas.width * canvas.height if points is None else points) >= self.min_points
+
+    def iter_rows(self, canvas, render_color=str, rows=None):
+        """
+        Yields the rendered rows of the canvas in order, as the bands are rendered
+        :param render_color: Function returning the rendered value (str or bytes) of a point of the given color,
+                             called for every color of the palette. Rows are the concatenation of these values.
+        :param rows: Rows to render (all of them by default), the others are neither shared nor yielded
+        :return: None if the points of the canvas cannot be shared with the processes
+        """
+        rows = range(canvas.height) if rows is None else sorted(rows)
+        shared = self._pixels(canvas, rows)
+        if shared is None:
+            return None
+        colors, pixels, edited_rows = shared
+        return self._iter_rows(
+            canvas.width, canvas.height, rows, [render_color(color) for color in colors], pixels, edited_rows
+        )
+
+    def _iter_rows(self, width, height, rows, table, pixels, edited_rows):
+        if not rows:
+            return
+        # The rows to render, one after the other
+        memory = shared_memory.SharedMemory(create=True, size=width * len(rows))
+        try:
+            if len(rows) == height:
+                memory.buf[:width * height] = pixels
+            else:
+                for i, y in enumerate(rows):
+                    memory.buf[i * width:(i + 1) * width] = pixels[y * width:(y + 1) * width]
+            del pixels
+            positions = {y: i for i, y in enumerate(rows)}
+            for y, row in edited_rows:
+                memory.buf[positions[y] * width:(positions[y] + 1) * width] = row
+            band_rows = self.band_rows or max(1, -(-len(rows) // (4 * self.processes)))
+            bands = [
+                self.executor.submit(_render_band, memory.name, width, i, min(i + band_rows, len(rows)), table)
+                for i in range(0, len(rows), band_rows)
+            ]
+            for band in bands:
+                yield from band.result()
+        finally:
+            memory.close()
+            memory.unlink()
+
+    @staticmethod
+    def _pixels(canvas, rows):
+        """
+        Returns the colors of the palette, the buffer of the palette indices of the points of the base canvas, and
+        the (y, palette indices) of the given rows painted by the edits on it, which are copied over the base ones
+        """
+        base, edited_rows = canvas, set()
+        if isinstance(canvas, EditedCanvas):
+            base = canvas.base
+            for edit in canvas.edits():
+                edited_rows.update(edit.edited_rows())
+            edited_rows.intersection_update(rows)
+        if isinstance(base, ArrayCanvas):
+            size = base.width * base.height
+            pixels = memoryview(base._pixels)[base._offset:base._offset + size]
+        elif isinstance(base, NumpyCanvas):
+            pixels = memoryview(base._pixels.reshape(-1))
+        else:
+            # Sharing the points of other canvases would take a full snapshot, thrown away once rendered
+            return None
+        indices = base._indices
+        return base._colors, pixels, (
+            (y, bytes(indices[color] for color in canvas.row_colors(y))) for y in sorted(edited_rows)
+        )
@@ -0,0 +1,267 @@
+from collections import OrderedDict
+import sys
+
+from .canvas import EditedCanvas
+
+
+class RenderCache(object):
+    """
+    Least recently used cache of rendered frames, keyed by canvas version
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        assert max_bytes > 0, "Invalid max bytes"
+        self.max_bytes = max_bytes
+        self.memory_usage = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached value, or None if missing
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def peek(self, key):
+        """
+        Returns the cached value, or None if missing, without counting a hit or a miss
+        """
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, value, size):
+        """
+        Caches a value taking size bytes, evicting the least recently used values if needed
+        """
+        if key in self._entries:
+            self.memory_usage -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self.memory_usage += size
+        while self.memory_usage > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.memory_usage -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self.memory_usage = 0
+
+
+class AsciiCanvasPrinter(object):
+    # Characters written to the stream at once by write_canvas
+    chunk_size = 64 * 1024
+
+    _render_cache = None
+    _renderer = None
+
+    # Last rendered frame: rows are re-rendered only when the delta between two frames touches them
+    _rendered_rows = None
+    _rendered_changed_rows = None
+    _rendered_width = None
+    _rendered_version = None
+    _rendered_parent_version = None
+    _rendered_edited_rows = None
+
+    def __init__(self, render_cache=None, renderer=None):
+        """
+        :param renderer: ParallelRenderer rendering large canvases in a pool of processes, None to render them here
+        """
+        self._render_cache = render_cache
+        self._renderer = renderer
+
+    @property
+    def render_cache(self):
+        """
+        Cache of the rendered frames (undoing and redoing gets back frames rendered before)
+        """
+        if self._render_cache is None:
+            self._render_cache = RenderCache()
+        return self._render_cache
+
+    def print_canvas(self, canvas):
+        self.write_canvas(canvas, sys.stdout)
+
+    def print_text(self, text):
+        """
+        Prints the text output of a command (e.g. the statistics of S) where the canvas is printed
+        """
+        sys.stdout.write(text + "\n")
+
+    def write_canvas(self, canvas, stream):
+        """
+        Writes the frame of the canvas to stream in chunks of about chunk_size characters, as its rows are rendered
+        """
+        chunk = []
+        chunk_size = 0
+        for line in self.iter_frame(canvas):
+            chunk.append(line)
+            chunk_size += len(line) + 1
+            if chunk_size >= self.chunk_size:
+                chunk.append("")
+                stream.write("\n".join(chunk))
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            chunk.append("")
+            stream.write("\n".join(chunk))
+
+    def iter_frame(self, canvas):
+        """
+        Yields the lines of the frame of the canvas (the rows and the borders)
+        """
+        return self.frame_lines(canvas.width, self.iter_rows(canvas))
+
+    def frame_lines(self, width, rows):
+        border = "-" * (width + 2)
+        yield border
+        for row in rows:
+            yield "|" + row + "|"
+        yield border
+
+    def canvas_to_str(self, canvas):
+        cached = self.render_cache.peek(canvas.version)
+        if cached is not None and cached[1] is not None:
+            # Keeps the incremental rendering state and the cache statistics as if the frame was rendered
+            self.render(canvas)
+            return cached[1]
+        frame_str = "\n".join(self.iter_frame(canvas))
+        rows = self._rendered_rows
+        self.render_cache.put(canvas.version, (rows, frame_str), 2 * self._rows_size(rows))
+        return frame_str
+
+    def frame_to_str(self, width, rows):
+        return "\n".join(self.frame_lines(width, rows))
+
+    def canvas_to_list(self, canvas):
+        return list(self.iter_rows(canvas))
+
+    def render(self, canvas):
+        """
+        Renders the rows of the canvas, reusing the rows of the previously rendered canvas which didn't change
+        :return: The rendered rows and the set of rows which changed since the previous call
+        """
+        for _ in self.iter_rows(canvas):
+            pass
+        return self._rendered_rows, self._rendered_changed_rows
+
+    def iter_rows(self, canvas):
+        """
+        Yields the rows of the canvas as they are rendered, reusing the rows of the previously rendered canvas
+        which didn't change. The rendered frame is remembered (and cached) once the last row is yielded.
+        """
+        cached = self.render_cache.get(canvas.version)
+        if cached is not None:
+            rows = cached[0]
+            changed_rows = self._diff_rows(rows)
+            yield from rows
+        else:
+            changed_rows = self._changed_rows(canvas)
+            if changed_rows is None:
+                changed_rows = set(range(canvas.height))
+                rows = [None] * canvas.height
+            else:
+                rows = list(self._rendered_rows)
+            parallel_rows = None
+            if self._renderer is not None and self._renderer.accepts(canvas, len(changed_rows) * canvas.width):
+                parallel_rows = self._renderer.iter_rows(canvas, rows=changed_rows)
+            if parallel_rows is not None:
+                # Rendered in order, only the rows which changed
+                for y in range(canvas.height):
+                    if y in changed_rows:
+                        rows[y] = next(parallel_rows)
+                    yield rows[y]
+            else:
+                for y in range(canvas.height):
+                    if y in changed_rows:
+                        rows[y] = self.row_to_str(canvas, y)
+                    yield rows[y]
+            self.render_cache.put(canvas.version, (rows, None), self._rows_size(rows))
+
+        self._rendered_rows = rows
+        self._rendered_changed_rows = changed_rows
+        self._rendered_width = canvas.width
+        self._rendered_version = canvas.version
+        self._rendered_parent_version = self._parent_version(canvas)
+        self._rendered_edited_rows = None if self._rendered_parent_version is None else canvas.edited_rows()
+
+    def row_to_str(self, canvas, y):
+        return "".join(canvas.row_colors(y))
+
+    @staticmethod
+    def _rows_size(rows):
+        # Rows are often shared with other cached frames, this is an upper bound
+        return sys.getsizeof(rows) + sum(sys.getsizeof(row) for row in rows)
+
+    def _diff_rows(self, rows):
+        """
+        Returns the rows which differ from the previously rendered ones
+        """
+        if self._rendered_rows is None or len(self._rendered_rows) != len(rows) or \
+                (rows and len(self._rendered_rows[0]) != len(rows[0])):
+            return set(range(len(rows)))
+        return {y for y, (row, rendered) in enumerate(zip(rows, self._rendered_rows)) if row != rendered}
+
+    def _changed_rows(self, canvas):
+        """
+        Returns the rows which changed since the previously rendered canvas, or None if they are unknown
+        """
+        if self._rendered_rows is None or \
+                len(self._rendered_rows) != canvas.height or self._rendered_width != canvas.width:
+            return None
+        if canvas.version == self._rendered_version:
+            return set()
+        parent_version = self._parent_version(canvas)
+        if parent_version is not None and parent_version == self._rendered_version:
+            # New edit (or redo)
+            return canvas.edited_rows()
+        if canvas.version == self._rendered_parent_version:
+            # Undo
+            return self._rendered_edited_rows
+        return None
+
+    @staticmethod
+    def _parent_version(canvas):
+        """
+        Returns the version of the canvas the latest edit of the canvas was applied to, None if it's unknown
+        """
+        if isinstance(canvas, EditedCanvas):
+            return canvas.original_canvas.version
+        # Persistent canvases (e.g. QuadtreeCanvas) remember the canvas they were painted on
+        return getattr(canvas, "parent_version", None)
+
+
+class AnsiCanvasPrinter(AsciiCanvasPrinter):
+    """
+    Prints the whole canvas the first time, then moves the cursor to rewrite only the rows which changed
+    """
+    def __init__(self, stream=None, render_cache=None, renderer=None):
+        super().__init__(render_cache, renderer)
+        self._stream = sys.stdout if stream is None else stream
+        self._printed = False
+
+    def print_canvas(self, canvas):
+        rows, changed_rows = self.render(canvas)
+        if not self._printed or len(changed_rows) == len(rows):
+            # Clears the screen and prints the whole frame
+            self._stream.write("\x1b[2J\x1b[H" + self.frame_to_str(canvas.width, rows) + "\n")
+            self._printed = True
+        else:
+            self._stream.write("".join(
+                # The first line of the frame is the border
+                "\x1b[{};1H|{}|".format(y + 2, rows[y])
+                for y in sorted(changed_rows)
+            ))
+            # Moves the cursor below the frame and clears what was written there
+            self._stream.write("\x1b[{};1H\x1b[J".format(len(rows) + 3))
+        self._stream.flush()
+
+    def print_text(self, text):
+        self._stream.write(text + "\n")
+        self._stream.flush()
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import time
+
+from .canvas import EditedCanvas
+
+
+class CommandStats(object):
+    """
+    Statistics of one command: the time spent in each phase (in seconds) and the state of the canvas after it
+    """
+    PHASES = ("parse", "validate", "paint", "render")
+
+    def __init__(self, command_name):
+        self.command_name = command_name
+        self.timings = OrderedDict((phase, 0.0) for phase in self.PHASES)
+        self.error = None
+        # Points changed by the command, None if it didn't create a new edit of the canvas
+        self.delta_size = None
+        self.chain_depth = 0
+        self.history_bytes = 0
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+
+class ProfilerHook(object):
+    """
+    Receives the statistics of every command run by a profiled program (e.g. to export them to an external collector)
+    """
+    def command_finished(self, stats):
+        raise NotImplementedError
+
+
+class Timed(object):
+    """
+    Proxy adding the time spent in the methods of a painter (or canvas factory) to the paint phase of a command
+    """
+    def __init__(self, target, stats):
+        self._target = target
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self._stats.timings["paint"] += time.perf_counter() - start
+
+        return timed
+
+
+class Profiler(object):
+    """
+    Collects the statistics of the commands run by a program and forwards them to the hooks
+    """
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.current = None
+        self.last = None
+        # Command name -> [count, errors, total time of each phase, total delta size]
+        self._totals = OrderedDict()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def start(self, command_name):
+        """
+        Starts collecting the statistics of a new command
+        """
+        self.current = CommandStats(command_name)
+        return self.current
+
+    def phase(self, name):
+        """
+        Context manager adding the time spent in its block to a phase of the current command
+        """
+        return _Phase(self.current, name)
+
+    def timed(self, target):
+        """
+        Returns target, timing its methods in the paint phase of the current command if any
+        """
+        return target if self.current is None else Timed(target, self.current)
+
+    def finish(self, state):
+        """
+        Completes the statistics of the current command with the state of the program and forwards them to the hooks
+        """
+        stats, self.current = self.current, None
+        if stats is None:
+            return None
+
+        canvas = state.canvas
+        if isinstance(canvas, EditedCanvas):
+            stats.chain_depth = canvas.depth
+        stats.history_bytes = state.history.memory_usage
+        self.last = stats
+
+        totals = self._totals.setdefault(stats.command_name, [0, 0, [0.0] * len(CommandStats.PHASES), 0])
+        totals[0] += 1
+        if stats.error is not None:
+            totals[1] += 1
+        for i, seconds in enumerate(stats.timings.values()):
+            totals[2][i] += seconds
+        totals[3] += stats.delta_size or 0
+
+        for hook in self.hooks:
+            hook.command_finished(stats)
+        return stats
+
+    def reset(self):
+        self._totals.clear()
+        self.last = None
+
+    def summary(self):
+        """
+        Returns a table of the average statistics by command
+        """
+        lines = ["{:<8} {:>6} {:>6} {}{:>10}".format(
+            "command", "count", "errors", "".join("{:>10}".format(phase + " ms") for phase in CommandStats.PHASES),
+            "delta"
+        )]
+        for command_name, (count, errors, timings, delta_size) in self._totals.items():
+            lines.append("{:<8} {:>6} {:>6} {}{:>10.1f}".format(
+                command_name, count, errors, "".join("{:>10.3f}".format(1000 * t / count) for t in timings),
+                delta_size / count
+            ))
+        if self.last is not None:
+            lines.append("chain depth: {}, history memory: {} bytes".format(
+                self.last.chain_depth, self.last.history_bytes
+            ))
+        return "\n".join(lines)
+
+
+class _Phase(object):
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._stats.timings[self._name] += time.perf_counter() - self._start
@@ -1,3 +1,5 @@
+import sys
+
 from . import *
 
 
@@ -9,34 +11,32 @@ class Quit(Exception):
     pass
 
 
-class AsciiCanvasPrinter(object):
-    def print_canvas(self, canvas):
-        print(self.canvas_to_str(canvas))
-
-    def canvas_to_str(self, canvas):
-        canvas_str = ("-" * (canvas.width + 2)) + "\n"
-        canvas_str += ("\n".join("|" + line + "|" for line in self.canvas_to_list(canvas))) + "\n"
-        canvas_str += ("-" * (canvas.width + 2))
-        return canvas_str
-
-    def canvas_to_list(self, canvas):
-        return [
-            "".join(
-                canvas.point(x, y).color
-                for x in range(canvas.width)
-            )
-            for y in range(canvas.height)
-        ]
-
-
 class ProgramState(object):
-    def __init__(self, palette, background_color, foreground_color):
+    def __init__(self, palette, background_color, foreground_color, compaction_policy=None, canvas_factory=None,
+                 delta_class=DictDelta, painter_class=Painter, history=None, profiler=None, rgb_map=None,
+                 journal=None, region_index=None, output=None, max_canvas_points=None):
+        """
+        :param output: Function printing the text output of the commands (the statistics of S), print by default
+        :param max_canvas_points: Largest canvas (width * height) the C command creates, None for no limit
+        """
         self.palette = palette
         self.background_color = background_color
         self.foreground_color = foreground_color
-        self.canvas = None
-        self.undo = []
-        self.redo = []
+        self.canvas_factory = CanvasFactory() if canvas_factory is None else canvas_factory
+        self.delta_class = delta_class
+        self.painter_class = painter_class
+        self.compaction_policy = CompactionPolicy() if compaction_policy is None else compaction_policy
+        self.history = History() if history is None else history
+        self.profiler = profiler
+        self.rgb_map = default_rgb_map(palette, background_color) if rgb_map is None else rgb_map
+        self.journal = journal
+        self.region_index = region_index
+        self.output = print if output is None else output
+        self.max_canvas_points = max_canvas_points
+
+    @property
+    def canvas(self):
+        return self.history.canvas
 
 
 class CommandParameters(object):
@@ -82,26 +82,33 @@ class CanvasCommand(Command):
     def execute(self):
         width = self.parameters.get_parameter(1, "width", convert=int, validate=lambda x: x > 0)
         height = self.parameters.get_parameter(2, "height", convert=int, validate=lambda x: x > 0)
+        if self.state.max_canvas_points is not None and width * height > self.state.max_canvas_points:
+            raise CommandError("Canvas larger than {} points".format(self.state.max_canvas_points))
 
-        old_canvas = self.state.canvas
-        new_canvas = Canvas(width, height, PointFactory(self.state.background_color))
-
-        def undo():
-            self.state.canvas = old_canvas
-            self.state.redo.append(do)
-
-        def do():
-            self.state.canvas = new_canvas
-            self.state.undo.append(undo)
+        canvas_factory = self.state.canvas_factory
+        if self.state.profiler is not None:
+            canvas_factory = self.state.profiler.timed(canvas_factory)
 
-        do()
-        self.state.redo = []
+        self.state.history.push(canvas_factory.create_canvas(
+            width,
+            height,
+            self.state.palette,
+            self.state.background_color
+        ))
 
 
 class PainterCommand(Command):
     @property
     def painter(self):
-        return Painter(PointFactory(self.state.background_color))
+        painter = self.state.painter_class(
+            PointFactory(self.state.background_color),
+            self.state.compaction_policy,
+            self.state.delta_class,
+            self.state.region_index
+        )
+        if self.state.profiler is not None:
+            painter = self.state.profiler.timed(painter)
+        return painter
 
     def paint(self, canvas):
         raise NotImplemented
@@ -126,19 +133,7 @@ class PainterCommand(Command):
         if not self.state.canvas:
             raise CommandError("Please create a canvas first")
 
-        old_canvas = self.state.canvas
-        new_canvas = self.paint(old_canvas)
-
-        def undo():
-            self.state.canvas = old_canvas
-            self.state.redo.append(do)
-
-        def do():
-            self.state.canvas = new_canvas
-            self.state.undo.append(undo)
-
-        do()
-        self.state.redo = []
+        self.state.history.push(self.paint(self.state.canvas))
 
 
 class LineCommand(PainterCommand):
@@ -178,30 +173,120 @@ class TriangleCommand(PainterCommand):
         return self.painter.draw_polygon(canvas, self.state.foreground_color, (x1, y1), (x2, y2), (x3, y3))
 
 
-class UndoCommand(Command):
+class FilledRectangleCommand(PainterCommand):
+    def paint(self, canvas):
+        x1 = self.get_x_parameter(1, "x1")
+        y1 = self.get_y_parameter(2, "y1")
+        x2 = self.get_x_parameter(3, "x2")
+        y2 = self.get_y_parameter(4, "y2")
+        return self.painter.fill_rectangle(canvas, x1=x1, y1=y1, x2=x2, y2=y2, color=self.state.foreground_color)
+
+
+class FilledTriangleCommand(PainterCommand):
+    def paint(self, canvas):
+        x1 = self.get_x_parameter(1, "x1")
+        y1 = self.get_y_parameter(2, "y1")
+        x2 = self.get_x_parameter(3, "x2")
+        y2 = self.get_y_parameter(4, "y2")
+        x3 = self.get_x_parameter(5, "x3")
+        y3 = self.get_y_parameter(6, "y3")
+        return self.painter.fill_polygon(canvas, self.state.foreground_color, (x1, y1), (x2, y2), (x3, y3))
+
+
+class FilledPolygonCommand(PainterCommand):
+    def paint(self, canvas):
+        if len(self.parameters.params) < 7 or len(self.parameters.params) % 2 == 0:
+            raise CommandError("A polygon needs the coordinates of at least 3 points")
+        points = [
+            (self.get_x_parameter(i, "x{}".format(i // 2 + 1)), self.get_y_parameter(i + 1, "y{}".format(i // 2 + 1)))
+            for i in range(1, len(self.parameters.params), 2)
+        ]
+        return self.painter.fill_polygon(canvas, self.state.foreground_color, *points)
+
+
+class PrintCommand(Command):
     def execute(self):
+        # The canvas is printed after every command, this command only forces it when rendering is deferred
+        pass
+
+
+class SaveCommand(Command):
+    def execute(self):
+        if not self.state.canvas:
+            raise CommandError("Please create a canvas first")
+        path = self.parameters.get_parameter(1, "path")
         try:
-            undo = self.state.undo.pop()
-        except IndexError:
-            pass
-        else:
-            undo()
+            save_canvas(self.state.canvas, path, self.state.palette)
+        except (CanvasFileError, OSError) as e:
+            raise CommandError("Cannot save the canvas: {}".format(e.args[-1]))
 
 
-class RedoCommand(Command):
+class LoadCommand(Command):
     def execute(self):
+        path = self.parameters.get_parameter(1, "path")
         try:
-            redo = self.state.redo.pop()
-        except IndexError:
-            pass
-        else:
-            redo()
+            self.state.history.push(load_canvas(path, self.state.palette))
+        except (CanvasFileError, OSError) as e:
+            raise CommandError("Cannot load the canvas: {}".format(e.args[-1]))
+
+
+class ExportCommand(Command):
+    def execute(self):
+        if not self.state.canvas:
+            raise CommandError("Please create a canvas first")
+        path = self.parameters.get_parameter(1, "path")
+        try:
+            export_canvas(self.state.canvas, path, self.state.rgb_map)
+        except (ValueError, OSError) as e:
+            raise CommandError("Cannot export the canvas: {}".format(e.args[-1]))
+
+
+class StatsCommand(Command):
+    def execute(self):
+        if self.state.profiler is None:
+            raise CommandError("Profiling is disabled")
+        self.state.output(self.state.profiler.summary())
+
+
+class UndoCommand(Command):
+    def execute(self):
+        self.state.history.undo()
+
+
+class RedoCommand(Command):
+    def execute(self):
+        self.state.history.redo()
 
 
 class Program(object):
-    def __init__(self, printer, palette, background_color, foreground_color):
+    def __init__(self, printer, palette, background_color, foreground_color, compaction_policy=None,
+                 canvas_factory=None, delta_class=DictDelta, painter_class=Painter, history=None, profiler=None,
+                 rgb_map=None, journal=None, region_index=None, max_canvas_points=None):
+        """
+        :param profiler: Profiler collecting the statistics of every command, None to disable profiling
+        :param rgb_map: Dict of color -> (red, green, blue) used to export images (default_rgb_map by default)
+        :param journal: CommandJournal the commands are written to, None to disable journaling (see recover)
+        :param region_index: RegionIndex of the areas of the canvas, kept across the bucket fills of the program
+                             (and consistent with undo/redo), None to look for the area at every fill
+        :param max_canvas_points: Largest canvas (width * height) the C command creates, None for no limit
+        """
         self.printer = printer
-        self.state = ProgramState(palette, background_color, foreground_color)
+        self.state = ProgramState(
+            palette,
+            background_color,
+            foreground_color,
+            compaction_policy,
+            canvas_factory,
+            delta_class,
+            painter_class,
+            history,
+            profiler,
+            rgb_map,
+            journal,
+            region_index,
+            printer.print_text,
+            max_canvas_points
+        )
         self.commands = {
             'Q': QuitCommand,
             'C': CanvasCommand,
@@ -209,19 +294,181 @@ class Program(object):
             'R': RectangleCommand,
             'T': TriangleCommand,
             'B': BucketFillCommand,
+            'FR': FilledRectangleCommand,
+            'FT': FilledTriangleCommand,
+            'FP': FilledPolygonCommand,
             'Z': UndoCommand,
             'Y': RedoCommand,
+            'P': PrintCommand,
+            'S': StatsCommand,
+            'SAVE': SaveCommand,
+            'LOAD': LoadCommand,
+            'EXPORT': ExportCommand,
         }
 
-    def run_command(self, *args):
+    def parse_command(self, *args, state=None):
+        """
+        :param state: ProgramState the command is executed on (the state of the program by default)
+        """
         parameters = CommandParameters(args)
         command_name = parameters.get_parameter(0, "command name", convert=lambda x: str(x).upper())
         if command_name not in self.commands:
             raise CommandError("Unknown command")
-        command = self.commands[command_name](self.state, parameters)
-        command.execute()
-        if self.state.canvas:
+        return self.commands[command_name](self.state if state is None else state, parameters)
+
+    def execute_command(self, *args):
+        """
+        Parses and executes a command without printing the canvas.
+        When profiling, the statistics of the command are completed by finish_command.
+        :return: The executed command
+        """
+        canvas = self.state.canvas
+        command = self._execute_command(*args)
+        if self.state.journal is not None:
+            self.state.journal.record(self.state, command, args, canvas)
+        return command
+
+    def _execute_command(self, *args):
+        if self.state.profiler is None:
+            command = self.parse_command(*args)
+            command.execute()
+            return command
+
+        profiler = self.state.profiler
+        stats = profiler.start(str(args[0]).upper() if args else "")
+        canvas = self.state.canvas
+        try:
+            with profiler.phase("parse"):
+                command = self.parse_command(*args)
+            with profiler.phase("validate"):
+                command.execute()
+        except CommandError as e:
+            stats.error = e.args[0]
+            raise
+        finally:
+            # The time spent painting was counted twice
+            stats.timings["validate"] -= stats.timings["paint"]
+
+        new_canvas = self.state.canvas
+        if isinstance(new_canvas, EditedCanvas) and new_canvas.original_canvas is canvas:
+            stats.delta_size = len(new_canvas.delta)
+        return command
+
+    def merge_steps(self, steps):
+        """
+        Folds the last steps of the history, each one painted on the previous one, into a single step holding
+        a single delta layer: undoing it undoes all of them
+        :return: False if the steps cannot be undone anymore
+        """
+        history = self.state.history
+        if steps < 2 or history.undo_steps < steps:
+            return False
+        edited = history.canvas
+        for _ in range(steps):
+            history.undo()
+        painter = self.state.painter_class(
+            PointFactory(self.state.background_color),
+            self.state.compaction_policy,
+            self.state.delta_class
+        )
+        history.push(painter.merge_edits(history.canvas, edited))
+        return True
+
+    def recover(self):
+        """
+        Restores the canvas from the journal, replaying the commands executed since its latest checkpoint
+        :return: The number of replayed commands
+        """
+        return self.state.journal.recover(self)
+
+    def finish_command(self):
+        """
+        Forwards the statistics of the last executed command to the profiler hooks
+        """
+        if self.state.profiler is not None:
+            self.state.profiler.finish(self.state)
+
+    def print_canvas(self):
+        if not self.state.canvas:
+            return
+        if self.state.profiler is None or self.state.profiler.current is None:
             self.printer.print_canvas(self.state.canvas)
+        else:
+            with self.state.profiler.phase("render"):
+                self.printer.print_canvas(self.state.canvas)
+
+    def run_command(self, *args):
+        try:
+            self.execute_command(*args)
+            self.print_canvas()
+        finally:
+            self.finish_command()
+
+    @staticmethod
+    def parse_script(lines):
+        """
+        Yields the line number and the arguments of the commands of a script, skipping blank lines and comments
+        """
+        for line_number, line in enumerate(lines, 1):
+            command_args = line.split()
+            if command_args and not command_args[0].startswith("#"):
+                yield line_number, command_args
+
+    def run_batch(self, lines, render_every=None, error_stream=None, optimizer=None):
+        """
+        Runs a script of commands, one per line. Blank lines and lines starting with # are ignored.
+        The canvas is printed at the end, every render_every commands and on the P command.
+        Invalid commands are reported with their line number and skipped.
+        :param lines: Iterable of command lines (e.g. a file or sys.stdin)
+        :param render_every: Number of executed commands between two prints of the canvas, None to disable
+        :param error_stream: Stream errors are written to (sys.stderr by default)
+        :param optimizer: ScriptOptimizer rewriting the whole script before running it (its last result is kept in
+                          optimizer.script), None to run the commands as they are read. The invalid commands are then
+                          reported before running it. It cannot be combined with render_every.
+        :return: The list of errors as (line number, message) pairs
+        """
+        assert optimizer is None or not render_every, "Scripts rendered every N commands cannot be optimised"
+        error_stream = sys.stderr if error_stream is None else error_stream
+        errors = []
+        executed = 0
+        rendered = True
+
+        commands = self.parse_script(lines)
+        groups = {}
+        script = None
+        if optimizer is not None:
+            script = optimizer.optimize(self, commands)
+            for line_number, message in script.errors:
+                errors.append((line_number, message))
+                error_stream.write("Line {}: {}\n".format(line_number, message))
+            commands, groups = script.commands, script.groups
+
+        for position, (line_number, command_args) in enumerate(commands):
+            try:
+                command = self.execute_command(*command_args)
+            except Quit:
+                self.finish_command()
+                break
+            except CommandError as e:
+                self.finish_command()
+                errors.append((line_number, e.args[0]))
+                error_stream.write("Line {}: {}\n".format(line_number, e.args[0]))
+                continue
+
+            if position in groups:
+                # Last draw of a group painted on one another: they make a single delta layer
+                self.merge_steps(groups[position])
+            executed += 1
+            rendered = False
+            if isinstance(command, PrintCommand) or (render_every and executed % render_every == 0):
+                self.print_canvas()
+                rendered = True
+            self.finish_command()
+
+        if not rendered or (script is not None and script.print_at_end):
+            self.print_canvas()
+
+        return errors
 
     def run(self):
         while True:
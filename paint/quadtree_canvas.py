@@ -0,0 +1,283 @@
+import sys
+
+from .canvas import BaseCanvas, CanvasFactory, EditedCanvas, PointOutOfCanvas
+from .delta import RunDelta
+from .painter import Painter
+from .point import Point
+
+
+class QuadtreeCanvas(BaseCanvas):
+    """
+    Persistent canvas: a quadtree whose nodes are never modified once built.
+    Painting returns a new canvas sharing every node the edit didn't touch with this one (path copying), so every
+    version of the canvas can be kept at the cost of the nodes it changed. A node is either uniform (a palette index),
+    a leaf block of LEAF_SIZE x LEAF_SIZE palette indices, or a tuple of its 4 quadrants (north west, north east,
+    south west, south east). Quadrants painted with a single color collapse into a uniform node.
+    """
+    LEAF_SIZE = 8
+
+    def __init__(self, width, height, palette, background_color):
+        assert width > 0 and height > 0, "Invalid width or height"
+        self._width = width
+        self._height = height
+        self._colors = tuple(sorted(palette))
+        assert len(self._colors) <= 256, "The palette cannot contain more than 256 colors"
+        self._indices = {color: index for index, color in enumerate(self._colors)}
+        assert background_color in self._indices, "The background color is not in the palette"
+        self._background = self._indices[background_color]
+        # Side of the root node: the smallest power of 2 leaves covering the canvas
+        self._size = self.LEAF_SIZE
+        while self._size < max(width, height):
+            self._size *= 2
+        self._root = self._background
+        # Bytes held by the nodes built by the edit which created this canvas
+        self._own_bytes = 0
+        # Version of the canvas the edit was applied to, and the rows it painted
+        self.parent_version = None
+        self._edited_rows = None
+
+    def _with_root(self, root, own_bytes):
+        canvas = QuadtreeCanvas.__new__(QuadtreeCanvas)
+        canvas.__dict__.update(self.__dict__)
+        canvas.__dict__.pop("_version", None)
+        canvas._root = root
+        canvas._own_bytes = own_bytes
+        canvas.parent_version = None
+        canvas._edited_rows = None
+        return canvas
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    def point(self, x, y):
+        return Point(x, y, self.color_at(x, y))
+
+    def color_at(self, x, y):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            raise PointOutOfCanvas
+        node, x0, y0, size = self._root, 0, 0, self._size
+        while type(node) is tuple:
+            size //= 2
+            quadrant = 0
+            if x >= x0 + size:
+                x0 += size
+                quadrant = 1
+            if y >= y0 + size:
+                y0 += size
+                quadrant += 2
+            node = node[quadrant]
+        if type(node) is int:
+            return self._colors[node]
+        return self._colors[node[(y - y0) * self.LEAF_SIZE + x - x0]]
+
+    def row_colors(self, y):
+        if not 0 <= y < self._height:
+            raise PointOutOfCanvas
+        colors = self._colors
+        row = []
+        for x1, x2, index in self._row_segments(y):
+            row += [colors[index]] * (x2 - x1 + 1)
+        return row
+
+    def _row_segments(self, y):
+        """
+        Yields the runs (x1, x2, palette index) of the row y from left to right, uniform nodes making a single run.
+        Consecutive runs may have the same index.
+        """
+        leaf_size = self.LEAF_SIZE
+        width = self._width
+        stack = [(self._root, 0, 0, self._size)]
+        while stack:
+            node, x0, y0, size = stack.pop()
+            if x0 >= width:
+                continue
+            if type(node) is int:
+                yield x0, min(x0 + size, width) - 1, node
+            elif type(node) is tuple:
+                size //= 2
+                top = 0 if y < y0 + size else 2
+                y1 = y0 + (top and size)
+                # Right quadrant first: it's popped after the left one
+                stack.append((node[top + 1], x0 + size, y1, size))
+                stack.append((node[top], x0, y1, size))
+            else:
+                offset = (y - y0) * leaf_size
+                row = node[offset:offset + min(leaf_size, width - x0)]
+                start = 0
+                for x in range(1, len(row) + 1):
+                    if x == len(row) or row[x] != row[start]:
+                        yield x0 + start, x0 + x - 1, row[start]
+                        start = x
+
+    def _color_segments(self, y, color):
+        """
+        Returns the merged runs (x1, x2) of the given color in the row y
+        """
+        index = self._indices.get(color)
+        runs = []
+        for x1, x2, value in self._row_segments(y):
+            if value != index:
+                continue
+            if runs and runs[-1][1] == x1 - 1:
+                runs[-1] = (runs[-1][0], x2)
+            else:
+                runs.append((x1, x2))
+        return runs
+
+    def memory_size(self):
+        return sys.getsizeof(self) + self._own_bytes
+
+    def edited_rows(self):
+        """
+        Returns the rows painted by the edit which created this canvas
+        """
+        return range(0) if self._edited_rows is None else self._edited_rows
+
+    def nodes(self):
+        """
+        Returns the number of distinct nodes of the tree which are not uniform
+        """
+        seen = set()
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if type(node) is int or id(node) in seen:
+                continue
+            seen.add(id(node))
+            if type(node) is tuple:
+                stack.extend(node)
+        return len(seen)
+
+    def paint_runs(self, runs, color):
+        """
+        Returns a new canvas with the horizontal runs (y, x1, x2) painted with the given color,
+        sharing the nodes which are not painted with this canvas
+        """
+        value = self._indices[color]
+        runs = list(RunDelta.from_runs(runs, color, None).runs())
+        if not runs:
+            return self
+        allocated = [0]
+        root = self._paint(self._root, 0, 0, self._size, runs, value, allocated)
+        canvas = self._with_root(root, allocated[0])
+        canvas.parent_version = self.version
+        canvas._edited_rows = range(runs[0][0], runs[-1][0] + 1)
+        return canvas
+
+    def paint_delta(self, delta):
+        """
+        Returns a new canvas with the points of the delta painted
+        """
+        if delta.run_based:
+            return self.paint_runs(delta.runs(), delta.color)
+        runs = {}
+        for (x, y), point in delta.items():
+            runs.setdefault(point.color, []).append((y, x, x))
+        canvas = self
+        for color, color_runs in runs.items():
+            canvas = canvas.paint_runs(color_runs, color)
+        return canvas
+
+    def _paint(self, node, x0, y0, size, runs, value, allocated):
+        """
+        Returns the node with the runs, sorted and clipped to it, painted
+        """
+        if not runs or (type(node) is int and node == value):
+            return node
+        painted = sum(x2 - x1 + 1 for _, x1, x2 in runs)
+        if painted == (min(x0 + size, self._width) - x0) * (min(y0 + size, self._height) - y0):
+            # Every point of the node within the canvas is painted
+            return value
+
+        leaf_size = self.LEAF_SIZE
+        if size == leaf_size:
+            block = bytearray([node]) * (leaf_size * leaf_size) if type(node) is int else bytearray(node)
+            for y, x1, x2 in runs:
+                offset = (y - y0) * leaf_size - x0
+                block[offset + x1:offset + x2 + 1] = bytes([value]) * (x2 - x1 + 1)
+            if block.count(block[0]) == len(block):
+                return block[0]
+            block = bytes(block)
+            allocated[0] += sys.getsizeof(block)
+            return block
+
+        quadrants = node if type(node) is tuple else (node,) * 4
+        size //= 2
+        middle_y = y0 + size
+        middle_x = x0 + size
+        split = next((i for i, run in enumerate(runs) if run[0] >= middle_y), len(runs))
+        painted = []
+        for quadrant, (rows, qx, qy) in enumerate([
+                (runs[:split], x0, y0), (runs[:split], middle_x, y0),
+                (runs[split:], x0, middle_y), (runs[split:], middle_x, middle_y)]):
+            clipped = [
+                (y, max(x1, qx), min(x2, qx + size - 1))
+                for y, x1, x2 in rows
+                if x1 < qx + size and x2 >= qx
+            ]
+            painted.append(self._paint(quadrants[quadrant], qx, qy, size, clipped, value, allocated))
+
+        if all(new is old for new, old in zip(painted, quadrants)):
+            return node
+        if type(painted[0]) is int and painted[0] == painted[1] == painted[2] == painted[3]:
+            return painted[0]
+        painted = tuple(painted)
+        allocated[0] += sys.getsizeof(painted)
+        return painted
+
+    def snapshot(self, canvas):
+        if isinstance(canvas, EditedCanvas) and canvas.base is self:
+            # Replays the edits, sharing the nodes they don't paint
+            snapshot = self
+            for edit in canvas.edits():
+                snapshot = snapshot.paint_delta(edit.delta)
+            snapshot = snapshot._with_root(snapshot._root, snapshot._own_bytes)
+            return snapshot
+        # Paints the runs of every color but the background on a blank canvas
+        snapshot = self._with_root(self._background, 0)
+        background = self._colors[self._background]
+        runs = {}
+        for y in range(canvas.height):
+            start = 0
+            row = canvas.row_colors(y)
+            for x in range(1, len(row) + 1):
+                if x == len(row) or row[x] != row[start]:
+                    if row[start] != background:
+                        runs.setdefault(row[start], []).append((y, start, x - 1))
+                    start = x
+        own_bytes = 0
+        for color, color_runs in runs.items():
+            snapshot = snapshot.paint_runs(color_runs, color)
+            own_bytes += snapshot._own_bytes
+        snapshot._own_bytes = own_bytes
+        snapshot.parent_version = None
+        snapshot._edited_rows = None
+        return snapshot
+
+
+class QuadtreePainter(Painter):
+    """
+    Painter returning a new version of a QuadtreeCanvas for every edit, rather than stacking deltas on it.
+    Other canvases are painted like Painter does.
+    """
+    def __init__(self, point_factory, compaction_policy=None, delta_class=None, region_index=None):
+        """
+        :param delta_class: Ignored: the painted points are always collected as a RunDelta, whose runs are painted
+                            on the quadtree as they are (the program passes its own delta class to every painter)
+        """
+        super().__init__(point_factory, compaction_policy, RunDelta, region_index)
+
+    def _edit(self, canvas, delta):
+        if not isinstance(canvas, QuadtreeCanvas):
+            return super()._edit(canvas, delta)
+        return canvas.paint_delta(delta)
+
+
+class QuadtreeCanvasFactory(CanvasFactory):
+    def create_canvas(self, width, height, palette, background_color):
+        return QuadtreeCanvas(width, height, palette, background_color)
@@ -0,0 +1,228 @@
+"""
+Index of the areas of uniform color of a canvas, for repeated bucket fills.
+
+Every row is split in runs of the same color, and the runs connected to one another (vertically overlapping, or
+next to each other in the row) are joined in a union-find forest whose roots hold the runs of their area.
+A bucket fill takes the runs of the area of the point, then recolors them and joins them with the areas of the new
+color around them, so that filling costs about the size of the painted area. The changes made by the latest fills are
+logged to roll them back when they're undone. Any other change of the canvas (edits, redo...) only rebuilds the
+changed rows, and the areas touching them.
+"""
+from bisect import bisect_right
+from itertools import groupby
+
+from .canvas import EditedCanvas
+
+
+class _Run(object):
+    __slots__ = ("y", "x1", "x2", "color", "parent", "runs")
+
+    def __init__(self, y, x1, x2, color):
+        self.y = y
+        self.x1 = x1
+        self.x2 = x2
+        self.color = color
+        # Parent in the union-find forest, and the runs of the area for roots
+        self.parent = self
+        self.runs = [self]
+
+
+class RegionIndex(object):
+    # Number of edits walked to relate a canvas to the indexed one
+    MAX_EDITS = 64
+    # Number of fills whose changes are logged to be rolled back
+    MAX_LOGS = 32
+
+    def __init__(self):
+        self._canvas = None
+        # Starts of the runs, and the runs, by row
+        self._starts = []
+        self._rows = []
+        # (filled canvas, version of the canvas it was filled from, changes) of the latest fills, and the changes of
+        # the latest one, which the paths compressed after it are logged to as well
+        self._logs = []
+        self._log = None
+        # Number of times the whole canvas was indexed, and of rows indexed again after a change
+        self.builds = 0
+        self.rebuilt_rows = 0
+
+    def area_runs(self, canvas, x, y):
+        """
+        Returns the horizontal runs (y, x1, x2) making the area connected to (x, y), like canvas.uniform_area_runs
+        """
+        canvas.coordinate(x, y)
+        self._sync(canvas)
+        root = self._find(self._run_at(x, y))
+        return [(run.y, run.x1, run.x2) for run in root.runs]
+
+    def filled(self, canvas, edited, x, y, color):
+        """
+        Records the bucket fill of the area of (x, y) with color, which made edited out of canvas
+        """
+        if self._canvas is None or self._canvas.version != canvas.version:
+            # Found out when syncing with the next canvas
+            return
+        self._log = log = []
+        runs = list(self._find(self._run_at(x, y)).runs)
+        log.append((runs, "color", runs[0].color))
+        for run in runs:
+            run.color = color
+        for run in runs:
+            self._join_neighbours(run)
+        self._logs = self._logs[-(self.MAX_LOGS - 1):] + [(edited, canvas.version, log)]
+        self._canvas = edited
+
+    def _sync(self, canvas):
+        """
+        Indexes the areas of canvas, updating the rows which changed since the indexed canvas
+        """
+        indexed = self._canvas
+        if indexed is not None and indexed.version == canvas.version:
+            return
+        if self._logs and self._logs[-1][0] is indexed and self._logs[-1][1] == canvas.version:
+            # Undoing a fill
+            self._roll_back(self._logs.pop()[2])
+            self._log = self._logs[-1][2] if self._logs else None
+            self._canvas = canvas
+            return
+        self._logs = []
+        self._log = None
+        rows = None
+        if indexed is not None and (indexed.width, indexed.height) == (canvas.width, canvas.height):
+            rows = self._changed_rows(canvas, indexed)
+            if rows is None:
+                # Undo
+                rows = self._changed_rows(indexed, canvas)
+        if rows is None:
+            self._build(canvas)
+        elif rows:
+            self._update(canvas, rows)
+        self._canvas = canvas
+
+    def _changed_rows(self, canvas, previous):
+        """
+        Returns the range of rows painted by the edits which made canvas out of previous, None if it's not made of it
+        """
+        y1 = y2 = None
+        for _ in range(self.MAX_EDITS):
+            if isinstance(canvas, EditedCanvas):
+                parent, parent_version = canvas.original_canvas, canvas.original_canvas.version
+                rows = () if canvas.bounds is None else (canvas.bounds[1], canvas.bounds[3])
+            elif getattr(canvas, "parent_version", None) is not None:
+                # Persistent canvases (e.g. QuadtreeCanvas) only know the version of the canvas they were painted on
+                parent, parent_version = None, canvas.parent_version
+                rows = canvas.edited_rows()
+            else:
+                return None
+            if rows:
+                y1 = min(rows) if y1 is None else min(y1, min(rows))
+                y2 = max(rows) if y2 is None else max(y2, max(rows))
+            if parent_version == previous.version:
+                return range(0) if y1 is None else range(y1, y2 + 1)
+            if parent is None:
+                return None
+            canvas = parent
+        return None
+
+    def _build(self, canvas):
+        self._starts = []
+        self._rows = []
+        for y in range(canvas.height):
+            starts, runs = self._row_runs(canvas, y)
+            self._starts.append(starts)
+            self._rows.append(runs)
+        for runs in self._rows:
+            for run in runs:
+                self._join_neighbours(run)
+        self.builds += 1
+
+    def _update(self, canvas, rows):
+        """
+        Indexes again the rows which changed, and the areas touching them
+        """
+        # The areas reaching the rows around the changed ones may be connected through them: they're split into
+        # their runs and joined again
+        touched = {}
+        for y in range(max(rows.start - 1, 0), min(rows.stop + 1, canvas.height)):
+            for run in self._rows[y]:
+                root = self._find(run)
+                touched[id(root)] = root
+        affected = [run for root in touched.values() for run in root.runs if run.y not in rows]
+        for run in affected:
+            run.parent = run
+            run.runs = [run]
+
+        for y in rows:
+            self._starts[y], self._rows[y] = self._row_runs(canvas, y)
+            affected += self._rows[y]
+        for run in affected:
+            self._join_neighbours(run)
+        self.rebuilt_rows += len(rows)
+
+    @staticmethod
+    def _roll_back(log):
+        for run, attribute, value in reversed(log):
+            if attribute == "color":
+                for filled in run:
+                    filled.color = value
+            elif attribute == "parent":
+                run.parent = value
+            else:
+                runs, length = value
+                if runs is not None:
+                    del runs[length:]
+                run.runs = runs
+
+    @staticmethod
+    def _row_runs(canvas, y):
+        starts, runs = [], []
+        x = 0
+        for color, points in groupby(canvas.row_colors(y)):
+            length = sum(1 for _ in points)
+            starts.append(x)
+            runs.append(_Run(y, x, x + length - 1, color))
+            x += length
+        return starts, runs
+
+    def _run_at(self, x, y):
+        return self._rows[y][bisect_right(self._starts[y], x) - 1]
+
+    def _join_neighbours(self, run):
+        """
+        Joins the area of the run with the areas of the runs of the same color next to it
+        """
+        y = run.y
+        runs = self._rows[y]
+        i = bisect_right(self._starts[y], run.x1) - 1
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(runs) and runs[j].color == run.color:
+                self._union(run, runs[j])
+        for y2 in (y - 1, y + 1):
+            if 0 <= y2 < len(self._rows):
+                starts, runs = self._starts[y2], self._rows[y2]
+                j = max(bisect_right(starts, run.x1) - 1, 0)
+                while j < len(runs) and starts[j] <= run.x2:
+                    if runs[j].color == run.color:
+                        self._union(run, runs[j])
+                    j += 1
+
+    def _find(self, run):
+        while run.parent is not run:
+            if self._log is not None:
+                self._log.append((run, "parent", run.parent))
+            run.parent = run.parent.parent
+            run = run.parent
+        return run
+
+    def _union(self, a, b):
+        a = self._find(a)
+        b = self._find(b)
+        if a is b:
+            return
+        if len(a.runs) < len(b.runs):
+            a, b = b, a
+        if self._log is not None:
+            self._log += [(b, "parent", b), (a, "runs", (a.runs, len(a.runs))), (b, "runs", (b.runs, len(b.runs)))]
+        b.parent = a
+        a.runs += b.runs
+        b.runs = None
@@ -0,0 +1,186 @@
+"""
+Canvas server: every connection drives its own program, one command per line.
+
+The server replies to every command with the printed canvas (if any) followed by a status line: OK, ERROR <message>,
+or BYE once the session is over. The text output of a command (the statistics of S) comes first, every line starting
+with "# ". Commands run in an executor, so that a long bucket fill or the rendering of a large
+canvas of one session doesn't stall the event loop serving the others.
+Clients cannot reach the file system (SAVE, LOAD and EXPORT are unknown commands) and the canvases they create are
+limited in size.
+"""
+import asyncio
+import io
+
+from .printer import AsciiCanvasPrinter
+from .program import CommandError, Quit
+
+
+class CanvasSession(object):
+    """
+    State of a connection: its program, printing the canvas to a buffer sent back after every command
+    """
+    # Commands reading or writing files, which would let the clients read or overwrite any file of the server
+    FILE_COMMANDS = ("SAVE", "LOAD", "EXPORT")
+
+    def __init__(self, program_factory, max_canvas_points=None):
+        """
+        :param program_factory: Function taking a printer and returning a new Program, whose file commands are removed
+        :param max_canvas_points: Largest canvas (width * height) of the session, None to keep the program limit
+        """
+        self.printer = SessionCanvasPrinter()
+        self.program = program_factory(self.printer)
+        for name in self.FILE_COMMANDS:
+            self.program.commands.pop(name, None)
+        if max_canvas_points is not None:
+            self.program.state.max_canvas_points = max_canvas_points
+
+    def run_line(self, line):
+        """
+        Runs a command line and prints the canvas
+        :return: The printed canvas, empty if the line is blank or there is no canvas yet
+        """
+        command_args = line.split()
+        if not command_args:
+            return ""
+        self.program.run_command(*command_args)
+        return self.printer.pop_output()
+
+
+class SessionCanvasPrinter(AsciiCanvasPrinter):
+    """
+    Printer writing the canvas to a buffer rather than to the standard output
+    """
+    def __init__(self, render_cache=None, renderer=None):
+        super().__init__(render_cache, renderer)
+        self._output = io.StringIO()
+
+    def print_canvas(self, canvas):
+        self.write_canvas(canvas, self._output)
+
+    def print_text(self, text):
+        self._output.write("".join("# " + line + "\n" for line in text.split("\n")))
+
+    def pop_output(self):
+        output = self._output.getvalue()
+        self._output = io.StringIO()
+        return output
+
+
+class CanvasServer(object):
+    def __init__(self, program_factory, executor=None, max_canvas_points=1000000):
+        """
+        :param program_factory: Function taking a printer and returning the Program of a new session
+        :param executor: concurrent.futures executor commands run in (the default executor of the loop by default)
+        :param max_canvas_points: Largest canvas (width * height) a session can create, None for no limit
+        """
+        self.program_factory = program_factory
+        self.executor = executor
+        self.max_canvas_points = max_canvas_points
+        self.sessions = 0
+        self.commands = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Starts listening on a TCP port (0 picks a free one, see asyncio.Server.sockets)
+        :return: The asyncio.Server
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def start_unix(self, path):
+        """
+        Starts listening on a Unix socket
+        :return: The asyncio.Server
+        """
+        return await asyncio.start_unix_server(self.handle, path)
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        session = CanvasSession(self.program_factory, self.max_canvas_points)
+        self.sessions += 1
+        try:
+            while True:
+                try:
+                    line = await self._read_line(reader)
+                    if not line:
+                        break
+                    output = await loop.run_in_executor(self.executor, session.run_line, line.decode())
+                except Quit:
+                    writer.write(b"BYE\n")
+                    break
+                except (CommandError, UnicodeDecodeError) as e:
+                    message = e.args[0] if isinstance(e, CommandError) else "Invalid encoding"
+                    writer.write("ERROR {}\n".format(message).encode())
+                else:
+                    self.commands += 1
+                    writer.write(output.encode() + b"OK\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader):
+        """
+        Reads the next line, up to the limit of the reader
+        :return: The line, empty at the end of the stream
+        :raises CommandError: If the line is longer than the limit (it's skipped)
+        """
+        too_long = False
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # Last line, without the line feed
+                line = e.partial
+            except asyncio.LimitOverrunError as e:
+                # Drops what was read of the line, up to the line feed if it was found
+                await reader.readexactly(e.consumed)
+                too_long = True
+                continue
+            if too_long:
+                raise CommandError("Line too long")
+            return line
+
+
+class CanvasClient(object):
+    """
+    Client of a CanvasServer, sending one command at a time
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=None):
+        return cls(*await asyncio.open_connection(host, port))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def send(self, line):
+        """
+        Sends a command line and waits for the reply
+        :return: The status (OK, ERROR or BYE), the error message (empty if none) and the printed output (canvas and
+                 text lines)
+        """
+        self._writer.write(line.rstrip("\n").encode() + b"\n")
+        await self._writer.drain()
+        output = []
+        while True:
+            reply = await self._reader.readline()
+            if not reply:
+                raise ConnectionError("Connection closed by the server")
+            reply = reply.decode()
+            # Lines of the canvas start with its borders, - or |, and lines of text with #
+            if reply[0] not in "-|#":
+                status, _, message = reply.rstrip("\n").partition(" ")
+                return status, message, "".join(output)
+            output.append(reply)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
@@ -0,0 +1,204 @@
+"""
+Binary canvas files: a header with the width, the height and the palette, then one byte per point
+(the index of its color in the palette, sorted) row by row.
+"""
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from .canvas import ArrayCanvas, EditedCanvas
+
+MAGIC = b"PNTC"
+FORMAT_VERSION = 1
+# Magic, format version, width, height, number of colors in the palette
+HEADER = struct.Struct("<4sBIIH")
+# Read once, as os.umask can only be read by setting it (which would race with the threads writing files)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class CanvasFileError(Exception):
+    pass
+
+
+class MappedCanvas(ArrayCanvas):
+    """
+    Read only canvas backed by a memory mapped canvas file: points are read from the file on demand,
+    so only the pages which are actually read are loaded.
+    Compacting its edits gives an ArrayCanvas in memory.
+    The file stays mapped until the canvas is closed: the history closes it once no canvas is built on it anymore.
+    The file must never be truncated or written in place while it is mapped: reading the canvas would then crash
+    the process (SIGBUS) rather than raise CanvasFileError. Files are only ever replaced (see replace_file), which
+    leaves the mapped one untouched.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            try:
+                self._pixels = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file
+                raise CanvasFileError("Invalid canvas file")
+        try:
+            self._width, self._height, self._colors, self._offset = read_header(self._pixels)
+            if len(self._pixels) != self._offset + self._width * self._height:
+                raise CanvasFileError("Truncated canvas file")
+        except BaseException:
+            self._pixels.close()
+            raise
+        self._indices = {color: index for index, color in enumerate(self._colors)}
+        self._background_color = None
+
+    @property
+    def palette(self):
+        return set(self._colors)
+
+    def memory_size(self):
+        # The pages of the file are held by the operating system page cache
+        return sys.getsizeof(self)
+
+    def _copy_pixels(self):
+        return bytearray(self._pixels[self._offset:])
+
+    def close(self):
+        self._pixels.close()
+
+
+def read_header(buffer):
+    """
+    Parses the header of a canvas file
+    :return: Width, height, sorted colors of the palette and position of the first point
+    """
+    if len(buffer) < HEADER.size:
+        raise CanvasFileError("Invalid canvas file")
+    magic, version, width, height, palette_size = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise CanvasFileError("Invalid canvas file")
+    if version != FORMAT_VERSION:
+        raise CanvasFileError("Unsupported canvas file version {}".format(version))
+    if width == 0 or height == 0 or palette_size == 0 or palette_size > 256:
+        raise CanvasFileError("Invalid canvas file")
+
+    offset = HEADER.size
+    colors = []
+    for _ in range(palette_size):
+        if offset >= len(buffer) or offset + 1 + buffer[offset] > len(buffer):
+            raise CanvasFileError("Truncated canvas file")
+        length = buffer[offset]
+        try:
+            colors.append(bytes(buffer[offset + 1:offset + 1 + length]).decode("utf-8"))
+        except UnicodeDecodeError:
+            raise CanvasFileError("Invalid canvas file")
+        offset += 1 + length
+    if colors != sorted(set(colors)):
+        raise CanvasFileError("Invalid canvas file")
+    return width, height, tuple(colors), offset
+
+
+def write_header(file, width, height, colors):
+    file.write(HEADER.pack(MAGIC, FORMAT_VERSION, width, height, len(colors)))
+    for color in colors:
+        encoded = color.encode("utf-8")
+        assert len(encoded) < 256, "Color too long"
+        file.write(bytes([len(encoded)]) + encoded)
+
+
+@contextmanager
+def replace_file(path, mode="wb", fsync=False):
+    """
+    Opens a temporary file next to path, which replaces it atomically once written (it is deleted on errors).
+    Every file of the program is written this way, never truncated in place, so that the canvases mapped from
+    them are left untouched.
+    The new file keeps the permissions of the one it replaces, or gets the ones open() would give it.
+    :param fsync: Whether to flush the file to the disk before replacing the previous one
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".{}-".format(os.path.basename(path)))
+    try:
+        with os.fdopen(file_descriptor, mode) as file:
+            try:
+                permissions = stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                permissions = 0o666 & ~_UMASK
+            os.chmod(temp_path, permissions)
+            yield file
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def save_canvas(canvas, path, palette, fsync=False):
+    """
+    Writes canvas to a canvas file.
+    The file is replaced atomically, so that a canvas mapped from it is left untouched.
+    :param palette: Colors of the program (every point of the canvas must have one of them)
+    :param fsync: Whether to flush the file to the disk before replacing the previous one
+    """
+    colors = tuple(sorted(palette))
+    assert len(colors) <= 256, "The palette cannot contain more than 256 colors"
+    indices = {color: index for index, color in enumerate(colors)}
+
+    with replace_file(path, fsync=fsync) as file:
+        write_header(file, canvas.width, canvas.height, colors)
+        for row in _pixel_rows(canvas, colors, indices):
+            file.write(row)
+
+
+def _pixel_rows(canvas, colors, indices):
+    """
+    Yields the points of the canvas as rows of indices in colors
+    """
+    base, edited_rows = canvas, set()
+    if isinstance(canvas, EditedCanvas):
+        base = canvas.base
+        for edit in canvas.edits():
+            edited_rows.update(edit.edited_rows())
+    # Rows which were not edited are copied from an ArrayCanvas base as they are
+    copy_rows = isinstance(base, ArrayCanvas) and base._colors == colors
+
+    width = canvas.width
+    for y in range(canvas.height):
+        if copy_rows and y not in edited_rows:
+            row = base._offset + y * width
+            yield base._pixels[row:row + width]
+            continue
+        try:
+            yield bytes(indices[color] for color in canvas.row_colors(y))
+        except KeyError:
+            raise CanvasFileError("The canvas has colors which are not in the palette")
+
+
+def load_canvas(path, palette):
+    """
+    Opens a canvas file.
+    If it was saved with the same palette, the canvas is mapped from the file, otherwise its points are translated
+    to the palette and loaded in memory.
+    :param palette: Colors of the program, the file cannot have other colors
+    :return: A MappedCanvas or an ArrayCanvas
+    """
+    canvas = MappedCanvas(path)
+    colors = tuple(sorted(palette))
+    if canvas._colors == colors:
+        return canvas
+
+    mapped, canvas = canvas, ArrayCanvas.__new__(ArrayCanvas)
+    try:
+        if not set(mapped._colors) <= set(colors):
+            raise CanvasFileError("The canvas file has colors which are not in the palette")
+        canvas._width = mapped.width
+        canvas._height = mapped.height
+        canvas._colors = colors
+        canvas._indices = {color: index for index, color in enumerate(colors)}
+        canvas._background_color = None
+        table = bytes(canvas._indices[color] for color in mapped._colors) + bytes(256 - len(mapped._colors))
+        canvas._pixels = bytearray(mapped._pixels[mapped._offset:].translate(table))
+    finally:
+        mapped.close()
+    return canvas
@@ -0,0 +1,517 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+import re
+import sys
+
+from .canvas import BaseCanvas, CanvasFactory, EditedCanvas, PointOutOfCanvas, compact
+from .delta import RunDelta
+from .painter import Painter
+from .point import Point
+
+
+class TiledCanvas(BaseCanvas):
+    """
+    Canvas split in square tiles, each one either uniform (a single palette index) or storing one byte per point.
+    Tiles are allocated when they are first painted, the other tiles are uniform with the background color.
+    """
+    def __init__(self, width, height, palette, background_color, tile_size=64):
+        assert width > 0 and height > 0, "Invalid width or height"
+        assert tile_size > 0, "Invalid tile size"
+        self._width = width
+        self._height = height
+        self.tile_size = tile_size
+        self._colors = tuple(sorted(palette))
+        assert len(self._colors) <= 256, "The palette cannot contain more than 256 colors"
+        self._indices = {color: index for index, color in enumerate(self._colors)}
+        assert background_color in self._indices, "The background color is not in the palette"
+        self._background = self._indices[background_color]
+        # (column, row) of the tile -> palette index if uniform, otherwise the bytearray of its rows
+        self._tiles = {}
+        self._columns = None
+
+    def _with_tiles(self, tiles):
+        canvas = TiledCanvas.__new__(TiledCanvas)
+        canvas._width = self._width
+        canvas._height = self._height
+        canvas.tile_size = self.tile_size
+        canvas._colors = self._colors
+        canvas._indices = self._indices
+        canvas._background = self._background
+        canvas._tiles = tiles
+        canvas._columns = None
+        return canvas
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def allocated_tiles(self):
+        """
+        Number of tiles storing one byte per point
+        """
+        return sum(1 for tile in self._tiles.values() if not isinstance(tile, int))
+
+    def tile_bounds(self, tx, ty):
+        """
+        Returns the corners (x1, y1, x2, y2) of the tile, both included
+        """
+        x1 = tx * self.tile_size
+        y1 = ty * self.tile_size
+        return x1, y1, min(x1 + self.tile_size, self._width) - 1, min(y1 + self.tile_size, self._height) - 1
+
+    def _tile(self, x, y):
+        return self._tiles.get((x // self.tile_size, y // self.tile_size), self._background)
+
+    def _tile_width(self, tx):
+        return min(self.tile_size, self._width - tx * self.tile_size)
+
+    def _value(self, x, y):
+        tile = self._tile(x, y)
+        if isinstance(tile, int):
+            return tile
+        tile_size = self.tile_size
+        return tile[(y % tile_size) * self._tile_width(x // tile_size) + x % tile_size]
+
+    def point(self, x, y):
+        if not self.exists(x, y):
+            raise PointOutOfCanvas
+        return Point(x, y, self._colors[self._value(x, y)])
+
+    def color_at(self, x, y):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            raise PointOutOfCanvas
+        return self._colors[self._value(x, y)]
+
+    def row_colors(self, y):
+        if not 0 <= y < self._height:
+            raise PointOutOfCanvas
+        colors = self._colors
+        tile_size = self.tile_size
+        ty, offset = divmod(y, tile_size)
+        row = []
+        for tx in range((self._width + tile_size - 1) // tile_size):
+            tile = self._tiles.get((tx, ty), self._background)
+            tile_width = self._tile_width(tx)
+            if isinstance(tile, int):
+                row += [colors[tile]] * tile_width
+            else:
+                row += [colors[i] for i in tile[offset * tile_width:(offset + 1) * tile_width]]
+        return row
+
+    def memory_size(self):
+        return sys.getsizeof(self) + sys.getsizeof(self._tiles) + \
+            sum(sys.getsizeof(tile) for tile in self._tiles.values() if not isinstance(tile, int))
+
+    def _tile_columns(self):
+        """
+        Returns the sorted columns of the tiles stored in each row of tiles
+        """
+        # The tiles of a canvas never change once it's built
+        if self._columns is None:
+            self._columns = {}
+            for tx, ty in self._tiles:
+                self._columns.setdefault(ty, []).append(tx)
+            for columns in self._columns.values():
+                columns.sort()
+        return self._columns
+
+    def _open_spans(self, ty, value):
+        """
+        Returns the spans of uniform tiles of the given palette index in a row of tiles, as the lists of their starts
+        and ends, and the sorted list of the allocated tiles of the row
+        """
+        starts, ends, allocated = [], [], []
+        start = 0
+        for tx in self._tile_columns().get(ty, ()):
+            tile = self._tiles[(tx, ty)]
+            if tile.__class__ is not int:
+                allocated.append(tx)
+            elif tile == value:
+                if self._background != value:
+                    if ends and ends[-1] == tx - 1:
+                        ends[-1] = tx
+                    else:
+                        starts.append(tx)
+                        ends.append(tx)
+                continue
+            if self._background == value and tx > start:
+                starts.append(start)
+                ends.append(tx - 1)
+            start = tx + 1
+        columns = (self._width + self.tile_size - 1) // self.tile_size
+        if self._background == value and start < columns:
+            starts.append(start)
+            ends.append(columns - 1)
+        return starts, ends, allocated
+
+    def area(self, x, y):
+        """
+        Returns the area connected to (x, y): the spans of tiles (ty, tx1, tx2) it covers entirely, found without
+        looking at their points, and the horizontal runs (y, x1, x2) of its points in the allocated tiles
+        """
+        if not self.exists(x, y):
+            raise PointOutOfCanvas
+        value = self._value(x, y)
+        pattern = re.compile(re.escape(bytes([value])) + b"+")
+        tiles = self._tiles
+        background = self._background
+        tile_size = self.tile_size
+        tile_rows = (self._height + tile_size - 1) // tile_size
+        # Spans of uniform tiles of the color of the area, by row of tiles
+        row_spans = {}
+
+        def spans(ty):
+            if ty not in row_spans:
+                row_spans[ty] = self._open_spans(ty, value)
+            return row_spans[ty]
+
+        tile_spans = []
+        found_spans = set()
+        runs = []
+        # Runs found so far in the allocated tiles, indexed by row: sorted starts and their ends
+        filled = {}
+        # Spans of tiles of the area whose neighbours are still to be visited, and points of the allocated tiles
+        # which might be part of the area
+        span_seeds = []
+        seeds = [(x, y)]
+
+        while seeds or span_seeds:
+            if span_seeds:
+                ty, tx1, tx2 = span_seeds.pop()
+                tile_spans.append((ty, tx1, tx2))
+                x1, y1, _, y2 = self.tile_bounds(tx1, ty)
+                x2 = self.tile_bounds(tx2, ty)[2]
+                for ty2, y3 in ((ty - 1, y1 - 1), (ty + 1, y2 + 1)):
+                    if not 0 <= ty2 < tile_rows:
+                        continue
+                    starts, ends, allocated = spans(ty2)
+                    for i in range(bisect_left(ends, tx1), bisect_right(starts, tx2)):
+                        if (ty2, starts[i]) not in found_spans:
+                            found_spans.add((ty2, starts[i]))
+                            span_seeds.append((ty2, starts[i], ends[i]))
+                    for i in range(bisect_left(allocated, tx1), bisect_right(allocated, tx2)):
+                        # Points of the allocated tile along the edge shared with the span
+                        tile_x1, _, tile_x2, _ = self.tile_bounds(allocated[i], ty2)
+                        seeds.extend(self._row_seeds(tile_x1, tile_x2, y3, value, pattern))
+                for tx, x3 in ((tx1 - 1, x1 - 1), (tx2 + 1, x2 + 1)):
+                    if tiles.get((tx, ty), background).__class__ is not int:
+                        seeds.extend(self._column_seeds(x3, y1, y2, value))
+                continue
+
+            x, y = seeds.pop()
+            key = (x // tile_size, y // tile_size)
+            tile = tiles.get(key, background)
+            if tile.__class__ is int:
+                if tile == value:
+                    starts, ends, _ = spans(key[1])
+                    i = bisect_right(starts, key[0]) - 1
+                    if (key[1], starts[i]) not in found_spans:
+                        found_spans.add((key[1], starts[i]))
+                        span_seeds.append((key[1], starts[i], ends[i]))
+                continue
+
+            starts, ends = filled.setdefault(y, ([], []))
+            i = bisect_right(starts, x)
+            if i and ends[i - 1] >= x:
+                # Already part of a run
+                continue
+            tile_x1, _, tile_x2, _ = self.tile_bounds(*key)
+            row = (y % tile_size) * (tile_x2 - tile_x1 + 1) - tile_x1
+            if tile[row + x] != value:
+                continue
+
+            x1 = tile_x1 + len(tile[row + tile_x1:row + x].rstrip(bytes([value])))
+            x2 = pattern.match(tile, row + x, row + tile_x2 + 1).end() - row - 1
+            starts.insert(i, x1)
+            ends.insert(i, x2)
+            runs.append((y, x1, x2))
+
+            if x1 == tile_x1 and x1 > 0:
+                seeds.append((x1 - 1, y))
+            if x2 == tile_x2 and x2 < self._width - 1:
+                seeds.append((x2 + 1, y))
+            for y2 in (y - 1, y + 1):
+                if 0 <= y2 < self._height:
+                    seeds.extend(self._row_seeds(x1, x2, y2, value, pattern))
+
+        return tile_spans, runs
+
+    def _row_seeds(self, x1, x2, y, value, pattern):
+        """
+        Yields a point of every run of the given palette index between (x1, y) and (x2, y), one per uniform tile
+        """
+        tile_size = self.tile_size
+        ty = y // tile_size
+        for tx in range(x1 // tile_size, x2 // tile_size + 1):
+            tile = self._tiles.get((tx, ty), self._background)
+            tile_x1, _, tile_x2, _ = self.tile_bounds(tx, ty)
+            start, end = max(x1, tile_x1), min(x2, tile_x2)
+            if isinstance(tile, int):
+                if tile == value:
+                    yield start, y
+            else:
+                row = (y % tile_size) * (tile_x2 - tile_x1 + 1) - tile_x1
+                for match in pattern.finditer(tile, row + start, row + end + 1):
+                    yield match.start() - row, y
+
+    def _column_seeds(self, x, y1, y2, value):
+        """
+        Yields the points of the given palette index between (x, y1) and (x, y2) of an allocated tile
+        """
+        for y in range(y1, y2 + 1):
+            if self._value(x, y) == value:
+                yield x, y
+
+    def uniform_area_runs(self, x, y):
+        tile_spans, runs = self.area(x, y)
+        spans = {}
+        for y1, x1, x2 in runs:
+            spans.setdefault(y1, []).append((x1, x2))
+        for ty, tx1, tx2 in tile_spans:
+            x1, y1, _, y2 = self.tile_bounds(tx1, ty)
+            x2 = self.tile_bounds(tx2, ty)[2]
+            for y in range(y1, y2 + 1):
+                spans.setdefault(y, []).append((x1, x2))
+        for y in sorted(spans):
+            yield from ((y, x1, x2) for x1, x2 in _merge(spans[y]))
+
+    def snapshot(self, canvas):
+        if not (isinstance(canvas, EditedCanvas) and canvas.base is self):
+            snapshot = self._with_tiles({})
+            copied = set()
+            for y in range(canvas.height):
+                snapshot._paint_row(y, [self._indices[color] for color in canvas.row_colors(y)], copied)
+            snapshot._collapse(copied)
+            return snapshot
+
+        # Shares the tiles which are not painted by the edits
+        snapshot = self._with_tiles(dict(self._tiles))
+        copied = set()
+        for edit in canvas.edits():
+            delta = edit.delta
+            if isinstance(delta, TileDelta):
+                value = self._indices[delta.color]
+                for ty, tx1, tx2 in delta.tile_spans():
+                    for tx in range(tx1, tx2 + 1):
+                        snapshot._set_tile((tx, ty), value)
+                        copied.discard((tx, ty))
+                delta = delta.run_delta
+            if isinstance(delta, RunDelta):
+                value = self._indices[delta.color]
+                for y, x1, x2 in delta.runs():
+                    snapshot._paint_run(y, x1, x2, value, copied)
+            else:
+                for (x, y), point in delta.items():
+                    snapshot._paint_run(y, x, x, self._indices[point.color], copied)
+        snapshot._collapse(copied)
+        return snapshot
+
+    def _set_tile(self, key, value):
+        if value == self._background:
+            self._tiles.pop(key, None)
+        else:
+            self._tiles[key] = value
+
+    def _writable_tile(self, key, copied):
+        """
+        Returns the bytearray of the tile, copying it the first time it is written if it's shared
+        """
+        tile = self._tiles.get(key, self._background)
+        if isinstance(tile, int):
+            x1, y1, x2, y2 = self.tile_bounds(*key)
+            tile = bytearray([tile]) * ((x2 - x1 + 1) * (y2 - y1 + 1))
+        elif key not in copied:
+            tile = tile[:]
+        self._tiles[key] = tile
+        copied.add(key)
+        return tile
+
+    def _paint_run(self, y, x1, x2, value, copied):
+        tile_size = self.tile_size
+        ty = y // tile_size
+        for tx in range(x1 // tile_size, x2 // tile_size + 1):
+            tile_x1, _, tile_x2, _ = self.tile_bounds(tx, ty)
+            start, end = max(x1, tile_x1), min(x2, tile_x2)
+            tile = self._tiles.get((tx, ty), self._background)
+            if isinstance(tile, int) and tile == value:
+                continue
+            tile = self._writable_tile((tx, ty), copied)
+            row = (y % tile_size) * (tile_x2 - tile_x1 + 1) - tile_x1
+            tile[row + start:row + end + 1] = bytes([value]) * (end - start + 1)
+
+    def _paint_row(self, y, values, copied):
+        tile_size = self.tile_size
+        for tx in range((self._width + tile_size - 1) // tile_size):
+            x1 = tx * tile_size
+            segment = values[x1:x1 + tile_size]
+            if (tx, y // tile_size) not in self._tiles and segment.count(self._background) == len(segment):
+                continue
+            tile = self._writable_tile((tx, y // tile_size), copied)
+            row = (y % tile_size) * len(segment)
+            tile[row:row + len(segment)] = bytes(segment)
+
+    def _collapse(self, keys):
+        """
+        Turns the tiles whose points all have the same color into uniform tiles
+        """
+        for key in keys:
+            tile = self._tiles[key]
+            if not isinstance(tile, int) and tile.count(tile[0]) == len(tile):
+                self._set_tile(key, tile[0])
+
+
+def _merge(spans):
+    """
+    Merges overlapping and adjacent spans (x1, x2)
+    """
+    spans.sort()
+    start, end = spans[0]
+    for x1, x2 in spans[1:]:
+        if x1 > end + 1:
+            yield start, end
+            start = x1
+        end = max(end, x2)
+    yield start, end
+
+
+class TileDelta(Mapping):
+    """
+    Delta painting whole tiles of a TiledCanvas, and runs of points in other tiles, with the same color
+    """
+    run_based = True
+
+    def __init__(self, canvas, tile_spans, runs, color, point_factory):
+        """
+        :param canvas: TiledCanvas the tiles belong to
+        :param tile_spans: Spans of tiles (ty, tx1, tx2) painted entirely
+        :param runs: Horizontal runs (y, x1, x2) painted in the other tiles
+        """
+        self.color = color
+        self.run_delta = RunDelta.from_runs(runs, color, point_factory)
+        self._canvas = canvas
+        self._point_factory = point_factory
+        # Sorted starts and ends of the spans of painted tiles, indexed by row of tiles
+        self._tile_rows = {}
+        for ty, tx1, tx2 in sorted(tile_spans):
+            starts, ends = self._tile_rows.setdefault(ty, ([], []))
+            starts.append(tx1)
+            ends.append(tx2)
+
+        self._size = len(self.run_delta)
+        for x1, y1, x2, y2 in self._span_bounds():
+            self._size += (x2 - x1 + 1) * (y2 - y1 + 1)
+
+    def tile_spans(self):
+        """
+        Returns the spans of tiles (ty, tx1, tx2) painted entirely
+        """
+        for ty, (starts, ends) in self._tile_rows.items():
+            for tx1, tx2 in zip(starts, ends):
+                yield ty, tx1, tx2
+
+    @property
+    def tile_count(self):
+        return sum(tx2 - tx1 + 1 for _, tx1, tx2 in self.tile_spans())
+
+    def _span_bounds(self):
+        """
+        Returns the corners (x1, y1, x2, y2) of the spans of tiles
+        """
+        for ty, tx1, tx2 in self.tile_spans():
+            x1, y1, _, y2 = self._canvas.tile_bounds(tx1, ty)
+            yield x1, y1, self._canvas.tile_bounds(tx2, ty)[2], y2
+
+    def _row_spans(self, y):
+        """
+        Returns the horizontal runs (x1, x2) of the spans of tiles in the row y
+        """
+        starts, ends = self._tile_rows.get(y // self._canvas.tile_size, ((), ()))
+        return [(self._canvas.tile_bounds(tx1, 0)[0], self._canvas.tile_bounds(tx2, 0)[2])
+                for tx1, tx2 in zip(starts, ends)]
+
+    def rows(self):
+        rows = self.run_delta.rows()
+        for ty in self._tile_rows:
+            _, y1, _, y2 = self._canvas.tile_bounds(0, ty)
+            rows.update(range(y1, y2 + 1))
+        return rows
+
+    def bounds(self):
+        corners = list(self._span_bounds())
+        if self.run_delta:
+            corners.append(self.run_delta.bounds())
+        if not corners:
+            return None
+        return (
+            min(x1 for x1, _, _, _ in corners),
+            min(y1 for _, y1, _, _ in corners),
+            max(x2 for _, _, x2, _ in corners),
+            max(y2 for _, _, _, y2 in corners)
+        )
+
+    def memory_size(self):
+        return sys.getsizeof(self) + sys.getsizeof(self._tile_rows) + \
+            sum(sys.getsizeof(starts) + sys.getsizeof(ends) for starts, ends in self._tile_rows.values()) + \
+            self.run_delta.memory_size()
+
+    def paint_row(self, y, colors):
+        for x1, x2 in self._row_spans(y):
+            colors[x1:x2 + 1] = [self.color] * (x2 - x1 + 1)
+        self.run_delta.paint_row(y, colors)
+
+    def runs(self):
+        """
+        Returns the runs (y, x1, x2) of the delta, sorted by row
+        """
+        spans = {}
+        for y, x1, x2 in self.run_delta.runs():
+            spans.setdefault(y, []).append((x1, x2))
+        for y in sorted(self.rows()):
+            yield from ((y, x1, x2) for x1, x2 in _merge(spans.get(y, []) + self._row_spans(y)))
+
+    def __contains__(self, key):
+        tile_size = self._canvas.tile_size
+        starts, ends = self._tile_rows.get(key[1] // tile_size, ((), ()))
+        i = bisect_right(starts, key[0] // tile_size) - 1
+        return (i >= 0 and ends[i] >= key[0] // tile_size) or key in self.run_delta
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self._point_factory.create_point(key[0], key[1], self.color)
+
+    def __iter__(self):
+        for y, x1, x2 in self.runs():
+            for x in range(x1, x2 + 1):
+                yield x, y
+
+    def __len__(self):
+        return self._size
+
+
+class TiledPainter(Painter):
+    """
+    Painter filling areas of a TiledCanvas tile by tile: the tiles covered entirely are painted without
+    looking at their points. Other canvases are painted like Painter does.
+    """
+    def bucket_fill(self, canvas, x, y, color):
+        base = canvas.base if isinstance(canvas, EditedCanvas) else canvas
+        if not isinstance(base, TiledCanvas) or self._region_index is not None:
+            return super().bucket_fill(canvas, x, y, color)
+        # The area is found on the tiles, which need the edits to be folded first
+        canvas = compact(canvas)
+        tile_spans, runs = canvas.area(x, y)
+        return self._edit(canvas, TileDelta(canvas, tile_spans, runs, color, self._point_factory))
+
+
+class TiledCanvasFactory(CanvasFactory):
+    def __init__(self, tile_size=64):
+        self.tile_size = tile_size
+
+    def create_canvas(self, width, height, palette, background_color):
+        return TiledCanvas(width, height, palette, background_color, self.tile_size)
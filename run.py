@@ -1,10 +1,128 @@
-from paint import Program, AsciiCanvasPrinter
+from paint import Program, AsciiCanvasPrinter, CanvasFactory, ArrayCanvasFactory, NumpyCanvasFactory, \
+    TiledCanvasFactory, QuadtreeCanvasFactory, Painter, NumpyPainter, TiledPainter, QuadtreePainter, DictDelta, \
+    RunDelta, Profiler, ImageCanvasPrinter, PpmWriter, PngWriter, ParallelRenderer, CanvasServer, CommandJournal, \
+    ScriptOptimizer, RegionIndex, default_rgb_map
+import argparse
+import asyncio
 import string
+import sys
+
+BACKENDS = {
+    "canvas": (CanvasFactory, Painter),
+    "array": (ArrayCanvasFactory, Painter),
+    "numpy": (NumpyCanvasFactory, NumpyPainter),
+    "tiled": (TiledCanvasFactory, TiledPainter),
+    "quadtree": (QuadtreeCanvasFactory, QuadtreePainter),
+}
+
+IMAGE_WRITERS = {
+    "ppm": PpmWriter,
+    "png": PngWriter,
+}
+
+DELTA_CLASSES = {
+    "dict": DictDelta,
+    "runs": RunDelta,
+}
 
 if __name__ == "__main__":
-    Program(
-        printer=AsciiCanvasPrinter(),
-        palette={c for c in " " + string.ascii_lowercase},
-        background_color=" ",
-        foreground_color="x"
-    ).run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script", nargs="?",
+                        help="File of commands to run in batch, - to read them from the standard input")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="In batch, print the canvas every N commands (by default only at the end)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="In batch, remove the dead and cancelled commands of the script before running it and "
+                             "report them to the standard error (not with --render-every)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="canvas")
+    parser.add_argument("--delta", choices=sorted(DELTA_CLASSES), default="dict",
+                        help="How the points painted by an edit are stored (the quadtree backend always uses runs)")
+    parser.add_argument("--region-index", action="store_true",
+                        help="Look up the areas of bucket fills in an index of the canvas kept up to date")
+    parser.add_argument("--printer", choices=["ascii"] + sorted(IMAGE_WRITERS), default="ascii",
+                        help="Print the canvas as text or write it as an image to the standard output (images only "
+                             "in batch)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Render large canvases in row bands, in a pool of N processes")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="Serve a session per connection over TCP rather than reading the commands here")
+    parser.add_argument("--unix", metavar="PATH", help="Serve a session per connection on a Unix socket")
+    parser.add_argument("--max-canvas-points", type=int, default=1000000,
+                        help="Largest canvas (width * height) the clients of the server can create")
+    parser.add_argument("--journal", metavar="DIRECTORY",
+                        help="Journal the commands to a directory, recovering the canvas from it first")
+    parser.add_argument("--checkpoint-every", type=int, default=1000,
+                        help="Number of journaled commands between two checkpoints of the canvas")
+    parser.add_argument("--fsync-every", type=int, default=1,
+                        help="Number of journaled commands between two flushes of the journal to the disk, "
+                             "0 to leave it to the operating system")
+    parser.add_argument("--profile", action="store_true",
+                        help="Collect the statistics of every command (S prints them, in batch they are printed at "
+                             "the end to the standard error)")
+    args = parser.parse_args()
+    if args.optimize and args.render_every:
+        parser.error("--optimize cannot be combined with --render-every")
+    if args.printer != "ascii" and args.script is None and not (args.serve or args.unix):
+        # The prompt and the errors of the interactive mode would be mixed with the images on the standard output
+        parser.error("--printer {} needs a script to run in batch".format(args.printer))
+    canvas_factory_class, painter_class = BACKENDS[args.backend]
+    palette = {c for c in " " + string.ascii_lowercase}
+
+    renderer = ParallelRenderer(args.processes) if args.processes else None
+    if args.printer == "ascii":
+        printer = AsciiCanvasPrinter(renderer=renderer)
+    else:
+        printer = ImageCanvasPrinter(IMAGE_WRITERS[args.printer](default_rgb_map(palette, " "), renderer=renderer))
+
+    def create_program(printer):
+        return Program(
+            printer=printer,
+            palette=palette,
+            background_color=" ",
+            foreground_color="x",
+            canvas_factory=canvas_factory_class(),
+            delta_class=DELTA_CLASSES[args.delta],
+            painter_class=painter_class,
+            region_index=RegionIndex() if args.region_index else None,
+            profiler=Profiler() if args.profile else None
+        )
+
+    if args.serve or args.unix:
+        async def serve():
+            server = CanvasServer(create_program, max_canvas_points=args.max_canvas_points)
+            if args.unix:
+                listener = await server.start_unix(args.unix)
+            else:
+                host, _, port = args.serve.rpartition(":")
+                listener = await server.start(host or "127.0.0.1", int(port))
+            print("Serving on {}".format(", ".join(str(s.getsockname()) for s in listener.sockets)), file=sys.stderr)
+            await listener.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    program = create_program(printer)
+    if args.journal:
+        program.state.journal = CommandJournal(args.journal, args.checkpoint_every, args.fsync_every or None)
+        replayed = program.recover()
+        print("Recovered the canvas from {} ({} commands replayed)".format(args.journal, replayed), file=sys.stderr)
+
+    if args.script is None:
+        program.run()
+    else:
+        optimizer = ScriptOptimizer() if args.optimize else None
+        if args.script == "-":
+            errors = program.run_batch(sys.stdin, args.render_every, optimizer=optimizer)
+        else:
+            with open(args.script) as script:
+                errors = program.run_batch(script, args.render_every, optimizer=optimizer)
+        if optimizer is not None:
+            print(optimizer.script.report(), file=sys.stderr)
+        if args.profile:
+            print(program.state.profiler.summary(), file=sys.stderr)
+        if renderer is not None:
+            renderer.close()
+        sys.exit(1 if errors else 0)
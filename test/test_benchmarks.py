@@ -0,0 +1,32 @@
+from benchmarks import suite
+import unittest
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def test_run_suite(self):
+        results = suite.run_suite([10], repeat=1, names=["canvas_line", "program_run_command"])
+        self.assertEqual({"canvas_line@10", "program_run_command@10"}, set(results))
+        self.assertTrue(all(seconds >= 0 for seconds in results.values()))
+
+    def test_run_suite_variants(self):
+        results = suite.run_suite([10], repeat=1, names=["canvas_construction"])
+        self.assertIn("canvas_construction[Canvas]@10", results)
+        self.assertIn("canvas_construction[ArrayCanvas]@10", results)
+
+    def test_compare(self):
+        comparison, regressions = suite.compare(
+            {"a@10": 1.0, "b@10": 2.0, "c@10": 1.0},
+            {"a@10": 0.9, "b@10": 1.0},
+            tolerance=0.5
+        )
+        self.assertEqual(["b@10"], regressions)
+        self.assertEqual(("c@10", None, 1.0, None), comparison[2])
+        self.assertAlmostEqual(2.0, comparison[1][3])
+
+    def test_compare_ignores_tiny_slowdowns(self):
+        _, regressions = suite.compare({"a@10": 0.0003}, {"a@10": 0.0001}, tolerance=0.5)
+        self.assertEqual([], regressions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
 from paint import *
+import fractions
+import random
 import time
 import unittest
 from unittest import mock
@@ -97,6 +99,22 @@ class CanvasTests(unittest.TestCase):
         line = canvas.line(x1=2, y1=height, x2=4, y2=3)
         self.assertRaises(PointOutOfCanvas, set, line)
 
+    def test_polygon_coordinates(self):
+        canvas = CanvasStub(10, 8)
+        xs, ys = canvas.polygon_coordinates((1, 1), (4, 1), (4, 3))
+        self.assertEqual(
+            {(p.x, p.y) for p in canvas.polygon((1, 1), (4, 1), (4, 3))},
+            set(zip(xs, ys))
+        )
+        self.assertRaises(PointOutOfCanvas, canvas.polygon_coordinates, (1, 1), (10, 1), (4, 3))
+
+    def test_color_at(self):
+        canvas = CanvasStub(3, 2, factory=PointColorMatrixFactory(["abc", "def"]))
+        self.assertEqual('f', canvas.color_at(2, 1))
+        self.assertEqual(["d", "e", "f"], canvas.row_colors(1))
+        self.assertRaises(PointOutOfCanvas, canvas.color_at, 3, 0)
+        self.assertRaises(PointOutOfCanvas, canvas.color_at, 0, -1)
+
     def test_vertical_line(self):
         canvas = CanvasStub(10, 8)
         expected_points = {
@@ -159,6 +177,26 @@ class CanvasTests(unittest.TestCase):
         self.assertEqual({(1, 1), (2, 1), (3, 2), (4, 2)}, set((point.x, point.y) for point in canvas.line(1, 1, 4, 2)))
         self.assertEqual({(1, 1), (2, 1), (3, 2), (4, 2)}, set((point.x, point.y) for point in canvas.line(4, 2, 1, 1)))
 
+    def test_line_coordinates(self):
+        self.assertEqual(([1, 2, 3, 4], [1, 1, 2, 2]), BaseCanvas.line_coordinates(1, 1, 4, 2))
+        self.assertEqual(([1, 1, 2, 2], [1, 2, 3, 4]), BaseCanvas.line_coordinates(1, 1, 2, 4))
+        self.assertEqual(([3, 2, 1], [1, 2, 3]), BaseCanvas.line_coordinates(3, 1, 1, 3))
+        self.assertEqual(([5], [5]), BaseCanvas.line_coordinates(5, 5, 5, 5))
+
+    def test_line_coordinates_round_ties_to_even(self):
+        # The points in the middle are exactly half way between two rows
+        self.assertEqual(([0, 1, 2, 3, 4], [0, 0, 1, 2, 2]), BaseCanvas.line_coordinates(0, 0, 4, 2))
+        self.assertEqual(([4, 3, 2, 1, 0], [2, 2, 1, 0, 0]), BaseCanvas.line_coordinates(4, 2, 0, 0))
+
+    def test_line_coordinates_match_exact_rounding(self):
+        for x1, y1, x2, y2 in [(0, 0, 37, 11), (5, 40, 0, 3), (20, 20, -13, 28), (3, 9, 11, -30)]:
+            xs, ys = BaseCanvas.line_coordinates(x1, y1, x2, y2)
+            for x, y in zip(xs, ys):
+                if abs(x2 - x1) > abs(y2 - y1):
+                    self.assertEqual(y1 + round(fractions.Fraction((x - x1) * (y2 - y1), x2 - x1)), y)
+                else:
+                    self.assertEqual(x1 + round(fractions.Fraction((y - y1) * (x2 - x1), y2 - y1)), x)
+
     def test_uniform_area_uniform_canvas(self):
         width = 10
         height = 6
@@ -228,3 +266,230 @@ class CanvasTests(unittest.TestCase):
         }
         self.assertSetEqual(expected_points, set((p.x, p.y) for p in canvas.uniform_area(3, 3)))
 
+
+
+class EditedCanvasTests(unittest.TestCase):
+    def test_depth_and_delta_size(self):
+        canvas = CanvasStub(10, 8)
+        edited1 = EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x'), (2, 1): Point(2, 1, 'x')})
+        edited2 = EditedCanvas(edited1, {(3, 3): Point(3, 3, 'o')})
+
+        self.assertEqual(1, edited1.depth)
+        self.assertEqual(2, edited2.depth)
+        self.assertEqual(3, edited2.delta_size)
+        self.assertIs(canvas, edited2.base)
+
+    def test_point_falls_back_to_original_canvas(self):
+        canvas = CanvasStub(10, 8)
+        edited = EditedCanvas(EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x')}), {(3, 3): Point(3, 3, 'o')})
+
+        self.assertEqual('x', edited.point(1, 1).color)
+        self.assertEqual('o', edited.point(3, 3).color)
+        self.assertIsNone(edited.point(5, 5).color)
+
+    def test_color_at(self):
+        point_factory = PointFactory(' ')
+        for canvas in (Canvas(6, 4, point_factory), ArrayCanvas(6, 4, {' ', 'x', 'o'}, ' ')):
+            edited = EditedCanvas(canvas, RunDelta.from_runs([(1, 0, 4), (2, 2, 2)], 'x', point_factory))
+            edited = EditedCanvas(edited, DictDelta.from_runs([(1, 2, 3)], 'o', point_factory))
+            edited = EditedCanvas(edited, {})
+
+            for y in range(4):
+                for x in range(6):
+                    self.assertEqual(edited.point(x, y).color, edited.color_at(x, y))
+            self.assertEqual(['x', 'x', 'o', 'o', 'x', ' '], [edited.color_at(x, 1) for x in range(6)])
+            self.assertRaises(PointOutOfCanvas, edited.color_at, 6, 3)
+
+    def test_bounds(self):
+        canvas = CanvasStub(10, 8)
+        edited1 = EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x'), (4, 2): Point(4, 2, 'x')})
+        edited2 = EditedCanvas(edited1, {})
+        edited3 = EditedCanvas(edited2, {(3, 6): Point(3, 6, 'o')})
+
+        self.assertEqual((1, 1, 4, 2), edited1.bounds)
+        self.assertIsNone(edited2.bounds)
+        self.assertEqual((1, 1, 4, 2), edited2.chain_bounds)
+        self.assertEqual((3, 6, 3, 6), edited3.bounds)
+        self.assertEqual((1, 1, 4, 6), edited3.chain_bounds)
+
+    def test_point_skips_edits_out_of_bounds(self):
+        class LookupCountingDelta(dict):
+            lookups = 0
+
+            def __contains__(self, key):
+                LookupCountingDelta.lookups += 1
+                return super().__contains__(key)
+
+        canvas = CanvasStub(10, 8)
+        edited = EditedCanvas(canvas, LookupCountingDelta({(1, 1): Point(1, 1, 'x')}))
+        edited = EditedCanvas(edited, LookupCountingDelta({(6, 6): Point(6, 6, 'o')}))
+
+        self.assertEqual('o', edited.point(6, 6).color)
+        self.assertEqual('x', edited.point(1, 1).color)
+        self.assertEqual(2, LookupCountingDelta.lookups)
+        # Out of the bounds of the chain
+        self.assertIsNone(edited.point(9, 0).color)
+        # Within the bounds of the chain, but not of its edits
+        self.assertIsNone(edited.point(3, 3).color)
+        self.assertEqual(2, LookupCountingDelta.lookups)
+
+
+class CompactionPolicyTests(unittest.TestCase):
+    def test_should_compact_by_depth(self):
+        policy = CompactionPolicy(max_depth=2)
+        canvas = CanvasStub(10, 8)
+        edited1 = EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x')})
+        edited2 = EditedCanvas(edited1, {(2, 2): Point(2, 2, 'x')})
+
+        self.assertFalse(policy.should_compact(canvas))
+        self.assertFalse(policy.should_compact(edited1))
+        self.assertTrue(policy.should_compact(edited2))
+
+    def test_should_compact_by_delta_size(self):
+        policy = CompactionPolicy(max_depth=None, max_delta_size=3)
+        canvas = CanvasStub(10, 8)
+        edited1 = EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x'), (2, 1): Point(2, 1, 'x')})
+        edited2 = EditedCanvas(edited1, {(2, 2): Point(2, 2, 'x')})
+
+        self.assertFalse(policy.should_compact(edited1))
+        self.assertTrue(policy.should_compact(edited2))
+
+    def test_compact(self):
+        canvas = CanvasStub(10, 8)
+        edited = EditedCanvas(EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x')}), {(1, 1): Point(1, 1, 'o')})
+
+        compacted = CompactionPolicy().compact(edited)
+
+        self.assertIsInstance(compacted, Canvas)
+        self.assertEqual((10, 8), (compacted.width, compacted.height))
+        for x in range(10):
+            for y in range(8):
+                self.assertEqual(edited.point(x, y), compacted.point(x, y))
+
+
+class ArrayCanvasTests(unittest.TestCase):
+    def test_constructor_with_invalid_size_throws_exception(self):
+        self.assertRaises(AssertionError, ArrayCanvas, 0, 2, {' '}, ' ')
+        self.assertRaises(AssertionError, ArrayCanvas, 2, -1, {' '}, ' ')
+
+    def test_constructor_with_background_color_outside_palette_throws_exception(self):
+        self.assertRaises(AssertionError, ArrayCanvas, 2, 2, {' ', 'x'}, 'o')
+
+    def test_point(self):
+        canvas = ArrayCanvas(10, 8, {' ', 'x'}, ' ')
+        self.assertEqual(Point(3, 4, ' '), canvas.point(3, 4))
+        self.assertEqual(Point(9, 7, ' '), canvas.point(9, 7))
+        self.assertRaises(PointOutOfCanvas, canvas.point, 10, 0)
+        self.assertRaises(PointOutOfCanvas, canvas.point, 0, -1)
+
+    def test_snapshot(self):
+        canvas = ArrayCanvas(4, 3, {' ', 'x', 'o'}, ' ')
+        edited = EditedCanvas(EditedCanvas(canvas, {(1, 1): Point(1, 1, 'x')}), {(3, 2): Point(3, 2, 'o')})
+
+        snapshot = canvas.snapshot(edited)
+
+        self.assertIsInstance(snapshot, ArrayCanvas)
+        self.assertEqual('x', snapshot.point(1, 1).color)
+        self.assertEqual('o', snapshot.point(3, 2).color)
+        self.assertEqual(' ', snapshot.point(0, 0).color)
+        self.assertEqual(' ', canvas.point(1, 1).color)
+
+
+class UniformAreaRunsTests(unittest.TestCase):
+    @staticmethod
+    def _reference_area(canvas, x, y):
+        color = canvas.point(x, y).color
+        area = set()
+        stack = [(x, y)]
+        while stack:
+            x1, y1 = stack.pop()
+            if (x1, y1) in area or not canvas.exists(x1, y1) or canvas.point(x1, y1).color != color:
+                continue
+            area.add((x1, y1))
+            stack.extend([(x1 - 1, y1), (x1 + 1, y1), (x1, y1 - 1), (x1, y1 + 1)])
+        return area
+
+    @staticmethod
+    def _random_canvas(width, height, seed):
+        colors = random.Random(seed)
+        delta = {(x, y): Point(x, y, 'x') for x in range(width) for y in range(height) if colors.random() < 0.4}
+        return ArrayCanvas(width, height, {' ', 'x'}, ' ').snapshot(
+            EditedCanvas(ArrayCanvas(width, height, {' ', 'x'}, ' '), delta)
+        )
+
+    def test_runs_match_connected_area(self):
+        for seed in range(20):
+            canvas = self._random_canvas(15, 10, seed)
+            edited = EditedCanvas(canvas, {})
+            for x, y in [(0, 0), (7, 5), (14, 9)]:
+                expected = self._reference_area(canvas, x, y)
+                for c in (canvas, edited):
+                    runs = list(c.uniform_area_runs(x, y))
+                    area = [(x1, y1) for y1, x2, x3 in runs for x1 in range(x2, x3 + 1)]
+                    self.assertEqual(len(expected), len(area))
+                    self.assertSetEqual(expected, set(area))
+                    self.assertSetEqual(expected, set((p.x, p.y) for p in c.uniform_area(x, y)))
+
+    def test_runs_match_connected_area_of_point_canvases_and_edits(self):
+        for seed in range(20):
+            canvas = self._random_canvas(15, 10, seed)
+            # Only the rows 3 to 5 are edited: the others are split in runs by the base canvas
+            delta = {(x, y): Point(x, y, ' ') for x in range(2, 12) for y in range(3, 6)}
+            for c in (Canvas(15, 10, SnapshotPointFactory(canvas)), EditedCanvas(canvas, delta)):
+                for x, y in [(0, 0), (7, 5), (14, 9), (3, 8)]:
+                    area = [(x1, y1) for y1, x2, x3 in c.uniform_area_runs(x, y) for x1 in range(x2, x3 + 1)]
+                    self.assertEqual(sorted(self._reference_area(c, x, y)), sorted(area))
+
+    def test_runs_on_uniform_canvas(self):
+        canvas = ArrayCanvas(2000, 2000, {' ', 'x'}, ' ')
+        runs = list(canvas.uniform_area_runs(1000, 1000))
+        self.assertEqual(2000, len(runs))
+        self.assertSetEqual({(0, 1999)}, set((x1, x2) for _, x1, x2 in runs))
+
+
+class FilledShapesTests(unittest.TestCase):
+    @staticmethod
+    def _points(runs):
+        points = [(x, y) for y, x1, x2 in runs for x in range(x1, x2 + 1)]
+        return set(points), len(points)
+
+    def test_filled_rectangle(self):
+        canvas = CanvasStub(10, 8)
+        self.assertEqual([(2, 1, 4), (3, 1, 4)], list(canvas.filled_rectangle(4, 3, 1, 2)))
+
+    def test_filled_rectangle_out_of_canvas(self):
+        canvas = CanvasStub(10, 8)
+        self.assertRaises(PointOutOfCanvas, list, canvas.filled_rectangle(4, 3, 10, 2))
+
+    def test_filled_triangle_is_outline_and_inside(self):
+        canvas = ArrayCanvas(30, 20, {' ', 'x', 'o'}, ' ')
+        painter = Painter(PointFactory(' '))
+        # The outline of the first triangle encloses (2, 18), which a bucket fill from the centroid can't reach
+        pockets = [{(2, 18)}, set(), set()]
+        triangles = [(15, 0, 0, 19, 29, 12), (0, 0, 29, 0, 3, 19), (2, 2, 27, 5, 14, 17)]
+        for triangle, pocket in zip(triangles, pockets):
+            outline = painter.draw_polygon(canvas, 'x', triangle[0:2], triangle[2:4], triangle[4:6])
+            centroid = (sum(triangle[0::2]) // 3, sum(triangle[1::2]) // 3)
+            filled = painter.bucket_fill(outline, centroid[0], centroid[1], 'x')
+            expected = {(x, y) for x in range(30) for y in range(20) if filled.point(x, y).color == 'x'}
+
+            points, count = self._points(canvas.filled_triangle(*triangle))
+            self.assertEqual(len(points), count)
+            self.assertSetEqual(expected | pocket, points)
+
+    def test_filled_polygon_even_odd(self):
+        canvas = CanvasStub(10, 10)
+        # Bow tie: the two triangles meet in the middle
+        points, count = self._points(canvas.filled_polygon((0, 0), (8, 8), (8, 0), (0, 8)))
+        self.assertEqual(len(points), count)
+        self.assertIn((1, 4), points)
+        self.assertIn((4, 4), points)
+        self.assertNotIn((4, 1), points)
+        self.assertNotIn((4, 7), points)
+
+    def test_filled_polygon_concave(self):
+        canvas = CanvasStub(10, 10)
+        points, _ = self._points(canvas.filled_polygon((0, 0), (9, 0), (4, 4), (9, 9), (0, 9)))
+        self.assertIn((2, 4), points)
+        self.assertNotIn((8, 4), points)
+        self.assertSetEqual({(x, 0) for x in range(10)}, {(x, y) for x, y in points if y == 0})
@@ -0,0 +1,76 @@
+from paint import *
+import unittest
+
+
+class DictDeltaTests(unittest.TestCase):
+    def test_from_points(self):
+        delta = DictDelta.from_points([Point(1, 2, ' '), Point(2, 2, ' ')], 'x', PointFactory(' '))
+        self.assertEqual({(1, 2): Point(1, 2, 'x'), (2, 2): Point(2, 2, 'x')}, delta)
+
+    def test_from_runs(self):
+        delta = DictDelta.from_runs([(2, 1, 2), (3, 0, 0)], 'x', PointFactory(' '))
+        self.assertEqual({(1, 2): Point(1, 2, 'x'), (2, 2): Point(2, 2, 'x'), (0, 3): Point(0, 3, 'x')}, delta)
+
+    def test_bounds(self):
+        self.assertEqual((0, 2, 2, 3), DictDelta.from_runs([(2, 1, 2), (3, 0, 0)], 'x', PointFactory(' ')).bounds())
+        self.assertIsNone(DictDelta().bounds())
+
+    def test_paint_row(self):
+        delta = DictDelta.from_runs([(2, 1, 2), (3, 0, 0)], 'x', PointFactory(' '))
+        colors = [' '] * 4
+        delta.paint_row(2, colors)
+        delta.paint_row(1, colors)
+        self.assertEqual([' ', 'x', 'x', ' '], colors)
+
+
+class RunDeltaTests(unittest.TestCase):
+    def test_from_points_merges_adjacent_points(self):
+        points = [Point(x, 1, ' ') for x in (5, 1, 2, 3, 7, 6)] + [Point(4, 0, ' ')]
+        delta = RunDelta.from_points(points, 'x', PointFactory(' '))
+
+        self.assertEqual([(0, 4, 4), (1, 1, 3), (1, 5, 7)], list(delta.runs()))
+        self.assertEqual(7, len(delta))
+
+    def test_add_run_merges_overlapping_runs(self):
+        delta = RunDelta('x', PointFactory(' '))
+        delta.add_run(0, 1, 2)
+        delta.add_run(0, 6, 8)
+        delta.add_run(0, 10, 12)
+        delta.add_run(0, 3, 6)
+
+        self.assertEqual([(0, 1, 8), (0, 10, 12)], list(delta.runs()))
+        self.assertEqual(11, len(delta))
+
+    def test_lookup(self):
+        delta = RunDelta.from_runs([(1, 2, 4), (1, 8, 9)], 'x', PointFactory(' '))
+
+        self.assertIn((2, 1), delta)
+        self.assertIn((4, 1), delta)
+        self.assertIn((9, 1), delta)
+        self.assertNotIn((1, 1), delta)
+        self.assertNotIn((5, 1), delta)
+        self.assertNotIn((3, 0), delta)
+        self.assertEqual(Point(3, 1, 'x'), delta[(3, 1)])
+        self.assertRaises(KeyError, lambda: delta[(5, 1)])
+
+    def test_contains_run(self):
+        delta = RunDelta.from_runs([(1, 2, 4), (1, 5, 6), (1, 8, 9)], 'x', PointFactory(' '))
+
+        self.assertTrue(delta.contains_run(1, 2, 6))
+        self.assertTrue(delta.contains_run(1, 8, 8))
+        self.assertFalse(delta.contains_run(1, 4, 8))
+        self.assertFalse(delta.contains_run(1, 1, 3))
+        self.assertFalse(delta.contains_run(0, 2, 2))
+
+    def test_equivalent_to_dict_delta(self):
+        runs = [(0, 0, 3), (2, 1, 1), (2, 3, 5)]
+        run_delta = RunDelta.from_runs(runs, 'x', PointFactory(' '))
+        dict_delta = DictDelta.from_runs(runs, 'x', PointFactory(' '))
+
+        self.assertEqual(dict_delta, dict(run_delta.items()))
+        self.assertEqual(dict_delta.bounds(), run_delta.bounds())
+        self.assertIsNone(RunDelta('x', PointFactory(' ')).bounds())
+
+
+if __name__ == "__main__":
+    unittest.main()
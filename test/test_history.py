@@ -0,0 +1,170 @@
+from paint import *
+import unittest
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '))
+        self.canvas = ArrayCanvas(8, 4, {' ', 'x'}, ' ')
+
+    def _draw(self, history, n):
+        for i in range(n):
+            history.push(self.painter.draw_line(history.canvas, i, 0, i, 3, 'x'))
+
+    def _colors(self, canvas):
+        return ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+
+    def test_undo_redo(self):
+        history = History()
+        self.assertIsNone(history.canvas)
+        self.assertFalse(history.undo())
+
+        history.push(self.canvas)
+        self._draw(history, 2)
+        edited = history.canvas
+
+        self.assertTrue(history.undo())
+        self.assertTrue(history.undo())
+        self.assertIs(self.canvas, history.canvas)
+        self.assertTrue(history.redo())
+        self.assertTrue(history.redo())
+        self.assertIs(edited, history.canvas)
+        self.assertFalse(history.redo())
+
+    def test_push_drops_redo_steps(self):
+        history = History()
+        history.push(self.canvas)
+        self._draw(history, 3)
+        history.undo()
+        history.undo()
+
+        self._draw(history, 1)
+
+        self.assertEqual(0, history.redo_steps)
+        self.assertEqual(3, history.undo_steps)
+
+    def test_reset(self):
+        history = History()
+        history.push(self.canvas)
+        self._draw(history, 2)
+        history.undo()
+
+        history.reset(self.canvas)
+        self.assertIs(self.canvas, history.canvas)
+        self.assertEqual((0, 0), (history.undo_steps, history.redo_steps))
+        self.assertFalse(history.undo())
+        self.assertEqual(self.canvas.memory_size(), history.memory_usage)
+
+    def test_max_steps(self):
+        history = History(max_steps=3)
+        history.push(self.canvas)
+        self._draw(history, 6)
+        expected_colors = self._colors(history.canvas)
+
+        self.assertEqual(3, history.undo_steps)
+        while history.undo():
+            pass
+        self.assertEqual(["xxx     "] * 4, self._colors(history.canvas))
+
+        while history.redo():
+            pass
+        self.assertEqual(expected_colors, self._colors(history.canvas))
+
+    def test_eviction_rebases_the_remaining_canvases(self):
+        history = History(max_steps=2)
+        history.push(self.canvas)
+        self._draw(history, 4)
+        current = history.canvas
+
+        self.assertIsInstance(current, EditedCanvas)
+        self.assertEqual(2, current.depth)
+        self.assertIsNot(self.canvas, current.base)
+        history.undo()
+        history.undo()
+        self.assertIs(current.base, history.canvas)
+
+    def test_eviction_in_batches(self):
+        history = History(max_steps=8)
+        history.push(self.canvas)
+        self._draw(history, 7)
+        self.assertEqual(8, history.undo_steps)
+
+        self._draw(history, 1)
+        self.assertEqual(6, history.undo_steps)
+        base = history.canvas.base
+        self._draw(history, 2)
+        self.assertEqual(8, history.undo_steps)
+        self.assertIs(base, history.canvas.base)
+
+        # Same memory usage as if the remaining canvases had been pushed on their own
+        rebuilt = History(max_steps=None)
+        rebuilt.reset(history.canvases()[0])
+        for canvas in history.canvases()[1:]:
+            rebuilt.push(canvas)
+        self.assertEqual(rebuilt.memory_usage, history.memory_usage)
+
+    def test_rebased_canvases_keep_their_version(self):
+        history = History(max_steps=2)
+        history.push(self.canvas)
+        self._draw(history, 2)
+        version = history.canvas.version
+
+        self._draw(history, 1)
+        history.undo()
+
+        self.assertEqual(version, history.canvas.version)
+
+    def test_max_bytes(self):
+        history = History(max_steps=None, max_bytes=1)
+        history.push(self.canvas)
+        self._draw(history, 3)
+
+        self.assertEqual(0, history.undo_steps)
+        self.assertEqual(["xxx     "] * 4, self._colors(history.canvas))
+
+    def test_memory_usage(self):
+        history = History()
+        self.assertEqual(0, history.memory_usage)
+
+        history.push(self.canvas)
+        self.assertEqual(self.canvas.memory_size(), history.memory_usage)
+
+        self._draw(history, 1)
+        self.assertEqual(self.canvas.memory_size() + history.canvas.memory_size(), history.memory_usage)
+
+    def test_dropped_canvases_are_closed(self):
+        canvases = [ClosingCanvasStub(8, 4, {' ', 'x'}, ' ') for _ in range(3)]
+
+        history = History(max_steps=2)
+        history.push(canvases[0])
+        self._draw(history, 2)
+        self.assertFalse(canvases[0].closed)
+        # Evicted: the remaining canvases are rebased on a copy
+        self._draw(history, 1)
+        self.assertTrue(canvases[0].closed)
+
+        history.push(canvases[1])
+        self._draw(history, 1)
+        history.undo()
+        history.undo()
+        # Dropped with the steps which could be redone
+        history.push(canvases[2])
+        self.assertTrue(canvases[1].closed)
+        self.assertFalse(canvases[2].closed)
+
+        history.reset(canvases[2])
+        self.assertFalse(canvases[2].closed)
+        history.reset(self.canvas)
+        self.assertTrue(canvases[2].closed)
+
+
+class ClosingCanvasStub(ArrayCanvas):
+    closed = False
+
+    def close(self):
+        assert not self.closed, "Closed twice"
+        self.closed = True
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+from paint import *
+import io
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+
+class ImageTests(unittest.TestCase):
+    RGB_MAP = {' ': (255, 255, 255), 'x': (0, 0, 0), 'o': (255, 0, 0)}
+
+    def setUp(self):
+        painter = Painter(PointFactory(' '))
+        self.canvas = painter.draw_line(ArrayCanvas(3, 2, {' ', 'x', 'o'}, ' '), 0, 0, 1, 0, 'x')
+        self.canvas = painter.draw_line(self.canvas, 2, 1, 2, 1, 'o')
+
+    def _read_png(self, data):
+        self.assertEqual(PngWriter.SIGNATURE, data[:8])
+        chunks = []
+        position = 8
+        while position < len(data):
+            length, = struct.unpack(">I", data[position:position + 4])
+            chunk_type = data[position + 4:position + 8]
+            chunk_data = data[position + 8:position + 8 + length]
+            crc, = struct.unpack(">I", data[position + 8 + length:position + 12 + length])
+            self.assertEqual(zlib.crc32(chunk_type + chunk_data), crc)
+            chunks.append((chunk_type, chunk_data))
+            position += 12 + length
+        return chunks
+
+    def test_default_rgb_map(self):
+        rgb_map = default_rgb_map({' ', 'x', 'o'}, ' ')
+        self.assertEqual({' ', 'x', 'o'}, set(rgb_map))
+        self.assertEqual((255, 255, 255), rgb_map[' '])
+        self.assertEqual(3, len(set(rgb_map.values())))
+
+    def test_ppm(self):
+        stream = io.BytesIO()
+        PpmWriter(self.RGB_MAP).write(self.canvas, stream)
+        self.assertEqual(
+            b"P6\n3 2\n255\n" +
+            bytes([0, 0, 0, 0, 0, 0, 255, 255, 255]) +
+            bytes([255, 255, 255, 255, 255, 255, 255, 0, 0]),
+            stream.getvalue()
+        )
+
+    def test_png(self):
+        stream = io.BytesIO()
+        PngWriter(self.RGB_MAP).write(self.canvas, stream)
+        chunks = self._read_png(stream.getvalue())
+
+        self.assertEqual([b"IHDR", b"PLTE", b"IDAT", b"IEND"], [chunk_type for chunk_type, _ in chunks])
+        self.assertEqual(struct.pack(">IIBBBBB", 3, 2, 8, 3, 0, 0, 0), chunks[0][1])
+        # Palette sorted by color: ' ', 'o', 'x'
+        self.assertEqual(bytes([255, 255, 255, 255, 0, 0, 0, 0, 0]), chunks[1][1])
+        self.assertEqual(bytes([0, 2, 2, 0, 0, 0, 0, 1]), zlib.decompress(chunks[2][1]))
+
+    def test_png_split_in_chunks(self):
+        class SmallChunksPngWriter(PngWriter):
+            CHUNK_SIZE = 16
+
+        canvas = Painter(PointFactory(' ')).draw_line(Canvas(200, 200, PointFactory(' ')), 0, 0, 199, 199, 'x')
+        stream = io.BytesIO()
+        SmallChunksPngWriter(self.RGB_MAP, compression_level=0).write(canvas, stream)
+        chunks = self._read_png(stream.getvalue())
+
+        data = [chunk_data for chunk_type, chunk_data in chunks if chunk_type == b"IDAT"]
+        self.assertGreater(len(data), 1)
+        pixels = zlib.decompress(b"".join(data))
+        self.assertEqual(200 * 201, len(pixels))
+        self.assertEqual(bytes([0, 0, 2, 0, 0]), pixels[201:206])
+
+    def test_missing_color(self):
+        self.assertRaises(ValueError, PpmWriter({' ': (255, 255, 255)}).write, self.canvas, io.BytesIO())
+
+    def test_export_canvas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            export_canvas(self.canvas, os.path.join(directory, "canvas.PPM"), self.RGB_MAP)
+            with open(os.path.join(directory, "canvas.PPM"), "rb") as image:
+                self.assertTrue(image.read().startswith(b"P6\n3 2\n255\n"))
+            self.assertRaises(ValueError, export_canvas, self.canvas, os.path.join(directory, "c.gif"), self.RGB_MAP)
+
+    def test_export_over_a_loaded_canvas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "canvas.png")
+            printer = AsciiCanvasPrinter()
+            program = Program(printer=printer, palette={' ', 'x'}, foreground_color='x', background_color=' ')
+            program.execute_command("C", 5, 3)
+            program.execute_command("L", 1, 1, 3, 3)
+            program.execute_command("SAVE", path)
+            program.execute_command("LOAD", path)
+            # The loaded canvas is mapped from the file being exported to
+            program.execute_command("EXPORT", path)
+            self.assertEqual(["x    ", " x   ", "  x  "], printer.canvas_to_list(program.state.canvas))
+            with open(path, "rb") as image:
+                self.assertTrue(image.read().startswith(b"\x89PNG"))
+
+    def test_image_printer(self):
+        stream = io.BytesIO()
+        ImageCanvasPrinter(PngWriter(self.RGB_MAP), stream).print_canvas(self.canvas)
+        self.assertEqual(b"IEND", self._read_png(stream.getvalue())[-1][0])
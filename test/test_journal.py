@@ -0,0 +1,117 @@
+from paint import *
+import os
+import tempfile
+import unittest
+
+
+class CommandJournalTests(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _program(self, journal):
+        return Program(printer=AsciiCanvasPrinter(), palette={' ', 'x', 'o'}, foreground_color='x',
+                       background_color=' ', journal=journal)
+
+    def _rows(self, program):
+        return ["".join(program.state.canvas.row_colors(y)) for y in range(program.state.canvas.height)]
+
+    def _recovered(self, directory=None):
+        program = self._program(CommandJournal(directory or self.directory))
+        program.recover()
+        return program
+
+    def _run(self, program, *lines):
+        for line in lines:
+            program.execute_command(*line.split())
+
+    def test_recover(self):
+        program = self._program(CommandJournal(self.directory, checkpoint_every=4))
+        self.assertEqual(0, program.recover())
+        self._run(program, "C 5 3", "L 1 1 5 1", "P", "L 1 3 5 3", "B 1 2 o", "Z", "L 2 1 2 3")
+        self.assertEqual(["xxxxx", " x   ", "xxxxx"], self._rows(program))
+
+        recovered = self._program(CommandJournal(self.directory))
+        # B 1 2 o triggered a checkpoint, and so did Z as it went back to a canvas before it
+        self.assertEqual(1, recovered.recover())
+        self.assertIsInstance(recovered.state.canvas.base, MappedCanvas)
+        self.assertEqual(["xxxxx", " x   ", "xxxxx"], self._rows(recovered))
+
+        # The recovered state was checkpointed
+        recovered = self._program(CommandJournal(self.directory))
+        self.assertEqual(0, recovered.recover())
+        self.assertIsInstance(recovered.state.canvas, MappedCanvas)
+        self.assertEqual(["xxxxx", " x   ", "xxxxx"], self._rows(recovered))
+        # Steps before the checkpoint cannot be undone
+        self._run(recovered, "Z")
+        self.assertEqual(["xxxxx", " x   ", "xxxxx"], self._rows(recovered))
+
+    def test_only_the_latest_checkpoint_is_kept(self):
+        program = self._program(CommandJournal(self.directory, checkpoint_every=2))
+        program.recover()
+        self._run(program, "C 5 3", "L 1 1 5 1", "L 1 2 5 2", "L 1 3 5 3", "P")
+        self.assertEqual(["checkpoint-00000003.pntc", "journal-00000003.log"], sorted(os.listdir(self.directory)))
+
+    def test_undo_before_the_checkpoint(self):
+        program = self._program(CommandJournal(self.directory, checkpoint_every=100))
+        program.recover()
+        self._run(program, "C 5 1", "L 1 1 2 1")
+        program.state.journal.checkpoint(program.state)
+        self._run(program, "L 4 1 4 1", "Z", "Z", "Y")
+        expected = self._rows(program)
+        self.assertEqual(expected, self._rows(self._recovered()))
+
+        # Undoing the canvas itself
+        self._run(program, "Z", "Z")
+        recovered = self._recovered()
+        self.assertIsNone(recovered.state.canvas)
+
+    def test_load(self):
+        path = os.path.join(self.directory, "canvas.pntc")
+        program = self._program(CommandJournal(os.path.join(self.directory, "journal")))
+        program.recover()
+        self._run(program, "C 3 1", "L 1 1 1 1", "SAVE " + path, "LOAD " + path, "L 3 1 3 1")
+        os.unlink(path)
+        self.assertEqual(["x x"], self._rows(self._recovered(os.path.join(self.directory, "journal"))))
+
+    def test_cut_line_is_ignored(self):
+        program = self._program(CommandJournal(self.directory, checkpoint_every=100))
+        program.recover()
+        self._run(program, "C 3 1", "L 1 1 1 1")
+        program.state.journal.close()
+        with open(program.state.journal.journal_path(1), "a") as journal:
+            journal.write("L 3 1 3")
+
+        recovered = self._program(CommandJournal(self.directory))
+        self.assertEqual(2, recovered.recover())
+        self.assertEqual(["x  "], self._rows(recovered))
+
+    def test_arguments_are_quoted(self):
+        program = Program(printer=AsciiCanvasPrinter(), palette={' ', 'x', "'", '\n'}, foreground_color='x',
+                          background_color=' ', journal=CommandJournal(self.directory, checkpoint_every=100))
+        program.recover()
+        self._run(program, "C 4 1", "L 1 1 1 1", "L 3 1 3 1")
+        program.execute_command("B", 2, 1, "'")
+        program.execute_command("B", 4, 1, "'")
+        program.execute_command("B", 1, 1, " ")
+        self.assertEqual(6, program.state.journal.entries)
+        # An argument spanning lines cannot be journaled: the canvas is checkpointed instead
+        program.execute_command("B", 3, 1, "\n")
+        self.assertEqual(0, program.state.journal.entries)
+        program.execute_command("B", 2, 1, " ")
+
+        recovered = Program(printer=AsciiCanvasPrinter(), palette={' ', 'x', "'", '\n'}, foreground_color='x',
+                            background_color=' ', journal=CommandJournal(self.directory))
+        self.assertEqual(1, recovered.recover())
+        self.assertEqual(["  \n'"], self._rows(recovered))
+
+    def test_invalid_journal(self):
+        program = self._program(CommandJournal(self.directory))
+        program.recover()
+        self._run(program, "C 3 1")
+        with open(program.state.journal.journal_path(1), "a") as journal:
+            journal.write("L 9 1 9 1\n")
+        self.assertRaises(JournalError, self._program(CommandJournal(self.directory)).recover)
@@ -0,0 +1,121 @@
+from paint import *
+from paint import numpy_canvas
+import random
+import unittest
+from unittest import mock
+
+
+@unittest.skipUnless(numpy_canvas.numpy, "NumPy is not installed")
+class NumpyCanvasTests(unittest.TestCase):
+    palette = {' ', 'x', 'o'}
+
+    def test_point(self):
+        canvas = NumpyCanvas(10, 8, self.palette, ' ')
+        self.assertEqual(Point(3, 4, ' '), canvas.point(3, 4))
+        self.assertEqual([' '] * 10, canvas.row_colors(7))
+        self.assertRaises(PointOutOfCanvas, canvas.point, 10, 0)
+        self.assertRaises(PointOutOfCanvas, canvas.point, 0, -1)
+        self.assertEqual(' ', canvas.color_at(9, 7))
+        self.assertRaises(PointOutOfCanvas, canvas.color_at, 0, 8)
+
+    def test_line_coordinates_match_base_canvas(self):
+        canvas = ArrayCanvas(30, 30, self.palette, ' ')
+        lines = [(0, 0, 29, 29), (3, 1, 1, 3), (1, 1, 2, 4), (4, 2, 1, 1), (5, 5, 5, 5), (2, 9, 2, 0), (0, 7, 29, 7)]
+        lines += [tuple(random.Random(seed).randrange(30) for _ in range(4)) for seed in range(50)]
+        for line in lines:
+            xs, ys = numpy_canvas.line_coordinates(*line)
+            self.assertEqual(
+                set((p.x, p.y) for p in canvas.line(*line)),
+                set(zip(xs.tolist(), ys.tolist())),
+                line
+            )
+
+    def test_area_mask_matches_uniform_area(self):
+        for seed in range(10):
+            colors = random.Random(seed)
+            delta = {(x, y): Point(x, y, 'x') for x in range(20) for y in range(12) if colors.random() < 0.45}
+            canvas = NumpyCanvas(20, 12, self.palette, ' ')
+            canvas = canvas.snapshot(EditedCanvas(canvas, delta))
+            reference = ArrayCanvas(20, 12, self.palette, ' ')
+            reference = reference.snapshot(EditedCanvas(reference, delta))
+
+            for x, y in [(0, 0), (10, 6), (19, 11)]:
+                self.assertSetEqual(
+                    set(reference.uniform_area_runs(x, y)),
+                    set(canvas.uniform_area_runs(x, y))
+                )
+
+    def test_area_mask_of_a_serpentine(self):
+        # Rows of 'x' joined alternately at their right and left ends
+        delta = {(x, y): Point(x, y, 'x') for y in range(1, 40, 2) for x in range(30) if x != (29 if y % 4 == 1 else 0)}
+        canvas = NumpyCanvas(30, 40, self.palette, ' ')
+        canvas = canvas.snapshot(EditedCanvas(canvas, delta))
+        reference = ArrayCanvas(30, 40, self.palette, ' ')
+        reference = reference.snapshot(EditedCanvas(reference, delta))
+
+        for ndimage in {None, numpy_canvas.ndimage}:
+            with mock.patch.object(numpy_canvas, "ndimage", ndimage):
+                for x, y in [(0, 0), (5, 1), (29, 39)]:
+                    self.assertSetEqual(
+                        set(reference.uniform_area_runs(x, y)),
+                        set(canvas.uniform_area_runs(x, y))
+                    )
+        self.assertEqual(30 * 40 - len(delta), int(canvas.area_mask(0, 0).sum()))
+
+    def test_mask_delta(self):
+        mask = numpy_canvas.numpy.zeros((4, 12), dtype=bool)
+        mask[1, 2:11] = True
+        mask[3, 9] = True
+        delta = MaskDelta.from_mask(mask, 'x', PointFactory(' '))
+
+        self.assertEqual((2, 1), (delta.x0, delta.y0))
+        self.assertEqual(10, len(delta))
+        self.assertIn((10, 1), delta)
+        self.assertIn((9, 3), delta)
+        self.assertNotIn((1, 1), delta)
+        self.assertNotIn((2, 2), delta)
+        self.assertEqual(Point(3, 1, 'x'), delta[(3, 1)])
+        self.assertEqual({1, 3}, delta.rows())
+        self.assertEqual([(1, 2, 10), (3, 9, 9)], list(delta.runs()))
+
+    def test_painter_matches_painter_on_array_canvas(self):
+        painter = NumpyPainter(PointFactory(' '))
+        reference_painter = Painter(PointFactory(' '))
+        canvas = NumpyCanvas(20, 10, self.palette, ' ')
+        reference = ArrayCanvas(20, 10, self.palette, ' ')
+        operations = [
+            ("draw_line", (0, 0, 19, 9, 'x')),
+            ("draw_rectangle", (2, 1, 15, 8, 'x')),
+            ("draw_polygon", ('o', (10, 0), (3, 9), (18, 9))),
+            ("bucket_fill", (5, 5, 'o')),
+            ("bucket_fill", (0, 9, 'x')),
+            ("fill_rectangle", (12, 7, 3, 2, ' ')),
+            ("fill_polygon", ('o', (0, 0), (19, 9), (19, 0), (0, 9))),
+        ]
+        printer = AsciiCanvasPrinter()
+        reference_printer = AsciiCanvasPrinter()
+        for name, args in operations:
+            canvas = getattr(painter, name)(canvas, *args)
+            reference = getattr(reference_painter, name)(reference, *args)
+            self.assertEqual(reference_printer.canvas_to_str(reference), printer.canvas_to_str(canvas))
+
+    def test_painter_out_of_canvas(self):
+        painter = NumpyPainter(PointFactory(' '))
+        canvas = NumpyCanvas(5, 5, self.palette, ' ')
+        self.assertRaises(PointOutOfCanvas, painter.draw_line, canvas, 0, 0, 5, 0, 'x')
+
+
+class NumpyCanvasFactoryTests(unittest.TestCase):
+    def test_create_canvas(self):
+        canvas = NumpyCanvasFactory().create_canvas(3, 2, {' '}, ' ')
+        self.assertIsInstance(canvas, NumpyCanvas if numpy_canvas.numpy else Canvas)
+        self.assertEqual(' ', canvas.point(2, 1).color)
+
+    def test_create_canvas_without_numpy(self):
+        with mock.patch.object(numpy_canvas, "numpy", None):
+            canvas = NumpyCanvasFactory().create_canvas(3, 2, {' '}, ' ')
+        self.assertIsInstance(canvas, Canvas)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+from paint import *
+import io
+import os
+import random
+import tempfile
+import unittest
+
+
+class ScriptOptimizerTests(unittest.TestCase):
+    class CanvasPrinterStub(AsciiCanvasPrinter):
+        def __init__(self):
+            super().__init__()
+            self.printed_canvases = []
+
+        def print_canvas(self, canvas):
+            self.printed_canvases.append(self.canvas_to_list(canvas))
+
+    def _program(self, **kwargs):
+        printer = ScriptOptimizerTests.CanvasPrinterStub()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          **kwargs)
+        return program, printer
+
+    def _optimize(self, lines, program=None):
+        program = self._program()[0] if program is None else program
+        return ScriptOptimizer().optimize(program, Program.parse_script(lines))
+
+    def _assert_same_output(self, lines, max_steps=1000):
+        """
+        Runs the script with and without optimizing it, and checks the printed canvases and the errors are the same
+        """
+        outputs = []
+        for optimizer in (None, ScriptOptimizer()):
+            program, printer = self._program(history=History(max_steps=max_steps))
+            errors = program.run_batch(lines, error_stream=io.StringIO(), optimizer=optimizer)
+            outputs.append((printer.printed_canvases, errors))
+        self.assertEqual(outputs[0], outputs[1])
+        return optimizer.script
+
+    def _kept_lines(self, script):
+        return [" ".join(args) for _, args in script.commands]
+
+    def test_commands_before_a_new_canvas_are_dead(self):
+        script = self._optimize(["C 5 3", "L 1 1 5 1", "B 1 2 o", "C 4 4", "L 1 1 4 4"])
+        self.assertEqual(["C 4 4", "L 1 1 4 4"], self._kept_lines(script))
+        self.assertEqual([(1, ["C", "5", "3"], "dead"), (2, ["L", "1", "1", "5", "1"], "dead"),
+                          (3, ["B", "1", "2", "o"], "dead")], script.removed)
+
+    def test_undo_and_redo_cancel_out(self):
+        script = self._optimize(["C 5 3", "L 1 1 5 1", "Z", "Y", "R 1 2 5 3", "L 1 2 5 2", "Z"])
+        self.assertEqual(["C 5 3", "L 1 1 5 1", "R 1 2 5 3"], self._kept_lines(script))
+        self.assertEqual(["undo/redo", "undo/redo", "dead", "undo/redo"],
+                         [reason for _, _, reason in script.removed])
+
+    def test_undo_kept_when_needed(self):
+        script = self._assert_same_output(["C 5 3", "L 1 1 5 1", "P", "Z", "L 1 3 5 3"])
+        self.assertEqual(["C 5 3", "L 1 1 5 1", "P", "Z", "L 1 3 5 3"], self._kept_lines(script))
+        self.assertEqual(1, script.inserted)
+
+    def test_overpainted_draws(self):
+        script = self._optimize(["C 5 3", "L 1 2 5 2", "R 1 1 5 3", "FR 1 1 5 3"])
+        self.assertEqual(["C 5 3", "FR 1 1 5 3"], self._kept_lines(script))
+        self.assertEqual(["overpainted", "overpainted"], [reason for _, _, reason in script.removed])
+
+        # The bucket fill reads the line
+        script = self._optimize(["C 5 3", "L 1 2 5 2", "B 1 1 o", "FR 1 1 5 3"])
+        self.assertEqual(["C 5 3", "L 1 2 5 2", "B 1 1 o", "FR 1 1 5 3"], self._kept_lines(script))
+        # The line is printed
+        script = self._optimize(["C 5 3", "L 1 2 5 2", "P", "FR 1 1 5 3"])
+        self.assertEqual(["C 5 3", "L 1 2 5 2", "P", "FR 1 1 5 3"], self._kept_lines(script))
+        # The rectangle doesn't cover the line
+        script = self._optimize(["C 5 3", "L 1 2 5 2", "FR 1 1 4 3"])
+        self.assertEqual(["C 5 3", "L 1 2 5 2", "FR 1 1 4 3"], self._kept_lines(script))
+
+    def test_invalid_commands_and_quit(self):
+        program, printer = self._program()
+        errors = program.run_batch(["C 5 3", "X", "L 1 1 9 1", "FR 1 1 2 2", "Q", "L 1 3 5 3"],
+                                   error_stream=io.StringIO(), optimizer=ScriptOptimizer())
+        self.assertEqual([(2, "Unknown command"), (3, "Invalid parameter x2")], errors)
+        self.assertEqual([["xx   ", "xx   ", "     "]], printer.printed_canvases)
+
+    def test_not_rendered_every_n_commands(self):
+        program, _ = self._program()
+        # The canvases printed in between depend on the commands the optimizer removes
+        self.assertRaises(AssertionError, program.run_batch, ["C 3 1", "L 1 1 1 1"], render_every=2,
+                          optimizer=ScriptOptimizer())
+
+    def test_draws_merged_into_a_delta_layer(self):
+        for delta_class in (DictDelta, RunDelta):
+            program, printer = self._program(canvas_factory=ArrayCanvasFactory(), delta_class=delta_class)
+            optimizer = ScriptOptimizer()
+            program.run_batch(["C 5 3", "L 1 1 5 1", "L 1 3 5 3", "FR 2 2 3 2", "B 5 2 o"], optimizer=optimizer)
+            self.assertEqual({3: 3}, optimizer.script.groups)
+            self.assertEqual([["xxxxx", " xxoo", "xxxxx"]], printer.printed_canvases)
+            self.assertEqual(3, program.state.history.undo_steps)
+            self.assertEqual(2, program.state.canvas.depth)
+            # The draws are undone together
+            program.execute_command("Z")
+            program.execute_command("Z")
+            self.assertEqual(["     ", "     ", "     "], printer.canvas_to_list(program.state.canvas))
+
+    def test_draws_not_merged_while_journaling(self):
+        with tempfile.TemporaryDirectory() as directory:
+            program, printer = self._program()
+            program.state.journal = CommandJournal(directory)
+            optimizer = ScriptOptimizer()
+            program.run_batch(["C 5 3", "L 1 1 5 1", "L 1 3 5 3", "Z"], optimizer=optimizer)
+            program.state.journal.close()
+            self.assertEqual({}, optimizer.script.groups)
+            self.assertEqual(["C 5 3", "L 1 1 5 1"], self._kept_lines(optimizer.script))
+
+    def test_script_loading_canvases_is_unchanged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "canvas.pntc")
+            lines = ["C 5 3", "SAVE {}".format(path), "C 2 2", "LOAD {}".format(path), "L 1 1 5 1"]
+            script = self._assert_same_output(lines)
+            self.assertEqual(lines, self._kept_lines(script))
+            self.assertEqual("Script not optimised: line 4: LOAD cannot be optimised", script.report())
+
+    def test_continues_the_history_of_the_program(self):
+        program, printer = self._program()
+        program.run_batch(["C 5 3", "L 1 1 5 1", "L 1 2 5 2"])
+        optimizer = ScriptOptimizer()
+        program.run_batch(["Z", "Z", "L 1 3 5 3"], optimizer=optimizer)
+        self.assertEqual(["Z", "Z", "L 1 3 5 3"], self._kept_lines(optimizer.script))
+        self.assertEqual(["     ", "     ", "xxxxx"], printer.canvas_to_list(program.state.canvas))
+
+    def test_report(self):
+        script = self._optimize(["C 5 3", "L 1 1 5 1", "Z", "FOO", "C 3 3", "L 1 1 3 1", "L 1 3 3 3", "Q", "P"])
+        self.assertEqual(
+            "Optimised 9 commands into 3; removed 2 dead, 1 undo/redo, 1 invalid, 2 quit; "
+            "merged 2 draws into 1 delta layers; invalid commands reported before running the script",
+            script.report()
+        )
+
+    def test_same_output_as_the_original_script(self):
+        rng = random.Random(42)
+        for _ in range(200):
+            width, height = rng.randint(1, 6), rng.randint(1, 4)
+            lines = []
+            for _ in range(rng.randint(1, 25)):
+                x1, y1, x2, y2 = (rng.randint(1, 7) for _ in range(4))
+                lines.append(rng.choice([
+                    "C {} {}".format(width, height),
+                    "L {} {} {} {}".format(x1, y1, x2, y2),
+                    "R {} {} {} {}".format(x1, y1, x2, y2),
+                    "FR {} {} {} {}".format(x1, y1, x2, y2),
+                    "B {} {} {}".format(x1, y1, rng.choice("xo ")),
+                    "Z", "Z", "Y", "P"
+                ]))
+            self._assert_same_output(lines, max_steps=rng.choice([None, 3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
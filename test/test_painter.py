@@ -11,11 +11,9 @@ class PainterTests(unittest.TestCase):
             "      ",
         ]
 
-        def line_mock(x1, y1, x2, y2):
+        def line_coordinates_mock(x1, y1, x2, y2):
             if (x1, y1) == (2, 1) and (x2, y2) == (4, 1):
-                return [
-                    Point(2, 1, ' '), Point(3, 1, ' '), Point(4, 1, ' ')
-                ]
+                return [2, 3, 4], [1, 1, 1]
             else:
                 raise Exception("Painter shouldn't need to get any other line")
 
@@ -23,7 +21,7 @@ class PainterTests(unittest.TestCase):
         canvas_mock.width = 6
         canvas_mock.height = 3
         canvas_mock.point.side_effect = lambda x, y: Point(x, y, ' ')
-        canvas_mock.line.side_effect = line_mock
+        canvas_mock.line_coordinates.side_effect = line_coordinates_mock
 
         painter = Painter(PointFactory('-'))
         canvas = painter.draw_line(canvas_mock, x1=2, y1=1, x2=4, y2=1, color='X')
@@ -39,13 +37,9 @@ class PainterTests(unittest.TestCase):
             "  XXX ",
         ]
 
-        def rectangle_mock(x1, y1, x2, y2):
-            if (x1, y1) == (2, 0) and (x2, y2) == (4, 2):
-                return {
-                    Point(2, 0, ' '), Point(3, 0, ' '), Point(4, 0, ' '),
-                    Point(4, 1, ' '), Point(4, 2, ' '), Point(3, 2, ' '),
-                    Point(2, 2, ' '), Point(2, 1, ' ')
-                }
+        def polygon_coordinates_mock(*args):
+            if args == ((2, 0), (4, 0), (4, 2), (2, 2)):
+                return [2, 3, 4, 4, 4, 3, 2, 2], [0, 0, 0, 1, 2, 2, 2, 1]
             else:
                 raise Exception("Painter shouldn't need to get any other rectangle")
 
@@ -53,7 +47,7 @@ class PainterTests(unittest.TestCase):
         canvas_mock.width = 6
         canvas_mock.height = 3
         canvas_mock.point = lambda x, y: Point(x, y, ' ')
-        canvas_mock.rectangle = rectangle_mock
+        canvas_mock.polygon_coordinates = polygon_coordinates_mock
 
         painter = Painter(PointFactory('-'))
         canvas = painter.draw_rectangle(canvas_mock, x1=2, y1=0, x2=4, y2=2, color='X')
@@ -69,13 +63,9 @@ class PainterTests(unittest.TestCase):
             "  XXX ",
         ]
 
-        def uniform_area_mock(x, y):
+        def uniform_area_runs_mock(x, y):
             if x == 1 and y == 1:
-                return [
-                    Point(2, 0, ' '), Point(3, 0, ' '), Point(4, 0, ' '),
-                    Point(2, 1, ' '), Point(3, 1, ' '), Point(4, 1, ' '),
-                    Point(2, 2, ' '), Point(3, 2, ' '), Point(4, 2, ' '),
-                ]
+                return [(0, 2, 4), (1, 2, 4), (2, 2, 4)]
             else:
                 raise Exception("Painter shouldn't need to get any other area")
 
@@ -83,11 +73,86 @@ class PainterTests(unittest.TestCase):
         canvas_mock.width = 6
         canvas_mock.height = 3
         canvas_mock.point.side_effect = lambda x, y: Point(x, y, ' ')
-        canvas_mock.uniform_area = uniform_area_mock
+        canvas_mock.uniform_area_runs = uniform_area_runs_mock
 
         painter = Painter(PointFactory('-'))
         canvas = painter.bucket_fill(canvas_mock, x=1, y=1, color='X')
 
+        # Filled areas are stored as runs rather than a point per point
+        self.assertIsInstance(canvas.delta, RunDelta)
+        for y, expected_row in enumerate(expected_canvas):
+            for x, color in enumerate(expected_row):
+                self.assertEqual(color, canvas.point(x, y).color)
+
+    def test_bucket_fill_with_run_delta(self):
+        expected_canvas = [
+            "  XXX ",
+            "  XXX ",
+            "  XXX ",
+        ]
+
+        def uniform_area_runs_mock(x, y):
+            if x == 1 and y == 1:
+                return [(0, 2, 4), (1, 2, 4), (2, 2, 4)]
+            else:
+                raise Exception("Painter shouldn't need to get any other area")
+
+        canvas_mock = mock.Mock()
+        canvas_mock.width = 6
+        canvas_mock.height = 3
+        canvas_mock.point.side_effect = lambda x, y: Point(x, y, ' ')
+        canvas_mock.uniform_area_runs = uniform_area_runs_mock
+
+        painter = Painter(PointFactory('-'), delta_class=RunDelta)
+        canvas = painter.bucket_fill(canvas_mock, x=1, y=1, color='X')
+
+        self.assertIsInstance(canvas.delta, RunDelta)
+        for y, expected_row in enumerate(expected_canvas):
+            for x, color in enumerate(expected_row):
+                self.assertEqual(color, canvas.point(x, y).color)
+
+    def test_fill_rectangle(self):
+        painter = Painter(PointFactory(' '))
+        canvas = painter.fill_rectangle(Canvas(6, 3, PointFactory(' ')), x1=4, y1=0, x2=2, y2=1, color='X')
+
+        for y, expected_row in enumerate(["  XXX ", "  XXX ", "      "]):
+            for x, color in enumerate(expected_row):
+                self.assertEqual(color, canvas.point(x, y).color)
+
+    def test_fill_polygon(self):
+        painter = Painter(PointFactory(' '), delta_class=RunDelta)
+        canvas = painter.fill_polygon(Canvas(7, 4, PointFactory(' ')), 'X', (3, 0), (0, 3), (6, 3))
+
+        for y, expected_row in enumerate(["   X   ", "  XXX  ", " XXXXX ", "XXXXXXX"]):
+            for x, color in enumerate(expected_row):
+                self.assertEqual(color, canvas.point(x, y).color)
+
+    def test_merge_edits_of_lines_and_fills(self):
+        painter = Painter(PointFactory(' '))
+        canvas = Canvas(6, 3, PointFactory(' '))
+        edited = painter.draw_line(canvas, 0, 1, 5, 1, 'X')
+        edited = painter.bucket_fill(edited, 0, 0, 'o')
+
+        merged = painter.merge_edits(canvas, edited)
+        self.assertIs(canvas, merged.original_canvas)
+        for y, expected_row in enumerate(["oooooo", "XXXXXX", "      "]):
+            for x, color in enumerate(expected_row):
+                self.assertEqual(color, merged.point(x, y).color)
+
+    def test_compaction(self):
+        painter = Painter(PointFactory(' '), CompactionPolicy(max_depth=3))
+        canvas = Canvas(6, 3, PointFactory(' '))
+
+        for x in range(6):
+            canvas = painter.draw_line(canvas, x1=x, y1=0, x2=x, y2=x % 3, color='X')
+            self.assertLessEqual(canvas.depth, 3)
+
+        expected_canvas = [
+            "XXXXXX",
+            " XX XX",
+            "  X  X",
+        ]
+
         for y, expected_row in enumerate(expected_canvas):
             for x, color in enumerate(expected_row):
                 self.assertEqual(color, canvas.point(x, y).color)
@@ -0,0 +1,75 @@
+from paint import *
+import io
+import unittest
+
+
+class ParallelRendererTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.renderer = ParallelRenderer(processes=2, band_rows=3, min_points=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.renderer.close()
+
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '))
+
+    def _drawing(self, canvas):
+        canvas = self.painter.draw_rectangle(canvas, 1, 1, 15, 8, 'x')
+        canvas = self.painter.draw_line(canvas, 0, 10, 19, 0, 'o')
+        return self.painter.bucket_fill(canvas, 3, 3, 'o')
+
+    def test_iter_rows(self):
+        canvas = self._drawing(ArrayCanvas(20, 11, {' ', 'x', 'o'}, ' '))
+        expected = ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+        self.assertEqual(expected, list(self.renderer.iter_rows(canvas)))
+        self.assertEqual(
+            [row.replace(" ", "..").replace("x", "XX").replace("o", "OO").encode() for row in expected],
+            list(self.renderer.iter_rows(canvas, {' ': b"..", 'x': b"XX", 'o': b"OO"}.get))
+        )
+
+    @unittest.skipUnless(numpy_canvas.numpy is not None, "NumPy is not installed")
+    def test_iter_rows_of_numpy_canvas(self):
+        canvas = self._drawing(NumpyCanvas(20, 11, {' ', 'x', 'o'}, ' '))
+        expected = ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+        self.assertEqual(expected, list(self.renderer.iter_rows(canvas)))
+
+    def test_canvases_which_cannot_be_shared(self):
+        self.assertIsNone(self.renderer.iter_rows(Canvas(4, 4, PointFactory(' '))))
+        # Edits of these canvases are not compacted to be shared
+        for canvas in [Canvas(20, 11, PointFactory(' ')), TiledCanvas(20, 11, {' ', 'x', 'o'}, ' '),
+                       QuadtreeCanvas(20, 11, {' ', 'x', 'o'}, ' ')]:
+            self.assertIsNone(self.renderer.iter_rows(self._drawing(canvas)))
+
+    def test_iter_given_rows(self):
+        canvas = self._drawing(ArrayCanvas(20, 11, {' ', 'x', 'o'}, ' '))
+        expected = ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+        self.assertEqual([expected[y] for y in (0, 3, 4, 5, 10)],
+                         list(self.renderer.iter_rows(canvas, rows={10, 4, 0, 5, 3})))
+        self.assertEqual([], list(self.renderer.iter_rows(canvas, rows=set())))
+
+    def test_accepts(self):
+        renderer = ParallelRenderer(processes=2, min_points=100)
+        self.assertTrue(renderer.accepts(ArrayCanvas(10, 10, {' '}, ' ')))
+        self.assertFalse(renderer.accepts(ArrayCanvas(10, 9, {' '}, ' ')))
+        self.assertFalse(renderer.accepts(ArrayCanvas(10, 10, {' '}, ' '), points=10))
+        # A single process would render the rows like the current one, after copying them
+        self.assertFalse(ParallelRenderer(processes=1, min_points=100).accepts(ArrayCanvas(10, 10, {' '}, ' ')))
+
+    def test_printer(self):
+        canvas = ArrayCanvas(20, 11, {' ', 'x', 'o'}, ' ')
+        printer = AsciiCanvasPrinter(renderer=self.renderer)
+        line = self.painter.draw_line(canvas, 0, 4, 19, 4, 'x')
+        for canvas in [canvas, self._drawing(canvas), canvas, line, self._drawing(line)]:
+            self.assertEqual(AsciiCanvasPrinter().canvas_to_str(canvas), printer.canvas_to_str(canvas))
+
+    def test_image_writers(self):
+        canvas = self._drawing(ArrayCanvas(20, 11, {' ', 'x', 'o'}, ' '))
+        rgb_map = {' ': (255, 255, 255), 'x': (0, 0, 0), 'o': (255, 0, 0)}
+        for writer_class in (PpmWriter, PngWriter):
+            expected = io.BytesIO()
+            writer_class(rgb_map).write(canvas, expected)
+            image = io.BytesIO()
+            writer_class(rgb_map, renderer=self.renderer).write(canvas, image)
+            self.assertEqual(expected.getvalue(), image.getvalue())
@@ -0,0 +1,176 @@
+from paint import *
+import io
+import unittest
+
+
+class AsciiCanvasPrinterTests(unittest.TestCase):
+    class RowCountingPrinter(AsciiCanvasPrinter):
+        def __init__(self):
+            self.rendered_rows = []
+
+        def row_to_str(self, canvas, y):
+            self.rendered_rows.append(y)
+            return super().row_to_str(canvas, y)
+
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '))
+        self.canvas = ArrayCanvas(6, 4, {' ', 'x'}, ' ')
+
+    def test_canvas_to_str(self):
+        canvas = self.painter.draw_line(self.canvas, 1, 1, 3, 1, 'x')
+        expected_canvas = \
+            "--------\n" \
+            "|      |\n" \
+            "| xxx  |\n" \
+            "|      |\n" \
+            "|      |\n" \
+            "--------"
+        self.assertEqual(expected_canvas, AsciiCanvasPrinter().canvas_to_str(canvas))
+
+    def test_only_edited_rows_are_rendered(self):
+        printer = self.RowCountingPrinter()
+        printer.canvas_to_list(self.canvas)
+        self.assertEqual([0, 1, 2, 3], printer.rendered_rows)
+
+        printer.rendered_rows = []
+        canvas = self.painter.draw_line(self.canvas, 1, 1, 1, 2, 'x')
+        self.assertEqual([" " * 6, " x    ", " x    ", " " * 6], printer.canvas_to_list(canvas))
+        self.assertEqual([1, 2], sorted(printer.rendered_rows))
+
+    def test_undo_renders_only_edited_rows(self):
+        printer = self.RowCountingPrinter()
+        canvas = self.painter.draw_line(self.canvas, 0, 3, 5, 3, 'x')
+        printer.canvas_to_list(canvas)
+
+        printer.rendered_rows = []
+        self.assertEqual([" " * 6] * 4, printer.canvas_to_list(self.canvas))
+        self.assertEqual([3], printer.rendered_rows)
+
+    def test_same_canvas_is_not_rendered_again(self):
+        printer = self.RowCountingPrinter()
+        printer.canvas_to_list(self.canvas)
+
+        printer.rendered_rows = []
+        printer.canvas_to_list(self.canvas)
+        self.assertEqual([], printer.rendered_rows)
+
+    def test_unrelated_canvas_is_fully_rendered(self):
+        printer = self.RowCountingPrinter()
+        printer.canvas_to_list(self.canvas)
+
+        printer.rendered_rows = []
+        printer.canvas_to_list(ArrayCanvas(6, 4, {' ', 'x'}, ' '))
+        self.assertEqual([0, 1, 2, 3], printer.rendered_rows)
+
+    def test_compacted_canvas_renders_only_edited_rows(self):
+        painter = Painter(PointFactory(' '), CompactionPolicy(max_depth=1))
+        printer = self.RowCountingPrinter()
+        canvas = painter.draw_line(self.canvas, 0, 0, 5, 0, 'x')
+        printer.canvas_to_list(canvas)
+
+        printer.rendered_rows = []
+        canvas = painter.draw_line(canvas, 0, 2, 5, 2, 'x')
+        self.assertEqual(1, canvas.depth)
+        self.assertEqual(["x" * 6, " " * 6, "x" * 6, " " * 6], printer.canvas_to_list(canvas))
+        self.assertEqual([2], printer.rendered_rows)
+
+    def test_undo_redo_frames_are_cached(self):
+        printer = self.RowCountingPrinter()
+        canvas = self.painter.draw_line(self.canvas, 0, 1, 5, 1, 'x')
+        frame = printer.canvas_to_str(canvas)
+        base_frame = printer.canvas_to_str(self.canvas)
+
+        printer.rendered_rows = []
+        self.assertIs(frame, printer.canvas_to_str(canvas))
+        self.assertIs(base_frame, printer.canvas_to_str(self.canvas))
+        self.assertEqual([], printer.rendered_rows)
+        self.assertEqual(2, printer.render_cache.hits)
+        self.assertEqual(2, printer.render_cache.misses)
+
+    def test_rows_are_yielded_as_they_are_rendered(self):
+        printer = self.RowCountingPrinter()
+        rows = printer.iter_rows(self.painter.draw_line(self.canvas, 0, 0, 5, 0, 'x'))
+        self.assertEqual("x" * 6, next(rows))
+        self.assertEqual([0], printer.rendered_rows)
+        self.assertEqual([" " * 6] * 3, list(rows))
+        self.assertEqual([0, 1, 2, 3], printer.rendered_rows)
+
+    def test_write_canvas_in_chunks(self):
+        class Stream(io.StringIO):
+            writes = 0
+
+            def write(self, s):
+                self.writes += 1
+                return super().write(s)
+
+        class SmallChunksPrinter(AsciiCanvasPrinter):
+            chunk_size = 16
+
+        canvas = self.painter.draw_line(self.canvas, 1, 1, 3, 1, 'x')
+        expected_frame = AsciiCanvasPrinter().canvas_to_str(canvas) + "\n"
+
+        stream = Stream()
+        SmallChunksPrinter().write_canvas(canvas, stream)
+        self.assertEqual(expected_frame, stream.getvalue())
+        self.assertEqual(3, stream.writes)
+
+        stream = Stream()
+        AsciiCanvasPrinter().write_canvas(canvas, stream)
+        self.assertEqual(expected_frame, stream.getvalue())
+        self.assertEqual(1, stream.writes)
+
+
+class RenderCacheTests(unittest.TestCase):
+    def test_get(self):
+        cache = RenderCache()
+        self.assertIsNone(cache.get(1))
+        cache.put(1, "a", 10)
+        self.assertEqual("a", cache.get(1))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_peek_does_not_count(self):
+        cache = RenderCache()
+        cache.put(1, "a", 10)
+        self.assertEqual("a", cache.peek(1))
+        self.assertIsNone(cache.peek(2))
+        self.assertEqual((0, 0), (cache.hits, cache.misses))
+
+    def test_least_recently_used_values_are_evicted(self):
+        cache = RenderCache(max_bytes=30)
+        cache.put(1, "a", 10)
+        cache.put(2, "b", 10)
+        cache.put(3, "c", 10)
+        cache.get(1)
+        cache.put(4, "d", 10)
+
+        self.assertEqual(30, cache.memory_usage)
+        self.assertIsNone(cache.peek(2))
+        self.assertEqual("a", cache.peek(1))
+        self.assertEqual("d", cache.peek(4))
+
+    def test_put_replaces_value(self):
+        cache = RenderCache()
+        cache.put(1, "a", 10)
+        cache.put(1, "b", 15)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(15, cache.memory_usage)
+        self.assertEqual("b", cache.peek(1))
+
+
+class AnsiCanvasPrinterTests(unittest.TestCase):
+    def test_print_canvas_updates_changed_rows(self):
+        stream = io.StringIO()
+        printer = AnsiCanvasPrinter(stream)
+        canvas = ArrayCanvas(3, 2, {' ', 'x'}, ' ')
+
+        printer.print_canvas(canvas)
+        self.assertEqual("\x1b[2J\x1b[H-----\n|   |\n|   |\n-----\n", stream.getvalue())
+
+        stream.seek(0)
+        stream.truncate()
+        printer.print_canvas(Painter(PointFactory(' ')).draw_line(canvas, 0, 1, 2, 1, 'x'))
+        self.assertEqual("\x1b[3;1H|xxx|\x1b[5;1H\x1b[J", stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
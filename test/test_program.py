@@ -1,4 +1,7 @@
 from paint import *
+import io
+import os
+import tempfile
 import unittest
 
 
@@ -11,13 +14,30 @@ class ProgramTests(unittest.TestCase):
     class CanvasPrinterStub(AsciiCanvasPrinter):
         def __init__(self):
             self.printed_canvas = ""
+            self.printed_text = ""
 
         def print_canvas(self, canvas):
             self.printed_canvas = self.canvas_to_str(canvas)
 
+        def print_text(self, text):
+            self.printed_text += text + "\n"
+
     def test_run(self):
+        self._test_run(canvas_factory=CanvasFactory())
+
+    def test_run_with_array_canvas(self):
+        self._test_run(canvas_factory=ArrayCanvasFactory())
+
+    def test_run_with_run_delta(self):
+        self._test_run(canvas_factory=ArrayCanvasFactory(), delta_class=RunDelta)
+
+    def test_run_with_numpy_canvas(self):
+        self._test_run(canvas_factory=NumpyCanvasFactory(), painter_class=NumpyPainter)
+
+    def _test_run(self, canvas_factory, delta_class=DictDelta, painter_class=Painter):
         printer_mock = ProgramTests.CanvasPrinterStub()
-        program = Program(printer=printer_mock, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+        program = Program(printer=printer_mock, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          canvas_factory=canvas_factory, delta_class=delta_class, painter_class=painter_class)
 
         expected_canvas1 = \
             "----------------------\n" \
@@ -104,6 +124,200 @@ class ProgramTests(unittest.TestCase):
 
         self.assertRaises(Quit, program.run_command, "Q")
 
+    def test_undo_redo_across_compaction(self):
+        printer_mock = ProgramTests.CanvasPrinterStub()
+        program = Program(printer=printer_mock, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          compaction_policy=CompactionPolicy(max_depth=2))
+
+        program.run_command("C", 5, 3)
+        for x in range(1, 6):
+            program.run_command("L", x, 1, x, 3)
+            self.assertLessEqual(program.state.canvas.depth, 2)
+
+        self._assert_canvas_equals(program.state.canvas, ["xxxxx", "xxxxx", "xxxxx"])
+
+        program.run_command("Z")
+        program.run_command("Z")
+        program.run_command("Z")
+        self._assert_canvas_equals(program.state.canvas, ["xx   ", "xx   ", "xx   "])
+
+        program.run_command("Y")
+        self._assert_canvas_equals(program.state.canvas, ["xxx  ", "xxx  ", "xxx  "])
+
+    def test_filled_shapes(self):
+        printer_mock = ProgramTests.CanvasPrinterStub()
+        program = Program(printer=printer_mock, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+
+        program.run_command("C", 7, 4)
+        program.run_command("FT", 4, 1, 1, 4, 7, 4)
+        self._assert_canvas_equals(program.state.canvas, ["   x   ", "  xxx  ", " xxxxx ", "xxxxxxx"])
+
+        program.run_command("Z")
+        program.run_command("FR", 2, 2, 3, 4)
+        self._assert_canvas_equals(program.state.canvas, ["       ", " xx    ", " xx    ", " xx    "])
+
+        program.run_command("FP", 1, 1, 7, 1, 7, 2, 1, 2)
+        self._assert_canvas_equals(program.state.canvas, ["xxxxxxx", "xxxxxxx", " xx    ", " xx    "])
+
+        self.assertRaises(CommandError, program.run_command, "FP", 1, 1, 7, 1, 7)
+        self.assertRaises(CommandError, program.run_command, "FP", 1, 1, 7, 1, 8, 2)
+
+    def test_undo_with_limited_history(self):
+        printer_mock = ProgramTests.CanvasPrinterStub()
+        program = Program(printer=printer_mock, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          history=History(max_steps=2))
+
+        program.run_command("C", 4, 1)
+        for x in range(1, 5):
+            program.run_command("L", x, 1, x, 1)
+
+        for _ in range(3):
+            program.run_command("Z")
+        self._assert_canvas_equals(program.state.canvas, ["xx  "])
+
+    class CanvasPrinterSpy(AsciiCanvasPrinter):
+        def __init__(self):
+            self.printed_canvases = []
+
+        def print_canvas(self, canvas):
+            self.printed_canvases.append(self.canvas_to_str(canvas))
+
+    def test_run_batch(self):
+        printer = ProgramTests.CanvasPrinterSpy()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+        errors = io.StringIO()
+
+        result = program.run_batch([
+            "# Draws a line",
+            "C 4 2",
+            "",
+            "L 1 1 4 1",
+            "X 1 2",
+            "B 1 2 k",
+            "B 1 2 o",
+        ], error_stream=errors)
+
+        self.assertEqual([(5, "Unknown command"), (6, "Invalid parameter color")], result)
+        self.assertEqual("Line 5: Unknown command\nLine 6: Invalid parameter color\n", errors.getvalue())
+        self.assertEqual(["------\n|xxxx|\n|oooo|\n------"], printer.printed_canvases)
+
+    def test_run_batch_render_every(self):
+        printer = ProgramTests.CanvasPrinterSpy()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+
+        program.run_batch(["C 2 1", "L 1 1 1 1", "L 2 1 2 1", "Z", "Z"], render_every=2)
+
+        self.assertEqual(["----\n|x |\n----", "----\n|x |\n----", "----\n|  |\n----"], printer.printed_canvases)
+
+    def test_run_batch_print_command_and_quit(self):
+        printer = ProgramTests.CanvasPrinterSpy()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+
+        program.run_batch(["C 2 1", "P", "L 1 1 1 1", "Q", "L 2 1 2 1"])
+
+        self.assertEqual(["----\n|  |\n----", "----\n|x |\n----"], printer.printed_canvases)
+
+    class StatsCollector(ProfilerHook):
+        def __init__(self):
+            self.stats = []
+
+        def command_finished(self, stats):
+            self.stats.append(stats)
+
+    def test_profiling(self):
+        collector = ProgramTests.StatsCollector()
+        program = Program(printer=ProgramTests.CanvasPrinterStub(), palette={' ', 'x', 'o'}, foreground_color='x',
+                          background_color=' ', profiler=Profiler([collector]))
+
+        program.run_command("C", 4, 2)
+        program.run_command("L", 1, 1, 4, 1)
+        program.run_command("B", 1, 2, "o")
+        self.assertRaises(CommandError, program.run_command, "B", 1, 2, "k")
+        program.run_command("Z")
+
+        self.assertEqual(["C", "L", "B", "B", "Z"], [stats.command_name for stats in collector.stats])
+        self.assertEqual([None, 4, 4, None, None], [stats.delta_size for stats in collector.stats])
+        self.assertEqual([0, 1, 2, 2, 1], [stats.chain_depth for stats in collector.stats])
+        self.assertEqual([None, None, None, "Invalid parameter color", None], [s.error for s in collector.stats])
+        self.assertEqual(program.state.history.memory_usage, collector.stats[-1].history_bytes)
+
+        line_stats = collector.stats[1]
+        self.assertEqual(["parse", "validate", "paint", "render"], list(line_stats.timings))
+        self.assertTrue(all(seconds >= 0 for seconds in line_stats.timings.values()))
+        self.assertGreater(line_stats.timings["paint"], 0)
+        self.assertGreater(line_stats.timings["render"], 0)
+        # The command failed before rendering
+        self.assertEqual(0, collector.stats[3].timings["render"])
+
+        summary = program.state.profiler.summary().splitlines()
+        self.assertEqual(["C", "L", "B", "Z"], [line.split()[0] for line in summary[1:5]])
+        self.assertEqual(["2", "1"], summary[3].split()[1:3])
+
+    def test_profiling_batch(self):
+        collector = ProgramTests.StatsCollector()
+        program = Program(printer=ProgramTests.CanvasPrinterSpy(), palette={' ', 'x', 'o'}, foreground_color='x',
+                          background_color=' ', profiler=Profiler([collector]))
+
+        program.run_batch(["C 2 1", "X", "P", "L 1 1 1 1", "Q"], error_stream=io.StringIO())
+
+        self.assertEqual(["C", "X", "P", "L", "Q"], [stats.command_name for stats in collector.stats])
+        self.assertEqual("Unknown command", collector.stats[1].error)
+        self.assertGreater(collector.stats[2].timings["render"], 0)
+        self.assertEqual(0, collector.stats[3].timings["render"])
+
+    def test_stats_command_without_profiler(self):
+        program = Program(printer=ProgramTests.CanvasPrinterStub(), palette={' ', 'x', 'o'}, foreground_color='x',
+                          background_color=' ')
+        self.assertRaises(CommandError, program.run_command, "S")
+
+    def test_stats_command_prints_through_the_printer(self):
+        printer = ProgramTests.CanvasPrinterStub()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          profiler=Profiler())
+        program.run_command("C", 2, 1)
+        program.run_command("S")
+        self.assertEqual("command", printer.printed_text.split()[0])
+        self.assertIn("\nC ", printer.printed_text)
+
+    def test_save_and_load(self):
+        printer = ProgramTests.CanvasPrinterStub()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "canvas.bin")
+            self.assertRaises(CommandError, program.run_command, "SAVE", path)
+
+            program.run_command("C", 4, 2)
+            program.run_command("L", 1, 1, 4, 1)
+            program.run_command("SAVE", path)
+            program.run_command("C", 2, 2)
+
+            program.run_command("LOAD", path)
+            self.assertEqual("------\n|xxxx|\n|    |\n------", printer.printed_canvas)
+            program.run_command("B", 1, 2, "o")
+            self.assertEqual("------\n|xxxx|\n|oooo|\n------", printer.printed_canvas)
+            program.run_command("Z")
+            program.run_command("Z")
+            self.assertEqual("----\n|  |\n|  |\n----", printer.printed_canvas)
+
+            self.assertRaises(CommandError, program.run_command, "LOAD")
+            self.assertRaises(CommandError, program.run_command, "LOAD", os.path.join(directory, "missing.bin"))
+            self.assertRaises(CommandError, program.run_command, "SAVE", os.path.join(directory, "missing", "c.bin"))
+
+    def test_export(self):
+        program = Program(printer=ProgramTests.CanvasPrinterStub(), palette={' ', 'x', 'o'}, foreground_color='x',
+                          background_color=' ', rgb_map={' ': (255, 255, 255), 'x': (0, 0, 0), 'o': (255, 0, 0)})
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "canvas.ppm")
+            self.assertRaises(CommandError, program.run_command, "EXPORT", path)
+            program.run_command("C", 2, 1)
+            program.run_command("L", 1, 1, 1, 1)
+            program.run_command("EXPORT", path)
+            with open(path, "rb") as image:
+                self.assertEqual(b"P6\n2 1\n255\n" + bytes([0, 0, 0, 255, 255, 255]), image.read())
+            self.assertRaises(CommandError, program.run_command, "EXPORT", os.path.join(directory, "canvas.bmp"))
+
 
 if __name__ == "__main__":
     unittest.main()
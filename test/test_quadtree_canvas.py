@@ -0,0 +1,118 @@
+from paint import *
+import unittest
+
+
+class QuadtreeCanvasTests(unittest.TestCase):
+    PALETTE = {' ', 'x', 'o', 'k'}
+
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '), delta_class=RunDelta)
+        self.quadtree_painter = QuadtreePainter(PointFactory(' '))
+
+    def _colors(self, canvas):
+        return ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+
+    def _drawing(self, canvas, painter):
+        canvas = painter.draw_rectangle(canvas, 2, 2, 16, 9, 'x')
+        canvas = painter.draw_line(canvas, 0, 11, 19, 0, 'x')
+        canvas = painter.draw_polygon(canvas, 'o', (5, 4), (12, 5), (8, 8))
+        return painter.fill_rectangle(canvas, 17, 10, 19, 12, 'k')
+
+    def test_unpainted_canvas(self):
+        canvas = QuadtreeCanvas(100000, 100000, self.PALETTE, ' ')
+        self.assertEqual(' ', canvas.point(99999, 99999).color)
+        self.assertEqual(' ', canvas.color_at(99999, 99999))
+        self.assertRaises(PointOutOfCanvas, canvas.color_at, 0, 100000)
+        self.assertRaises(PointOutOfCanvas, canvas.point, 100000, 0)
+        self.assertEqual(0, canvas.nodes())
+        self.assertLess(canvas.memory_size(), 1024)
+
+    def test_same_points_as_array_canvas(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        for painter in (self.quadtree_painter, QuadtreePainter(PointFactory(' '), delta_class=DictDelta)):
+            canvas = self._drawing(QuadtreeCanvas(20, 13, self.PALETTE, ' '), painter)
+            self.assertIsInstance(canvas, QuadtreeCanvas)
+            self.assertEqual(self._colors(expected), self._colors(canvas))
+            self.assertEqual(expected.point(4, 2).color, canvas.point(4, 2).color)
+
+    def test_uniform_area_runs(self):
+        expected = compact(self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter))
+        canvas = self._drawing(QuadtreeCanvas(20, 13, self.PALETTE, ' '), self.quadtree_painter)
+        for x, y in [(0, 0), (3, 3), (8, 6), (19, 12), (17, 10), (6, 4)]:
+            self.assertEqual(sorted(expected.uniform_area_runs(x, y)), sorted(canvas.uniform_area_runs(x, y)))
+
+    def test_bucket_fill(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        canvas = self._drawing(QuadtreeCanvas(20, 13, self.PALETTE, ' '), self.quadtree_painter)
+        for x, y, color in [(0, 0, 'o'), (8, 6, 'k'), (3, 3, 'x'), (19, 12, ' ')]:
+            expected = self.painter.bucket_fill(expected, x, y, color)
+            canvas = self.quadtree_painter.bucket_fill(canvas, x, y, color)
+            self.assertEqual(self._colors(expected), self._colors(canvas))
+            self.assertEqual(expected.edited_rows(), set(canvas.edited_rows()))
+
+    def test_edits_share_untouched_nodes(self):
+        canvas = QuadtreeCanvas(64, 64, self.PALETTE, ' ')
+        canvas = self.quadtree_painter.draw_line(canvas, 0, 0, 63, 63, 'x')
+        edited = self.quadtree_painter.draw_line(canvas, 0, 1, 1, 1, 'o')
+
+        self.assertEqual('x', canvas.point(1, 1).color)
+        self.assertEqual('o', edited.point(1, 1).color)
+        self.assertEqual(canvas.version, edited.parent_version)
+        self.assertEqual(range(1, 2), edited.edited_rows())
+        # Only the path to the north west leaf is copied
+        self.assertIsNot(canvas._root, edited._root)
+        self.assertIsNot(canvas._root[0], edited._root[0])
+        for quadrant in (1, 2, 3):
+            self.assertIs(canvas._root[quadrant], edited._root[quadrant])
+        self.assertLess(edited.memory_size(), canvas.memory_size())
+
+    def test_uniform_nodes_collapse(self):
+        canvas = QuadtreeCanvas(40, 30, self.PALETTE, ' ')
+        canvas = self.quadtree_painter.draw_line(canvas, 0, 0, 39, 29, 'x')
+        self.assertGreater(canvas.nodes(), 0)
+        canvas = self.quadtree_painter.fill_rectangle(canvas, 0, 0, 39, 29, 'o')
+        self.assertEqual(0, canvas.nodes())
+        self.assertEqual('o', canvas.color_at(39, 29))
+
+    def test_snapshot(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        canvas = QuadtreeCanvas(20, 13, self.PALETTE, ' ').snapshot(expected)
+        self.assertEqual(self._colors(expected), self._colors(canvas))
+
+        base = QuadtreeCanvas(20, 13, self.PALETTE, ' ')
+        canvas = compact(self._drawing(base, self.painter))
+        self.assertIsInstance(canvas, QuadtreeCanvas)
+        self.assertEqual(self._colors(expected), self._colors(canvas))
+
+    def test_program(self):
+        printer = AsciiCanvasPrinter()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          canvas_factory=QuadtreeCanvasFactory(), painter_class=QuadtreePainter)
+        program.execute_command("C", 5, 3)
+        program.execute_command("L", 1, 2, 5, 2)
+        program.execute_command("B", 1, 1, "o")
+        self.assertEqual(["ooooo", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))
+        program.execute_command("Z")
+        self.assertEqual(["     ", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))
+        program.execute_command("Y")
+        self.assertEqual(["ooooo", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))
+        # The painted points are collected as runs, whatever the delta class of the program
+        self.assertIs(DictDelta, program.state.delta_class)
+        self.assertIs(RunDelta, program.parse_command("B", 1, 1, "x").painter._delta_class)
+
+    def test_printer_renders_edited_rows(self):
+        printer = AsciiCanvasPrinter()
+        canvas = QuadtreeCanvas(5, 4, self.PALETTE, ' ')
+        printer.render(canvas)
+        edited = self.quadtree_painter.draw_line(canvas, 0, 2, 4, 2, 'x')
+        rows, changed_rows = printer.render(edited)
+        self.assertEqual({2}, set(changed_rows))
+        self.assertEqual("xxxxx", rows[2])
+        # Undo
+        rows, changed_rows = printer.render(canvas)
+        self.assertEqual({2}, set(changed_rows))
+        self.assertEqual("     ", rows[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
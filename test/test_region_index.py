@@ -0,0 +1,110 @@
+from paint import *
+import random
+import unittest
+
+
+class RegionIndexTests(unittest.TestCase):
+    PALETTE = {' ', 'x', 'o', 'k'}
+
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '), delta_class=RunDelta)
+
+    def _colors(self, canvas):
+        return ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+
+    def _drawing(self, canvas, painter):
+        canvas = painter.draw_rectangle(canvas, 2, 2, 16, 9, 'x')
+        canvas = painter.draw_line(canvas, 0, 11, 19, 0, 'x')
+        canvas = painter.draw_polygon(canvas, 'o', (5, 4), (12, 5), (8, 8))
+        return painter.fill_rectangle(canvas, 17, 10, 19, 12, 'k')
+
+    def test_area_runs(self):
+        canvas = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        index = RegionIndex()
+        for x, y in [(0, 0), (3, 3), (8, 6), (19, 12), (17, 10), (6, 4)]:
+            self.assertEqual(
+                sorted(RunDelta.from_runs(canvas.uniform_area_runs(x, y), 'x', None).runs()),
+                sorted(RunDelta.from_runs(index.area_runs(canvas, x, y), 'x', None).runs())
+            )
+        self.assertEqual(1, index.builds)
+        self.assertRaises(PointOutOfCanvas, index.area_runs, canvas, 20, 0)
+
+    def test_repeated_fills_are_not_indexed_again(self):
+        index = RegionIndex()
+        painter = Painter(PointFactory(' '), delta_class=RunDelta, region_index=index)
+        canvas = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        expected = canvas
+        for x, y, color in [(0, 0, 'o'), (8, 6, 'k'), (3, 3, 'x'), (19, 12, ' '), (0, 0, 'x'), (3, 3, 'k')]:
+            canvas = painter.bucket_fill(canvas, x, y, color)
+            expected = self.painter.bucket_fill(expected, x, y, color)
+            self.assertEqual(self._colors(expected), self._colors(canvas))
+        self.assertEqual(1, index.builds)
+        self.assertEqual(0, index.rebuilt_rows)
+
+    def test_other_edits_index_their_rows_again(self):
+        index = RegionIndex()
+        painter = Painter(PointFactory(' '), delta_class=RunDelta, region_index=index)
+        canvas = painter.bucket_fill(ArrayCanvas(20, 13, self.PALETTE, ' '), 0, 0, 'o')
+        canvas = painter.draw_line(canvas, 0, 6, 19, 6, 'x')
+        canvas = painter.bucket_fill(canvas, 0, 0, 'k')
+        self.assertEqual(['k' * 20] * 6 + ['x' * 20] + ['o' * 20] * 6, self._colors(canvas))
+        self.assertEqual(1, index.builds)
+        self.assertEqual(1, index.rebuilt_rows)
+
+    def test_program_undo_and_redo(self):
+        printer = AsciiCanvasPrinter()
+        index = RegionIndex()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          canvas_factory=ArrayCanvasFactory(), delta_class=RunDelta, region_index=index)
+        program.execute_command("C", 5, 3)
+        program.execute_command("L", 1, 2, 5, 2)
+        program.execute_command("B", 1, 1, "o")
+        program.execute_command("B", 1, 2, "o")
+        self.assertEqual(["ooooo", "ooooo", "     "], printer.canvas_to_list(program.state.canvas))
+        program.execute_command("Z")
+        program.execute_command("Z")
+        program.execute_command("B", 1, 3, "o")
+        self.assertEqual(["     ", "xxxxx", "ooooo"], printer.canvas_to_list(program.state.canvas))
+        program.execute_command("Z")
+        program.execute_command("Z")
+        program.execute_command("Y")
+        program.execute_command("B", 1, 1, "x")
+        self.assertEqual(["xxxxx", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))
+        # Only undoing and redoing the line indexed its row again
+        self.assertEqual(1, index.builds)
+        self.assertEqual(2, index.rebuilt_rows)
+
+    def test_same_fills_as_the_painters(self):
+        backends = [
+            (ArrayCanvas, Painter),
+            (TiledCanvas, TiledPainter),
+            (QuadtreeCanvas, QuadtreePainter),
+        ]
+        rng = random.Random(42)
+        for _ in range(100):
+            canvas_class, painter_class = rng.choice(backends)
+            width, height = rng.randint(1, 10), rng.randint(1, 8)
+            painter = painter_class(PointFactory(' '), delta_class=RunDelta)
+            indexed_painter = painter_class(PointFactory(' '), delta_class=RunDelta, region_index=RegionIndex())
+            canvases = [canvas_class(width, height, self.PALETTE, ' ')]
+            expected = list(canvases)
+            for _ in range(30):
+                x1, x2 = rng.randrange(width), rng.randrange(width)
+                y1, y2 = rng.randrange(height), rng.randrange(height)
+                action = rng.random()
+                if action < 0.5:
+                    color = rng.choice(' xok')
+                    canvases.append(indexed_painter.bucket_fill(canvases[-1], x1, y1, color))
+                    expected.append(painter.bucket_fill(expected[-1], x1, y1, color))
+                elif action < 0.7:
+                    canvases.append(indexed_painter.draw_line(canvases[-1], x1, y1, x2, y2, 'x'))
+                    expected.append(painter.draw_line(expected[-1], x1, y1, x2, y2, 'x'))
+                elif len(canvases) > 1:
+                    # Undo
+                    canvases.pop()
+                    expected.pop()
+                self.assertEqual(self._colors(expected[-1]), self._colors(canvases[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
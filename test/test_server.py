@@ -0,0 +1,96 @@
+from paint import *
+import os
+import tempfile
+import unittest
+
+
+class CanvasServerTests(unittest.IsolatedAsyncioTestCase):
+    def _program(self, printer):
+        return Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                       canvas_factory=ArrayCanvasFactory())
+
+    async def asyncSetUp(self):
+        self.server = CanvasServer(self._program)
+        self.listener = await self.server.start()
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def test_session(self):
+        client = await CanvasClient.connect(port=self.port)
+        self.assertEqual(("ERROR", "Please create a canvas first", ""), await client.send("L 1 1 2 1"))
+        self.assertEqual(("OK", "", "-----\n|   |\n|   |\n-----\n"), await client.send("C 3 2"))
+        self.assertEqual(("OK", "", "-----\n|xx |\n|   |\n-----\n"), await client.send("L 1 1 2 1"))
+        self.assertEqual(("ERROR", "Unknown command", ""), await client.send("K"))
+        self.assertEqual(("BYE", "", ""), await client.send("Q"))
+        await client.close()
+        self.assertEqual(2, self.server.commands)
+
+    async def test_file_commands_are_unknown(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "canvas.pntc")
+            client = await CanvasClient.connect(port=self.port)
+            await client.send("C 3 2")
+            for line in ["SAVE " + path, "EXPORT " + path + ".png", "LOAD " + path]:
+                self.assertEqual(("ERROR", "Unknown command", ""), await client.send(line))
+            self.assertEqual([], os.listdir(directory))
+            await client.close()
+
+    async def test_max_canvas_points(self):
+        server = CanvasServer(self._program, max_canvas_points=6)
+        listener = await server.start()
+        client = await CanvasClient.connect(port=listener.sockets[0].getsockname()[1])
+        self.assertEqual(("OK", "", "-----\n|   |\n|   |\n-----\n"), await client.send("C 3 2"))
+        self.assertEqual(("ERROR", "Canvas larger than 6 points", ""), await client.send("C 7 1"))
+        await client.close()
+        listener.close()
+        await listener.wait_closed()
+
+    async def test_line_too_long(self):
+        client = await CanvasClient.connect(port=self.port)
+        self.assertEqual(("ERROR", "Line too long", ""), await client.send("C 1 1" + " " * 100000))
+        # The rest of the line was skipped
+        self.assertEqual(("OK", "", "----\n|  |\n----\n"), await client.send("C 2 1"))
+        await client.close()
+
+    async def test_sessions_are_independent(self):
+        first = await CanvasClient.connect(port=self.port)
+        second = await CanvasClient.connect(port=self.port)
+        await first.send("C 2 1")
+        await second.send("C 3 1")
+        self.assertEqual("----\n|xx|\n----\n", (await first.send("L 1 1 2 1"))[2])
+        self.assertEqual("-----\n|   |\n-----\n", (await second.send("P"))[2])
+        self.assertEqual(("OK", "", ""), await second.send("Z"))
+        self.assertEqual("----\n|xx|\n----\n", (await first.send("P"))[2])
+        await first.close()
+        await second.close()
+
+    async def test_stats(self):
+        server = CanvasServer(lambda printer: Program(
+            printer=printer, palette={' ', 'x'}, foreground_color='x', background_color=' ', profiler=Profiler()
+        ))
+        listener = await server.start()
+        client = await CanvasClient.connect(port=listener.sockets[0].getsockname()[1])
+        await client.send("C 1 1")
+        status, message, output = await client.send("S")
+        self.assertEqual(("OK", ""), (status, message))
+        lines = output.splitlines()
+        # The statistics come before the canvas
+        self.assertTrue(lines[0].startswith("# command "))
+        self.assertTrue(lines[1].startswith("# C "))
+        self.assertEqual("---", lines[-1])
+        await client.close()
+        listener.close()
+        await listener.wait_closed()
+
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "paint.sock")
+            listener = await self.server.start_unix(path)
+            client = await CanvasClient.connect_unix(path)
+            self.assertEqual(("OK", "", "---\n| |\n---\n"), await client.send("C 1 1"))
+            await client.close()
+            listener.close()
+            await listener.wait_closed()
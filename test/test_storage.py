@@ -0,0 +1,108 @@
+from paint import *
+import os
+import tempfile
+import unittest
+
+
+class StorageTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "canvas.bin")
+        self.painter = Painter(PointFactory(' '))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _colors(self, canvas):
+        return ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+
+    def _drawing(self, canvas):
+        canvas = self.painter.draw_rectangle(canvas, 1, 0, 4, 2, 'x')
+        return self.painter.bucket_fill(canvas, 2, 1, 'o')
+
+    def test_save_and_load(self):
+        for canvas in [Canvas(6, 3, PointFactory(' ')), ArrayCanvas(6, 3, {' ', 'x', 'o'}, ' ')]:
+            canvas = self._drawing(canvas)
+            save_canvas(canvas, self.path, {' ', 'x', 'o'})
+            self.assertEqual(HEADER.size + 6 + 6 * 3, os.path.getsize(self.path))
+
+            loaded = load_canvas(self.path, {' ', 'x', 'o'})
+            self.assertIsInstance(loaded, MappedCanvas)
+            self.assertEqual((6, 3), (loaded.width, loaded.height))
+            self.assertEqual([" xxxx ", " xoox ", " xxxx "], self._colors(loaded))
+            self.assertEqual('o', loaded.point(2, 1).color)
+            self.assertEqual([(1, 2, 3)], list(loaded.uniform_area_runs(2, 1)))
+            loaded.close()
+
+    def test_paint_loaded_canvas(self):
+        save_canvas(self._drawing(ArrayCanvas(6, 3, {' ', 'x', 'o'}, ' ')), self.path, {' ', 'x', 'o'})
+        loaded = load_canvas(self.path, {' ', 'x', 'o'})
+
+        canvas = self.painter.bucket_fill(loaded, 0, 0, 'o')
+        self.assertEqual(["oxxxx ", "oxoox ", "oxxxx "], self._colors(canvas))
+        compacted = compact(self.painter.draw_line(canvas, 2, 1, 3, 1, 'x'))
+        self.assertIs(ArrayCanvas, type(compacted))
+        self.assertEqual(["oxxxx ", "oxxxx ", "oxxxx "], self._colors(compacted))
+
+        # Saving over the mapped file leaves the loaded canvas untouched
+        save_canvas(compacted, self.path, {' ', 'x', 'o'})
+        self.assertEqual([" xxxx ", " xoox ", " xxxx "], self._colors(loaded))
+        self.assertEqual(["oxxxx ", "oxxxx ", "oxxxx "], self._colors(load_canvas(self.path, {' ', 'x', 'o'})))
+
+    def test_save_edited_array_canvas(self):
+        canvas = ArrayCanvas(4, 3, {' ', 'x'}, ' ')
+        save_canvas(canvas, self.path, {' ', 'x'})
+        canvas = self.painter.draw_line(load_canvas(self.path, {' ', 'x'}), 0, 1, 3, 1, 'x')
+
+        save_canvas(canvas, self.path, {' ', 'x'})
+        self.assertEqual(["    ", "xxxx", "    "], self._colors(load_canvas(self.path, {' ', 'x'})))
+
+    def test_load_with_another_palette(self):
+        save_canvas(self._drawing(ArrayCanvas(6, 3, {' ', 'x', 'o'}, ' ')), self.path, {' ', 'x', 'o'})
+
+        loaded = load_canvas(self.path, {' ', 'a', 'o', 'x'})
+        self.assertIs(ArrayCanvas, type(loaded))
+        self.assertEqual([" xxxx ", " xoox ", " xxxx "], self._colors(loaded))
+        self.assertEqual(["axxxx ", "axoox ", "axxxx "], self._colors(self.painter.bucket_fill(loaded, 0, 0, 'a')))
+
+        self.assertRaises(CanvasFileError, load_canvas, self.path, {' ', 'x'})
+
+    def test_invalid_files(self):
+        self.assertRaises(CanvasFileError, save_canvas, self._drawing(Canvas(6, 3, PointFactory(' '))),
+                          self.path, {' ', 'x'})
+        self.assertFalse(os.listdir(self.directory.name))
+
+        for content in [b"", b"not a canvas file", HEADER.pack(MAGIC, 2, 1, 1, 1) + b"\x01 \x00",
+                        HEADER.pack(MAGIC, FORMAT_VERSION, 2, 2, 1) + b"\x01 \x00"]:
+            with open(self.path, "wb") as file:
+                file.write(content)
+            self.assertRaises(CanvasFileError, load_canvas, self.path, {' '})
+
+    def test_replace_file(self):
+        save_canvas(self._drawing(ArrayCanvas(6, 3, {' ', 'x', 'o'}, ' ')), self.path, {' ', 'x', 'o'})
+        loaded = load_canvas(self.path, {' ', 'x', 'o'})
+        with replace_file(self.path) as file:
+            file.write(b"replaced")
+        with open(self.path, "rb") as file:
+            self.assertEqual(b"replaced", file.read())
+        # The mapped file is left as it was
+        self.assertEqual([" xxxx ", " xoox ", " xxxx "], self._colors(loaded))
+
+        with self.assertRaises(ValueError):
+            with replace_file(self.path) as file:
+                file.write(b"cut")
+                raise ValueError()
+        with open(self.path, "rb") as file:
+            self.assertEqual(b"replaced", file.read())
+        self.assertEqual(["canvas.bin"], os.listdir(self.directory.name))
+
+    def test_replace_file_permissions(self):
+        umask = os.umask(0)
+        os.umask(umask)
+        with replace_file(self.path) as file:
+            file.write(b"new")
+        self.assertEqual(0o666 & ~umask, os.stat(self.path).st_mode & 0o777)
+        os.chmod(self.path, 0o640)
+        with replace_file(self.path) as file:
+            file.write(b"replaced")
+        self.assertEqual(0o640, os.stat(self.path).st_mode & 0o777)
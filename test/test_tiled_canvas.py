@@ -0,0 +1,117 @@
+from paint import *
+import unittest
+
+
+class TiledCanvasTests(unittest.TestCase):
+    PALETTE = {' ', 'x', 'o', 'k'}
+
+    def setUp(self):
+        self.painter = Painter(PointFactory(' '), delta_class=RunDelta)
+        self.tiled_painter = TiledPainter(PointFactory(' '), delta_class=RunDelta)
+
+    def _colors(self, canvas):
+        return ["".join(canvas.row_colors(y)) for y in range(canvas.height)]
+
+    def _drawing(self, canvas, painter):
+        canvas = painter.draw_rectangle(canvas, 2, 2, 16, 9, 'x')
+        canvas = painter.draw_line(canvas, 0, 11, 19, 0, 'x')
+        canvas = painter.draw_polygon(canvas, 'o', (5, 4), (12, 5), (8, 8))
+        return painter.fill_rectangle(canvas, 17, 10, 19, 12, 'k')
+
+    def test_unpainted_canvas(self):
+        canvas = TiledCanvas(100000, 100000, self.PALETTE, ' ')
+        self.assertEqual(' ', canvas.point(99999, 99999).color)
+        self.assertEqual(' ', canvas.color_at(99999, 99999))
+        self.assertRaises(PointOutOfCanvas, canvas.color_at, 0, 100000)
+        self.assertEqual(0, canvas.allocated_tiles)
+        self.assertLess(canvas.memory_size(), 1024)
+        self.assertRaises(PointOutOfCanvas, canvas.point, 100000, 0)
+
+    def test_tile_bounds(self):
+        canvas = TiledCanvas(10, 7, self.PALETTE, ' ', tile_size=4)
+        self.assertEqual((0, 0, 3, 3), canvas.tile_bounds(0, 0))
+        self.assertEqual((8, 4, 9, 6), canvas.tile_bounds(2, 1))
+
+    def test_same_points_as_array_canvas(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        for tile_size in (1, 3, 4, 64):
+            canvas = self._drawing(TiledCanvas(20, 13, self.PALETTE, ' ', tile_size), self.painter)
+            self.assertEqual(self._colors(expected), self._colors(compact(canvas)))
+            self.assertEqual(expected.point(4, 2).color, compact(canvas).point(4, 2).color)
+
+    def test_only_painted_tiles_are_allocated(self):
+        canvas = TiledCanvas(20, 12, self.PALETTE, ' ', tile_size=4)
+        canvas = compact(self.painter.draw_line(canvas, 0, 0, 7, 0, 'x'))
+        self.assertEqual(2, canvas.allocated_tiles)
+        canvas = compact(self.painter.fill_rectangle(canvas, 8, 4, 15, 7, 'x'))
+        # Tiles painted entirely are uniform
+        self.assertEqual(2, canvas.allocated_tiles)
+        canvas = compact(self.painter.fill_rectangle(canvas, 0, 0, 3, 3, ' '))
+        self.assertEqual(1, canvas.allocated_tiles)
+
+    def test_uniform_area_runs(self):
+        for tile_size in (1, 3, 4, 64):
+            expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+            expected = compact(expected)
+            canvas = compact(self._drawing(TiledCanvas(20, 13, self.PALETTE, ' ', tile_size), self.painter))
+            for x, y in [(0, 0), (3, 3), (8, 6), (19, 12), (17, 10), (6, 4)]:
+                self.assertEqual(sorted(expected.uniform_area_runs(x, y)), sorted(canvas.uniform_area_runs(x, y)))
+
+    def test_bucket_fill(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        for tile_size in (1, 3, 4, 64):
+            canvas = self._drawing(TiledCanvas(20, 13, self.PALETTE, ' ', tile_size), self.tiled_painter)
+            for x, y, color in [(0, 0, 'o'), (8, 6, 'k'), (3, 3, 'x'), (19, 12, ' ')]:
+                expected = self.painter.bucket_fill(expected, x, y, color)
+                canvas = self.tiled_painter.bucket_fill(canvas, x, y, color)
+                self.assertIsInstance(canvas.delta, TileDelta)
+                self.assertEqual(self._colors(expected), self._colors(canvas))
+                self.assertEqual(sorted(expected.delta.runs()), sorted(canvas.delta.runs()))
+                self.assertEqual(len(expected.delta), len(canvas.delta))
+                self.assertEqual(expected.edited_rows(), canvas.edited_rows())
+            self.assertEqual(self._colors(expected), self._colors(compact(canvas)))
+            expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+
+    def test_bucket_fill_of_untouched_tiles(self):
+        canvas = TiledCanvas(100000, 100000, self.PALETTE, ' ', tile_size=1024)
+        canvas = self.tiled_painter.draw_rectangle(canvas, 10, 10, 20, 20, 'x')
+        canvas = self.tiled_painter.bucket_fill(canvas, 50000, 50000, 'o')
+
+        self.assertEqual(98 * 98 - 1, canvas.delta.tile_count)
+        self.assertEqual(100000 * 100000 - 11 * 11, len(canvas.delta))
+        self.assertEqual('o', canvas.point(99999, 0).color)
+        self.assertEqual(' ', canvas.point(15, 15).color)
+        self.assertEqual('x', canvas.point(20, 20).color)
+        self.assertEqual("oxxxxxxxxxxxo", "".join(canvas.row_colors(10)[9:22]))
+
+        compacted = compact(canvas)
+        self.assertEqual(1, compacted.allocated_tiles)
+        self.assertEqual('o', compacted.point(0, 0).color)
+        self.assertEqual(' ', compacted.point(19, 19).color)
+
+    def test_snapshot_shares_tiles(self):
+        canvas = TiledCanvas(16, 16, self.PALETTE, ' ', tile_size=4)
+        canvas = compact(self.painter.draw_line(canvas, 0, 0, 15, 15, 'x'))
+        edited = compact(self.painter.draw_line(canvas, 0, 1, 1, 1, 'o'))
+
+        self.assertEqual('x', canvas.point(1, 1).color)
+        self.assertEqual('o', edited.point(1, 1).color)
+        self.assertIsNot(canvas._tiles[(0, 0)], edited._tiles[(0, 0)])
+        self.assertIs(canvas._tiles[(1, 1)], edited._tiles[(1, 1)])
+
+    def test_snapshot_of_another_canvas(self):
+        expected = self._drawing(ArrayCanvas(20, 13, self.PALETTE, ' '), self.painter)
+        canvas = TiledCanvas(20, 13, self.PALETTE, ' ', tile_size=4).snapshot(expected)
+        self.assertEqual(self._colors(expected), self._colors(canvas))
+        self.assertLess(canvas.allocated_tiles, 20)
+
+    def test_program(self):
+        printer = AsciiCanvasPrinter()
+        program = Program(printer=printer, palette={' ', 'x', 'o'}, foreground_color='x', background_color=' ',
+                          canvas_factory=TiledCanvasFactory(tile_size=2), painter_class=TiledPainter)
+        program.execute_command("C", 5, 3)
+        program.execute_command("L", 1, 2, 5, 2)
+        program.execute_command("B", 1, 1, "o")
+        self.assertEqual(["ooooo", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))
+        program.execute_command("Z")
+        self.assertEqual(["     ", "xxxxx", "     "], printer.canvas_to_list(program.state.canvas))